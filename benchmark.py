@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+同步链路性能基准测试
+对比不同实现的吞吐量，结果直接打印到终端
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+from sync_data.latency_stats import percentile
+
+load_dotenv()
+
+
+def run_timed(label: str, func: Callable[[], int], repeat: int) -> Dict[str, Any]:
+    """重复执行 func 并统计吞吐量，func 返回处理的行数"""
+    durations = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = func()
+        durations.append(time.perf_counter() - start)
+    
+    best = min(durations)
+    return {
+        "label": label,
+        "rows": rows,
+        "best_seconds": best,
+        "rows_per_second": rows / best if best > 0 else 0.0
+    }
+
+
+def print_results(title: str, results: list):
+    """打印基准测试结果表格"""
+    print(f"\n📊 {title}")
+    print("-" * 64)
+    print(f"{'方式':<24}{'行数':>10}{'最佳耗时(s)':>14}{'行/秒':>14}")
+    for r in results:
+        print(f"{r['label']:<24}{r['rows']:>10}{r['best_seconds']:>14.3f}{r['rows_per_second']:>14.0f}")
+    
+    if len(results) == 2 and results[0]['rows_per_second'] > 0:
+        speedup = results[1]['rows_per_second'] / results[0]['rows_per_second']
+        print(f"\n⚡ {results[1]['label']} 相对 {results[0]['label']}: {speedup:.2f}x")
+
+
+def bench_extract(args):
+    """对比 RealDictCursor 与 COPY 两种导出方式"""
+    from sync_data.database import PostgreSQLConnection
+    
+    db = PostgreSQLConnection()
+    company_id = args.company
+    
+    def cursor_path() -> int:
+        intents = db.get_company_intents(company_id)
+        answers_map = db.get_answers_by_intent_ids([intent['id'] for intent in intents])
+        return len(intents) + sum(len(answers) for answers in answers_map.values())
+    
+    def copy_path() -> int:
+        answers_map = db.copy_company_answers(company_id)
+        intent_count = sum(1 for _ in db.iter_company_intents_copy(company_id))
+        return intent_count + sum(len(answers) for answers in answers_map.values())
+    
+    results = [
+        run_timed("RealDictCursor", cursor_path, args.repeat),
+        run_timed("COPY CSV", copy_path, args.repeat)
+    ]
+    print_results(f"数据导出 (公司 {company_id}, 意图+答案行)", results)
+
+
+def build_synthetic_tenant(questions: int, questions_per_intent: int, answers_per_intent: int):
+    """生成合成租户的意图和答案记录（不访问数据库）"""
+    from sync_data.records import IntentRecord, AnswerRecord
+    
+    now = datetime(2025, 1, 1)
+    intent_count = (questions + questions_per_intent - 1) // questions_per_intent
+    for i in range(intent_count):
+        intent_id = f"intent-{i:08d}"
+        intent = IntentRecord(
+            id=intent_id,
+            name=f"合成意图 {i}",
+            keywords=[f"合成问题 {i}-{q}" for q in range(questions_per_intent)],
+            usage_count=i % 200,
+            is_active=True,
+            is_deleted=0,
+            created_at=now - timedelta(minutes=i),
+            updated_at=now,
+            company_id="synthetic"
+        )
+        answers = [
+            AnswerRecord(
+                id=f"{intent_id}-answer-{a}",
+                type="text",
+                content={"text": f"合成答案 {i}-{a}"},
+                is_active=True,
+                created_at=now,
+                updated_at=now
+            )
+            for a in range(answers_per_intent)
+        ]
+        yield intent, answers
+
+
+class _SyntheticEmbedding:
+    """随机向量的嵌入服务替身，基准只关心内存，不关心向量内容"""
+    
+    def __init__(self, dimensions: int):
+        import numpy as np
+        self.np = np
+        self.model_name = "synthetic"
+        self.dimensions = dimensions
+        self.rng = np.random.default_rng(0)
+    
+    def encode_batch(self, texts, batch_size: int = 32, as_array: bool = False):
+        vectors = self.rng.standard_normal((len(texts), self.dimensions), dtype=self.np.float32)
+        return vectors if as_array else vectors.tolist()
+    
+    def calculate_vector_quality(self, vector) -> float:
+        return 0.5
+
+
+def memory_worker(args):
+    """在独立进程中构建一个合成租户的全部向量点，峰值 RSS 由父进程读取"""
+    from sync_data.migrator import KnowledgeBaseMigrator
+    from sync_data.records import LazyPointList
+    from qdrant_client.models import PointStruct
+    
+    # 只用到向量点构建，不连接数据库、Qdrant，也不加载模型
+    migrator = KnowledgeBaseMigrator.__new__(KnowledgeBaseMigrator)
+    migrator.embedding_service = _SyntheticEmbedding(args.dimensions)
+    migrator.vector_config = {"has_named_vectors": False, "vector_names": [], "vector_config_type": "single"}
+    
+    start = time.perf_counter()
+    all_points = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for intent, answers in build_synthetic_tenant(args.questions, args.questions_per_intent,
+                                                      args.answers_per_intent):
+            if args.mode == 'dict':
+                # 旧实现：逐行 dict、list[float] 向量、每个问题立即构建完整载荷和 PointStruct
+                intent_row = {field: getattr(intent, field) for field in intent.__slots__}
+                answer_rows = [{field: getattr(answer, field) for field in answer.__slots__} for answer in answers]
+                vectors = migrator.embedding_service.encode_batch(intent_row['keywords'])
+                for i, (question, vector) in enumerate(zip(intent_row['keywords'], vectors)):
+                    payload = migrator.build_payload(intent_row, question, i, answer_rows)
+                    all_points.append(PointStruct(id=len(all_points), vector=vector, payload=payload))
+            else:
+                all_points.extend(migrator.process_intent(intent, answers))
+        
+        points = all_points if args.mode == 'dict' else LazyPointList(all_points, migrator.build_point)
+        # 模拟 upsert 按批序列化
+        for i in range(0, len(points), 100):
+            points[i:i + 100]
+    
+    print(json.dumps({"points": len(all_points), "seconds": time.perf_counter() - start}))
+
+
+def bench_memory(args):
+    """对比逐行 dict + 立即构建载荷 与 紧凑记录 + 惰性载荷 的峰值内存"""
+    if not hasattr(os, 'wait4'):
+        print("❌ 内存基准需要 os.wait4（Linux/macOS）")
+        return
+    
+    print(f"🧪 合成租户: {args.questions} 个问题, 每个意图 {args.questions_per_intent} 个问题, "
+          f"{args.answers_per_intent} 个答案, 向量 {args.dimensions} 维")
+    
+    results = []
+    for mode, label in (('dict', 'dict + 立即构建载荷'), ('compact', '紧凑记录 + 惰性载荷')):
+        print(f"⏱️ 运行 {label}...")
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'memory-worker', '--mode', mode,
+             '--questions', str(args.questions), '--dimensions', str(args.dimensions),
+             '--questions-per-intent', str(args.questions_per_intent),
+             '--answers-per-intent', str(args.answers_per_intent)],
+            stdout=subprocess.PIPE, text=True
+        )
+        output = process.stdout.read()
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        
+        if process.returncode != 0:
+            print(f"❌ {label} 运行失败（退出码 {process.returncode}，可能内存不足）")
+            continue
+        
+        stats = json.loads(output.strip().splitlines()[-1])
+        # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+        peak_bytes = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+        results.append({"label": label, "peak_bytes": peak_bytes, **stats})
+    
+    print(f"\n📊 峰值内存")
+    print("-" * 64)
+    print(f"{'方式':<24}{'向量点':>10}{'耗时(s)':>10}{'峰值RSS(MB)':>14}{'字节/点':>10}")
+    for r in results:
+        print(f"{r['label']:<24}{r['points']:>10}{r['seconds']:>10.1f}"
+              f"{r['peak_bytes'] / 1024 / 1024:>14.1f}{r['peak_bytes'] / max(r['points'], 1):>10.0f}")
+    
+    if len(results) == 2 and results[1]['peak_bytes'] > 0:
+        print(f"\n⚡ {results[1]['label']} 峰值内存为 {results[0]['label']} 的 "
+              f"{results[1]['peak_bytes'] / results[0]['peak_bytes'] * 100:.1f}%")
+
+
+def build_synthetic_points(count: int, dimensions: int):
+    """构建用于写入基准的随机向量点（载荷大小接近真实同步）"""
+    import numpy as np
+    from qdrant_client.models import PointStruct
+    
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((count, dimensions), dtype=np.float32)
+    return [
+        PointStruct(
+            id=i,
+            vector=vectors[i].tolist(),
+            payload={
+                "content": f"合成问题 {i}",
+                "metadata": {
+                    "companyId": "benchmark",
+                    "intentId": f"intent_{i // 3}",
+                    "intentName": f"合成意图 {i // 3}",
+                    "originalId": f"benchmark_intent_{i // 3}_{i % 3}",
+                    "currentQuestionIndex": i % 3,
+                    "questionCount": 3,
+                    "answerCount": 1,
+                    "popularityTier": "COLD",
+                    "isDeleted": False,
+                    "intentIsActive": True,
+                    "hasActiveAnswers": True
+                }
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def bench_upsert(args):
+    """对比不同写入并发度的吞吐量（点/秒），写入临时集合，结束后删除"""
+    from sync_data.qdrant_manager import QdrantManager
+    from qdrant_client.models import VectorParams, Distance
+    
+    qdrant = QdrantManager()
+    collection_name = args.collection
+    points = build_synthetic_points(args.points, args.dimensions)
+    
+    results = []
+    try:
+        for parallel in args.parallel:
+            def upsert() -> int:
+                # 每轮重建集合，避免覆盖写入与首次写入的差异
+                if qdrant.client.collection_exists(collection_name):
+                    qdrant.client.delete_collection(collection_name)
+                qdrant.client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=VectorParams(size=args.dimensions, distance=Distance.COSINE)
+                )
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    if not qdrant.upsert_points(collection_name, points, batch_size=args.batch_size,
+                                                parallel=parallel):
+                        raise RuntimeError("写入失败")
+                return len(points)
+            
+            print(f"⏱️ 并发 {parallel}...")
+            results.append(run_timed(f"并发 {parallel}", upsert, args.repeat))
+    finally:
+        if qdrant.client.collection_exists(collection_name):
+            qdrant.client.delete_collection(collection_name)
+    
+    print_results(f"Qdrant 写入 ({args.points} 个点, {args.dimensions} 维, 每批 {args.batch_size})", results)
+    if len(results) > 2 and results[0]['rows_per_second'] > 0:
+        best = max(results, key=lambda r: r['rows_per_second'])
+        print(f"\n⚡ 最快: {best['label']}，相对 {results[0]['label']} "
+              f"{best['rows_per_second'] / results[0]['rows_per_second']:.2f}x")
+
+
+def bench_transport(args):
+    """对比 REST 与 gRPC 的写入吞吐量和搜索延迟，并检查两种传输的搜索结果一致"""
+    import numpy as np
+    from sync_data.qdrant_manager import QdrantManager
+    from qdrant_client.models import VectorParams, Distance
+    
+    points = build_synthetic_points(args.points, args.dimensions)
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dimensions), dtype=np.float32).tolist()
+    
+    results = []
+    top_ids = {}
+    for label, prefer_grpc in (("REST", False), ("gRPC", True)):
+        qdrant = QdrantManager(prefer_grpc=prefer_grpc, grpc_port=args.grpc_port)
+        # 关闭影子精确搜索，避免干扰延迟测量
+        qdrant.recall_monitor.sample_rate = 0
+        collection_name = f"{args.collection}_{label.lower()}"
+        try:
+            if qdrant.client.collection_exists(collection_name):
+                qdrant.client.delete_collection(collection_name)
+            qdrant.client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(size=args.dimensions, distance=Distance.COSINE)
+            )
+            
+            print(f"⏱️ {label} 写入 {len(points)} 个点...")
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                upsert_result = qdrant.upsert_points(collection_name, points, batch_size=args.batch_size,
+                                                     parallel=args.parallel)
+            if not upsert_result:
+                print(f"❌ {label} 写入失败")
+                continue
+            
+            print(f"⏱️ {label} 执行 {len(queries)} 次搜索...")
+            latencies = []
+            top_ids[label] = []
+            for query in queries:
+                start = time.perf_counter()
+                hits = qdrant.search(collection_name, query, limit=args.top_k, score_threshold=None)
+                latencies.append((time.perf_counter() - start) * 1000)
+                top_ids[label].append([hit.id for hit in hits])
+            
+            results.append({
+                "label": label,
+                "points_per_second": upsert_result.points_per_second,
+                "p50_ms": percentile(latencies, 50),
+                "p99_ms": percentile(latencies, 99)
+            })
+        finally:
+            if qdrant.client.collection_exists(collection_name):
+                qdrant.client.delete_collection(collection_name)
+            qdrant.client.close()
+    
+    print(f"\n📊 REST vs gRPC ({args.points} 个点, {args.dimensions} 维, 每批 {args.batch_size}, "
+          f"并发 {args.parallel}, top {args.top_k})")
+    print("-" * 64)
+    print(f"{'传输':<12}{'写入(点/秒)':>16}{'搜索 p50(ms)':>16}{'搜索 p99(ms)':>16}")
+    for r in results:
+        print(f"{r['label']:<12}{r['points_per_second']:>16.0f}{r['p50_ms']:>16.2f}{r['p99_ms']:>16.2f}")
+    
+    if len(results) == 2:
+        rest, grpc_result = results
+        if rest['points_per_second'] > 0 and grpc_result['p50_ms'] > 0:
+            print(f"\n⚡ gRPC 写入吞吐为 REST 的 {grpc_result['points_per_second'] / rest['points_per_second']:.2f}x，"
+                  f"搜索 p50 为 REST 的 {grpc_result['p50_ms'] / rest['p50_ms']:.2f}x")
+        
+        mismatched = sum(1 for a, b in zip(top_ids['REST'], top_ids['gRPC']) if a != b)
+        if mismatched:
+            print(f"⚠️ {mismatched}/{len(queries)} 次搜索的结果在两种传输下不一致")
+        else:
+            print("✅ 两种传输的搜索结果完全一致")
+
+
+def bench_centroid(args):
+    """对比平面搜索与意图质心粗排-精排搜索的召回率和延迟（以精确搜索为基准）"""
+    import numpy as np
+    from sync_data.qdrant_manager import QdrantManager
+    from sync_data.tenancy import TenancyLayout
+    from sync_data.intent_centroids import centroid_collection_name
+    
+    qdrant = QdrantManager()
+    # 关闭影子精确搜索，避免干扰延迟测量
+    qdrant.recall_monitor.sample_rate = 0
+    tenancy = TenancyLayout(qdrant, args.collection)
+    collection_name = tenancy.collection_for(args.company) if args.company else args.collection
+    query_filter = tenancy.tenant_filter(args.company) if args.company else None
+    if not qdrant.client.collection_exists(centroid_collection_name(collection_name)):
+        print(f"❌ 质心集合 {centroid_collection_name(collection_name)} 不存在，请先设置 QDRANT_INTENT_CENTROIDS=true 后同步")
+        return
+    
+    # 用已存问题的向量加少量噪声作为查询（模拟同义问法）
+    records, _ = qdrant.client.scroll(collection_name, scroll_filter=query_filter, limit=args.queries * 5,
+                                      with_payload=False, with_vectors=True)
+    rng = np.random.default_rng(1)
+    vectors = [record.vector for record in records if isinstance(record.vector, list)]
+    if not vectors:
+        print(f"❌ 集合 {collection_name} 中没有可用作查询的向量")
+        return
+    queries = []
+    for index in rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False):
+        query = np.asarray(vectors[index], dtype=np.float32)
+        query += rng.normal(0, args.noise, size=query.shape).astype(np.float32)
+        queries.append((query / np.linalg.norm(query)).tolist())
+    
+    tiers = tenancy.tiers
+    print(f"⏱️ 计算 {len(queries)} 个查询的精确搜索基准...")
+    truth = [
+        {hit.id for hit in tiers.search(collection_name, query, limit=args.top_k, score_threshold=None,
+                                        filter_conditions=query_filter, exact=True)}
+        for query in queries
+    ]
+    
+    modes = [("平面搜索", lambda query: tiers.search(collection_name, query, limit=args.top_k, score_threshold=None,
+                                                     filter_conditions=query_filter))]
+    for coarse_intents in args.coarse_intents:
+        modes.append((f"粗排 {coarse_intents} 个意图", lambda query, c=coarse_intents: tenancy.centroids.search(
+            collection_name, query, limit=args.top_k, score_threshold=None, filter_conditions=query_filter,
+            coarse_intents=c
+        )))
+    
+    results = []
+    for label, search in modes:
+        print(f"⏱️ {label}...")
+        latencies = []
+        recalls = []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            hits = search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if expected:
+                recalls.append(len(expected & {hit.id for hit in hits}) / len(expected))
+        results.append({
+            "label": label,
+            "recall": sum(recalls) / len(recalls) if recalls else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99)
+        })
+    
+    print(f"\n📊 平面搜索 vs 意图质心粗排-精排 ({collection_name}, {len(queries)} 个查询, 噪声 {args.noise}, "
+          f"recall@{args.top_k})")
+    print("-" * 64)
+    print(f"{'方式':<16}{'召回率':>12}{'p50(ms)':>16}{'p99(ms)':>16}")
+    for r in results:
+        print(f"{r['label']:<16}{r['recall']:>12.4f}{r['p50_ms']:>16.2f}{r['p99_ms']:>16.2f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='同步链路性能基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    extract_parser = subparsers.add_parser('extract', help='对比 RealDictCursor 与 COPY 导出吞吐量')
+    extract_parser.add_argument('--company', required=True, help='用于测试的公司ID')
+    extract_parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最佳值 (默认: 3)')
+    extract_parser.set_defaults(func=bench_extract)
+    
+    memory_parser = subparsers.add_parser('memory', help='对比合成租户的峰值内存 (dict vs 紧凑记录)')
+    memory_parser.add_argument('--questions', type=int, default=1000000, help='合成问题数 (默认: 1000000)')
+    memory_parser.add_argument('--dimensions', type=int, default=768, help='向量维度 (默认: 768)')
+    memory_parser.add_argument('--questions-per-intent', type=int, default=3, help='每个意图的问题数 (默认: 3)')
+    memory_parser.add_argument('--answers-per-intent', type=int, default=2, help='每个意图的答案数 (默认: 2)')
+    memory_parser.set_defaults(func=bench_memory)
+    
+    upsert_parser = subparsers.add_parser('upsert', help='对比不同写入并发度的 Qdrant 写入吞吐量')
+    upsert_parser.add_argument('--points', type=int, default=20000, help='写入点数 (默认: 20000)')
+    upsert_parser.add_argument('--dimensions', type=int, default=768, help='向量维度 (默认: 768)')
+    upsert_parser.add_argument('--batch-size', type=int, default=100, help='每批点数 (默认: 100)')
+    upsert_parser.add_argument('--parallel', type=int, nargs='+', default=[1, 4, 8],
+                               help='要对比的并发度 (默认: 1 4 8)')
+    upsert_parser.add_argument('--collection', default='benchmark_upsert', help='临时集合名称 (默认: benchmark_upsert)')
+    upsert_parser.add_argument('--repeat', type=int, default=1, help='重复次数，取最佳值 (默认: 1)')
+    upsert_parser.set_defaults(func=bench_upsert)
+    
+    transport_parser = subparsers.add_parser('transport', help='对比 REST 与 gRPC 的写入吞吐量和搜索延迟')
+    transport_parser.add_argument('--points', type=int, default=20000, help='写入点数 (默认: 20000)')
+    transport_parser.add_argument('--dimensions', type=int, default=1024, help='向量维度 (默认: 1024)')
+    transport_parser.add_argument('--batch-size', type=int, default=100, help='每批点数 (默认: 100)')
+    transport_parser.add_argument('--parallel', type=int, default=4, help='写入并发度 (默认: 4)')
+    transport_parser.add_argument('--queries', type=int, default=500, help='搜索次数 (默认: 500)')
+    transport_parser.add_argument('--top-k', type=int, default=10, help='每次搜索返回的结果数 (默认: 10)')
+    transport_parser.add_argument('--grpc-port', type=int, default=None, help='gRPC 端口 (默认: QDRANT_GRPC_PORT 或 6334)')
+    transport_parser.add_argument('--collection', default='benchmark_transport',
+                                  help='临时集合名称前缀 (默认: benchmark_transport)')
+    transport_parser.set_defaults(func=bench_transport)
+    
+    centroid_parser = subparsers.add_parser('centroid', help='对比平面搜索与意图质心粗排-精排搜索的召回率和延迟')
+    centroid_parser.add_argument('--collection', default='wechat_diplomat', help='问题集合名称 (默认: wechat_diplomat)')
+    centroid_parser.add_argument('--company', default=None, help='只测试该公司的数据（按租户隔离策略定位集合）')
+    centroid_parser.add_argument('--queries', type=int, default=200, help='查询数 (默认: 200)')
+    centroid_parser.add_argument('--top-k', type=int, default=10, help='recall@k 的 k (默认: 10)')
+    centroid_parser.add_argument('--coarse-intents', type=int, nargs='+', default=[5, 10, 20, 50],
+                                 help='对比的粗排意图数 (默认: 5 10 20 50)')
+    centroid_parser.add_argument('--noise', type=float, default=0.05,
+                                 help='加在查询向量上的高斯噪声标准差 (默认: 0.05)')
+    centroid_parser.set_defaults(func=bench_centroid)
+    
+    # 内存基准的子进程入口（由 memory 子命令调用）
+    worker_parser = subparsers.add_parser('memory-worker')
+    worker_parser.add_argument('--mode', choices=['dict', 'compact'], required=True)
+    worker_parser.add_argument('--questions', type=int, required=True)
+    worker_parser.add_argument('--dimensions', type=int, required=True)
+    worker_parser.add_argument('--questions-per-intent', type=int, required=True)
+    worker_parser.add_argument('--answers-per-intent', type=int, required=True)
+    worker_parser.set_defaults(func=memory_worker)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,84 @@
 #!/usr/bin/env python3
 """
 清理和重新创建集合
-删除指定集合并重新创建为1024维
+按当前数据库内容重建到新的版本集合（向量维度由嵌入模型决定）：迁移全部数据并校验点数和抽样搜索，
+通过后才切换别名，旧版本按保留策略清理。迁移或校验失败时别名保持不变，读取方继续访问旧版本，
+不会切换到空集合。流程与 main.py --rebuild 相同。
 """
 
 import sys
 from sync_data.qdrant_manager import QdrantManager
+from sync_data.collection_versions import CollectionVersionManager
+from sync_data.migrator import KnowledgeBaseMigrator
+from sync_data.tenancy import TenancyLayout
 
-def cleanup_collection(collection_name: str, new_dimension: int = 1024):
-    """清理并重新创建集合"""
+DEFAULT_MODEL = 'shibing624/text2vec-base-chinese'
+
+def cleanup_collection(collection_name: str, model_name: str = DEFAULT_MODEL, keep_versions: int = 1):
+    """清理并重新创建集合（collection_name 为读取方使用的别名）"""
     print("=" * 60)
     print("🧹 清理并重新创建集合")
     print("=" * 60)
     print()
     
     qdrant = QdrantManager()
+    versions = CollectionVersionManager(qdrant, collection_name)
     
     # 1. 检查集合是否存在
-    collections = qdrant.list_collections()
-    existing_collections = [col['name'] for col in collections]
-    
-    if collection_name not in existing_collections:
+    current = versions.current_version()
+    if current is None and not versions.is_legacy_collection():
+        existing_collections = [col['name'] for col in qdrant.list_collections()]
         print(f"❌ 集合 {collection_name} 不存在")
         print(f"📋 可用集合: {', '.join(existing_collections)}")
         return False
     
-    print(f"📋 找到集合: {collection_name}")
+    print(f"📋 找到集合: {collection_name}" + (f" → {current}" if current else ""))
     
     # 2. 获取集合信息
-    info = qdrant.get_collection_info(collection_name)
+    info = qdrant.get_collection_info(current or collection_name)
     if info:
         print(f"   向量数量: {info.get('points_count', 0)}")
         print(f"   当前维度: {info.get('vector_size', 'unknown')}")
     
-    # 3. 确认删除
-    print(f"\n⚠️  警告：这将删除集合 {collection_name} 的所有数据！")
-    confirm = input("确认删除并重新创建？(y/N): ").strip().lower()
+    # 3. 确认清理
+    print(f"\n⚠️  警告：将使用模型 {model_name} 把全部数据重建到新的版本集合，校验通过后 {collection_name} 才切换过去，"
+          f"旧数据只保留最近 {keep_versions} 个版本用于回滚！")
+    confirm = input("确认重建？(y/N): ").strip().lower()
     
     if confirm != 'y':
         print("❌ 已取消")
         return False
     
-    # 4. 删除集合
-    print(f"\n🗑️  正在删除集合 {collection_name}...")
-    if qdrant.delete_collection(collection_name):
-        print(f"✅ 集合删除成功")
-    else:
-        print(f"❌ 集合删除失败")
-        return False
-    
-    # 5. 重新创建集合
-    print(f"\n🏗️  正在创建新集合 {collection_name}...")
-    print(f"   向量维度: {new_dimension}")
+    # 4. 创建新版本、迁移并校验，通过后切换别名（失败时别名保持不变）
+    migrator = KnowledgeBaseMigrator(model_name)
+    migrator.collection_name = collection_name
+    migrator.tenancy = TenancyLayout(migrator.qdrant, collection_name)
+    summary = migrator.rebuild_collection(keep_versions=keep_versions)
     
-    if qdrant.create_collection(collection_name, new_dimension):
-        print(f"✅ 集合创建成功")
-        return True
-    else:
-        print(f"❌ 集合创建失败")
+    if not summary['activated']:
+        print(f"❌ 重建未完成，{collection_name} 保持不变，请排查后运行 python main.py --rebuild")
         return False
+    
+    print(f"✅ {collection_name} 已切换到 {summary['version']}")
+    return True
 
 def main():
     if len(sys.argv) < 2:
         print("用法:")
-        print("  python cleanup_collection.py <集合名称> [维度]")
+        print("  python cleanup_collection.py <集合名称> [模型名称]")
         print()
         print("示例:")
-        print("  python cleanup_collection.py wechat_diplomat 1024")
+        print("  python cleanup_collection.py wechat_diplomat BAAI/bge-large-zh-v1.5")
         print("  python cleanup_collection.py wechat_diplomat")
         return
     
     collection_name = sys.argv[1]
-    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    model_name = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL
+    if model_name.isdigit():
+        print("❌ 向量维度由嵌入模型决定，请传入模型名称（例如 BAAI/bge-large-zh-v1.5 为 1024 维）")
+        return
     
-    cleanup_collection(collection_name, dimension)
+    cleanup_collection(collection_name, model_name)
 
 if __name__ == "__main__":
     main()
-
-
@@ -6,6 +6,11 @@
 import sys
 from sync_data.qdrant_manager import QdrantManager
 from sync_data.embedding_service import LocalEmbeddingService
+from sync_data.intent_store import (
+    IntentStore, AnswerResolver, SEARCH_HIT_FIELDS, INTENT_COLLECTION_SUFFIX, intent_collection_name
+)
+from sync_data.popularity_tiers import PopularityTiers
+from sync_data.intent_centroids import CENTROID_COLLECTION_SUFFIX
 
 # 向量维度到模型的映射
 DIM_TO_MODEL = {
@@ -25,8 +30,13 @@ def quick_test(question: str, collection_index: int = 2):
     print("🔗 连接 Qdrant...")
     qdrant = QdrantManager()
     
-    # 获取集合列表
-    collections = qdrant.list_collections()
+    # 获取集合列表（意图集合和质心集合不能直接搜索；冷数据集合随热数据集合一起搜索）
+    tiers = PopularityTiers(qdrant)
+    collections = [
+        col for col in qdrant.list_collections()
+        if not col['name'].endswith((INTENT_COLLECTION_SUFFIX, CENTROID_COLLECTION_SUFFIX))
+        and not tiers.is_cold_collection(col['name'])
+    ]
     if not collections:
         print("❌ 没有找到任何集合")
         return
@@ -66,21 +76,26 @@ def quick_test(question: str, collection_index: int = 2):
         # 生成向量
         vector = embedding.encode_single(question)
         
-        # 搜索
-        results = qdrant.search(
+        # 按意图分组搜索（每个意图只返回最相似的一个问题）
+        groups = tiers.search_groups(
             collection_name=collection_name,
             query_vector=vector,
             limit=3,
-            score_threshold=0.5
+            score_threshold=0.5,
+            payload_include=SEARCH_HIT_FIELDS
         )
         
-        if not results:
+        if not groups:
             print("❌ 没有找到匹配的结果")
             return
         
-        print(f"✅ 找到 {len(results)} 个结果:\n")
+        print(f"✅ 找到 {len(groups)} 个意图:\n")
         
-        for i, result in enumerate(results, 1):
+        # 一次请求取回所有命中意图的答案
+        intents = AnswerResolver(IntentStore(qdrant, intent_collection_name(collection_name))).resolve_groups(groups)
+        
+        for i, group in enumerate(groups, 1):
+            result = group.hits[0]
             payload = result.payload
             score = result.score
             
@@ -93,7 +108,7 @@ def quick_test(question: str, collection_index: int = 2):
             print(f"   意图: {metadata.get('intentName', 'N/A')}")
             
             # 显示答案
-            answers = metadata.get('answers', [])
+            answers = intents.get(metadata.get('intentId'), {}).get('answers', [])
             if answers and len(answers) > 0:
                 answer = answers[0]
                 if isinstance(answer, dict):
@@ -0,0 +1,149 @@
+"""
+公司注册表
+缓存公司列表及每个公司的意图数、问题数和历史迁移耗时，
+调度时按规模从大到小排序并估算运行时间，无需再次扫描意图表
+"""
+
+import os
+import time
+from typing import List, Dict, Any, Optional
+
+from .cache import load_json, save_json
+from .database import PostgreSQLConnection
+
+
+REGISTRY_FILENAME = 'company_registry.json'
+
+
+class CompanyRegistry:
+    """公司注册表"""
+    
+    def __init__(self, db: PostgreSQLConnection, ttl_hours: Optional[float] = None):
+        """
+        初始化公司注册表
+        
+        Args:
+            db: 数据库连接管理器
+            ttl_hours: 计数的有效期（小时），过期后刷新时重新统计全部公司，
+                默认读取 COMPANY_REGISTRY_TTL_HOURS，未设置为 24
+        """
+        self.db = db
+        if ttl_hours is None:
+            ttl_hours = float(os.getenv('COMPANY_REGISTRY_TTL_HOURS', '24'))
+        self.ttl_seconds = ttl_hours * 3600
+        
+        data = load_json(REGISTRY_FILENAME, {}) or {}
+        self.refreshed_at: float = data.get('refreshed_at', 0)
+        self.companies: Dict[str, Dict[str, Any]] = data.get('companies', {})
+    
+    def is_stale(self) -> bool:
+        """计数是否已过期"""
+        return time.time() - self.refreshed_at > self.ttl_seconds
+    
+    def save(self):
+        """保存注册表"""
+        save_json(REGISTRY_FILENAME, {
+            "refreshed_at": self.refreshed_at,
+            "companies": self.companies
+        })
+    
+    def refresh(self, full: bool = False) -> List[Dict[str, Any]]:
+        """
+        刷新注册表
+        
+        每次都用跳跃扫描发现公司列表（很便宜）；计数过期或 full=True 时
+        用一次 GROUP BY 重新统计所有公司，否则只统计新出现的公司。
+        
+        Args:
+            full: 强制重新统计所有公司
+        
+        Returns:
+            调度顺序的公司列表（见 schedule）
+        """
+        discovered = self.db.get_all_companies()
+        discovered_ids = [company['id'] for company in discovered]
+        
+        if full or self.is_stale():
+            print(f"🔄 重新统计 {len(discovered_ids)} 个公司的意图和问题数...")
+            counts = self.db.get_company_counts()
+            self.refreshed_at = time.time()
+        else:
+            new_ids = [company_id for company_id in discovered_ids if company_id not in self.companies]
+            if new_ids:
+                print(f"🆕 发现 {len(new_ids)} 个新公司，统计其意图和问题数...")
+            counts = self.db.get_company_counts(new_ids)
+        
+        companies = {}
+        for company in discovered:
+            entry = self.companies.get(company['id'], {})
+            entry.update({"name": company['name']})
+            entry.update(counts.get(company['id'], {}))
+            entry.setdefault("intent_count", 0)
+            entry.setdefault("question_count", 0)
+            companies[company['id']] = entry
+        
+        removed = len(set(self.companies) - set(companies))
+        if removed:
+            print(f"🗑️ 移除 {removed} 个已不存在的公司")
+        
+        self.companies = companies
+        self.save()
+        return self.schedule()
+    
+    def record_run(self, company_id: str, total_intents: int, total_questions: int,
+                   duration_seconds: float):
+        """用一次迁移的实际结果更新注册表（计数顺带刷新，耗时用于估算）"""
+        entry = self.companies.setdefault(company_id, {"name": company_id})
+        entry.update({
+            "intent_count": total_intents,
+            "question_count": total_questions,
+            "last_duration_seconds": round(duration_seconds, 3),
+            "last_synced_at": time.time()
+        })
+        self.save()
+    
+    def seconds_per_question(self) -> Optional[float]:
+        """根据历史迁移记录估算每个问题的处理耗时"""
+        history = [
+            entry for entry in self.companies.values()
+            if entry.get('last_duration_seconds') and entry.get('question_count')
+        ]
+        if not history:
+            return None
+        
+        total_seconds = sum(entry['last_duration_seconds'] for entry in history)
+        total_questions = sum(entry['question_count'] for entry in history)
+        return total_seconds / total_questions
+    
+    def schedule(self) -> List[Dict[str, Any]]:
+        """
+        按问题数从大到小排列公司，并附带预计耗时
+        
+        大公司先跑可以让最长的任务尽早开始，整体结束时间更可控。
+        
+        Returns:
+            公司列表，每项包含 id、name、intent_count、question_count、estimated_seconds
+        """
+        rate = self.seconds_per_question()
+        ordered = sorted(
+            self.companies.items(),
+            key=lambda item: (-item[1].get('question_count', 0), item[0])
+        )
+        
+        return [
+            {
+                "id": company_id,
+                "name": entry.get('name', company_id),
+                "intent_count": entry.get('intent_count', 0),
+                "question_count": entry.get('question_count', 0),
+                "estimated_seconds": entry['question_count'] * rate if rate is not None else None
+            }
+            for company_id, entry in ordered
+        ]
+    
+    def estimate_total_seconds(self) -> Optional[float]:
+        """预计全部公司的总耗时"""
+        rate = self.seconds_per_question()
+        if rate is None:
+            return None
+        return sum(entry.get('question_count', 0) for entry in self.companies.values()) * rate
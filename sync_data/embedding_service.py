@@ -5,7 +5,7 @@
 
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union
 import torch
 import os
 
@@ -121,10 +121,18 @@ class LocalEmbeddingService:
             print(f"   问题文本: {text[:100]}...")
             return [0.0] * self.dimensions
     
-    def encode_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
-        """批量编码文本"""
+    def encode_batch(self, texts: List[str], batch_size: int = 32,
+                     as_array: bool = False) -> Union[List[List[float]], np.ndarray]:
+        """
+        批量编码文本
+        
+        Args:
+            texts: 文本列表
+            batch_size: 模型推理批大小
+            as_array: 返回 float32 的 numpy 数组（每行一个向量），大批量迁移时比 list[float] 省内存
+        """
         if not texts:
-            return []
+            return np.zeros((0, self.dimensions), dtype=np.float32) if as_array else []
         
         print(f"🔄 开始批量编码 {len(texts)} 个文本...")
         
@@ -165,6 +173,8 @@ class LocalEmbeddingService:
             )
             
             print(f"✅ 批量编码完成！生成了 {len(embeddings)} 个向量")
+            if as_array:
+                return np.asarray(embeddings, dtype=np.float32)
             return embeddings.tolist()
             
         except Exception as e:
@@ -183,6 +193,8 @@ class LocalEmbeddingService:
                     print(f"❌ 第 {i+1} 个文本编码失败: {single_error}")
                     results.append([0.0] * self.dimensions)
             
+            if as_array:
+                return np.asarray(results, dtype=np.float32)
             return results
     
     def get_model_info(self) -> Dict[str, Any]:
@@ -209,9 +221,9 @@ class LocalEmbeddingService:
         else:
             return "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     
-    def calculate_vector_quality(self, vector: List[float]) -> float:
+    def calculate_vector_quality(self, vector: Union[List[float], np.ndarray]) -> float:
         """计算向量质量分数"""
-        if not vector or len(vector) != self.dimensions:
+        if vector is None or len(vector) != self.dimensions:
             return 0.0
         
         # 基于方差的质量评估
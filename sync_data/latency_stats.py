@@ -0,0 +1,13 @@
+"""
+延迟统计
+基准测试、HNSW 调优和批量查询共用的分位数计算
+"""
+
+from typing import List
+
+
+def percentile(values: List[float], q: float) -> float:
+    """计算分位数（最近秩法）"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
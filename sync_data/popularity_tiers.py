@@ -0,0 +1,224 @@
+"""
+按热度分层存储
+HOT 意图的问题点留在原集合（向量和载荷常驻内存、不量化），WARM/COLD 意图写入冷数据集合
+（<集合>_cold，向量放磁盘、int8 标量量化），搜索先查热数据集合，最高分低于回退阈值时再查冷数据集合
+"""
+
+import os
+from dataclasses import replace
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple
+
+from qdrant_client.models import (
+    Filter, ScalarQuantization, ScalarQuantizationConfig, ScalarType, QuantizationConfig
+)
+
+from .qdrant_manager import QdrantManager
+from .storage_profiles import StorageProfile
+
+
+# 冷数据集合名称后缀
+COLD_COLLECTION_SUFFIX = "_cold"
+
+# 留在热数据集合中的热度分层
+HOT_TIERS = ("HOT",)
+
+# 热数据集合的最高分低于该值时回退到冷数据集合
+DEFAULT_FALLBACK_SCORE = 0.8
+
+
+def cold_collection_name(collection_name: str) -> str:
+    """集合对应的冷数据集合名称"""
+    return f"{collection_name}{COLD_COLLECTION_SUFFIX}"
+
+
+def result_score(result: Any) -> float:
+    """搜索结果的分数（分组搜索的结果取组内最高分）"""
+    hits = getattr(result, 'hits', None)
+    if hits is not None:
+        return hits[0].score if hits else 0.0
+    return result.score
+
+
+class PopularityTiers:
+    """热度分层策略：决定意图写入哪一层，以及分层搜索的回退"""
+    
+    def __init__(self, qdrant: QdrantManager, enabled: Optional[bool] = None,
+                 fallback_score: Optional[float] = None):
+        """
+        初始化热度分层策略
+        
+        Args:
+            qdrant: Qdrant 管理器
+            enabled: 是否分层存储，默认读取 QDRANT_POPULARITY_TIERS（未设置为 False）
+            fallback_score: 热数据集合的最高分低于该值时查询冷数据集合，
+                默认读取 QDRANT_TIER_FALLBACK_SCORE（未设置为 0.8）
+        """
+        if enabled is None:
+            enabled = os.getenv('QDRANT_POPULARITY_TIERS', 'false').lower() in ('1', 'true', 'yes')
+        if fallback_score is None:
+            fallback_score = float(os.getenv('QDRANT_TIER_FALLBACK_SCORE', str(DEFAULT_FALLBACK_SCORE)))
+        
+        self.qdrant = qdrant
+        self.enabled = enabled
+        self.fallback_score = fallback_score
+        self.hot_searches = 0
+        self.fallback_searches = 0
+    
+    @staticmethod
+    def is_cold_collection(collection_name: str) -> bool:
+        return collection_name.endswith(COLD_COLLECTION_SUFFIX)
+    
+    def collections(self, collection_name: str) -> List[str]:
+        """集合及其冷数据集合（未启用分层时只有集合本身）"""
+        if not self.enabled:
+            return [collection_name]
+        return [collection_name, cold_collection_name(collection_name)]
+    
+    def collection_for(self, collection_name: str, popularity_tier: str) -> str:
+        """某个热度分层的意图写入的集合"""
+        if not self.enabled or popularity_tier in HOT_TIERS:
+            return collection_name
+        return cold_collection_name(collection_name)
+    
+    def storage_for(self, collection_name: str,
+                    profile: StorageProfile) -> Tuple[StorageProfile, Optional[QuantizationConfig]]:
+        """
+        新建集合时的存储配置和量化配置
+        
+        热数据集合强制全部放在内存、不量化；冷数据集合向量和载荷放磁盘，int8 量化向量常驻内存，
+        搜索先用量化向量粗排，再从磁盘读取原始向量重排。分段参数沿用按规模选择的配置。
+        """
+        if not self.enabled:
+            return profile, None
+        
+        if not self.is_cold_collection(collection_name):
+            return replace(profile, on_disk_vectors=False, on_disk_payload=False, hnsw_on_disk=False), None
+        
+        quantization = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+        return replace(profile, on_disk_vectors=True, on_disk_payload=True), quantization
+    
+    def search_tiers(self, collection_name: str, search_tier: Callable[[str], List[Any]],
+                     limit: int) -> List[Any]:
+        """
+        分层搜索：先查热数据集合，最高分达到回退阈值时直接返回，否则再查冷数据集合并按分数合并
+        （也用于分组搜索：一个意图只在一层，两层的组按组内最高分合并）
+        
+        Args:
+            collection_name: 热数据集合名称
+            search_tier: 搜索单个集合的函数（参数为集合名称），各层可以使用不同的搜索参数
+            limit: 返回结果数
+        """
+        hot_results = search_tier(collection_name)
+        if not self.enabled or (hot_results and result_score(hot_results[0]) >= self.fallback_score):
+            self.hot_searches += 1
+            return hot_results
+        
+        self.fallback_searches += 1
+        cold_results = search_tier(cold_collection_name(collection_name))
+        return sorted(hot_results + cold_results, key=result_score, reverse=True)[:limit]
+    
+    def search_tiers_batch(self, collection_name: str, query_vectors: Sequence[List[float]],
+                           search_tier_batch: Callable[[str, Sequence[List[float]]], List[List[Any]]],
+                           limit: int) -> List[List[Any]]:
+        """
+        批量分层搜索：一次批量查询热数据集合，只有最高分未达到回退阈值的查询再批量查询冷数据集合
+        
+        Args:
+            collection_name: 热数据集合名称
+            query_vectors: 查询向量
+            search_tier_batch: 批量搜索单个集合的函数（参数为集合名称和查询向量），返回与查询一一对应的结果
+            limit: 每个查询返回的结果数
+        """
+        hot_results = search_tier_batch(collection_name, query_vectors)
+        if not self.enabled:
+            self.hot_searches += len(hot_results)
+            return hot_results
+        
+        fallback = [
+            i for i, results in enumerate(hot_results)
+            if not results or result_score(results[0]) < self.fallback_score
+        ]
+        self.hot_searches += len(hot_results) - len(fallback)
+        self.fallback_searches += len(fallback)
+        if not fallback:
+            return hot_results
+        
+        cold_results = search_tier_batch(cold_collection_name(collection_name), [query_vectors[i] for i in fallback])
+        for i, results in zip(fallback, cold_results):
+            hot_results[i] = sorted(hot_results[i] + results, key=result_score, reverse=True)[:limit]
+        return hot_results
+    
+    def search(self, collection_name: str, query_vector: List[float], limit: int = 10,
+               score_threshold: float = 0.7, filter_conditions: Optional[Filter] = None,
+               **search_kwargs) -> List[Any]:
+        """
+        在集合及其冷数据集合中分层搜索（按公司搜索请使用 TenancyLayout.search_company）
+        
+        Args:
+            collection_name: 热数据集合名称
+            query_vector: 查询向量
+            limit: 返回结果数
+            score_threshold: 最低相似度
+            filter_conditions: 过滤条件
+            search_kwargs: 透传给 QdrantManager.search 的其他参数（如 payload_include）
+        """
+        return self.search_tiers(
+            collection_name,
+            lambda name: self.qdrant.search(name, query_vector, limit=limit, score_threshold=score_threshold,
+                                            filter_conditions=filter_conditions, **search_kwargs),
+            limit
+        )
+    
+    def search_groups(self, collection_name: str, query_vector: List[float], limit: int = 10,
+                      score_threshold: float = 0.7, filter_conditions: Optional[Filter] = None,
+                      **search_kwargs) -> List[Any]:
+        """
+        在集合及其冷数据集合中按意图分组分层搜索（按公司搜索请使用 TenancyLayout.search_company_groups）
+        
+        Args:
+            collection_name: 热数据集合名称
+            query_vector: 查询向量
+            limit: 返回的意图数
+            score_threshold: 最低相似度
+            filter_conditions: 过滤条件
+            search_kwargs: 透传给 QdrantManager.search_groups 的其他参数（如 group_size、payload_include）
+        """
+        return self.search_tiers(
+            collection_name,
+            lambda name: self.qdrant.search_groups(name, query_vector, limit=limit, score_threshold=score_threshold,
+                                                   filter_conditions=filter_conditions, **search_kwargs),
+            limit
+        )
+    
+    def search_batch(self, collection_name: str, query_vectors: Sequence[List[float]], limit: int = 10,
+                     score_threshold: float = 0.7, filter_conditions: Optional[Filter] = None,
+                     **search_kwargs) -> List[List[Any]]:
+        """
+        在集合及其冷数据集合中批量分层搜索（按公司搜索请使用 TenancyLayout.search_company_batch）
+        
+        Args:
+            collection_name: 热数据集合名称
+            query_vectors: 查询向量
+            limit: 每个查询返回的结果数
+            score_threshold: 最低相似度
+            filter_conditions: 过滤条件
+            search_kwargs: 透传给 QdrantManager.search_batch 的其他参数（如 payload_include、batch_size）
+        """
+        return self.search_tiers_batch(
+            collection_name,
+            query_vectors,
+            lambda name, vectors: self.qdrant.search_batch(name, vectors, limit=limit, score_threshold=score_threshold,
+                                                           filter_conditions=filter_conditions, **search_kwargs),
+            limit
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """分层搜索统计"""
+        total = self.hot_searches + self.fallback_searches
+        return {
+            "hot_searches": self.hot_searches,
+            "fallback_searches": self.fallback_searches,
+            "fallback_rate": self.fallback_searches / total if total else 0.0
+        }
@@ -0,0 +1,199 @@
+"""
+在线召回率监控
+按比例抽样线上 HNSW 搜索（包括分组搜索），在后台用相同条件执行一次精确搜索（exact=True），
+计算 overlap@k（分组搜索按组ID计算）并按集合维护滚动窗口；窗口内的召回率定期写入缓存目录，--stats 读取显示。
+集合增长后召回率下降时，提示重新调优（tune_hnsw.py）或重建索引。
+"""
+
+import atexit
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from qdrant_client.models import SearchParams
+
+from .cache import load_json, save_json
+
+
+RECALL_METRICS_FILENAME = 'recall_metrics.json'
+
+# 默认的滚动窗口大小（抽样次数）和告警阈值
+DEFAULT_RECALL_WINDOW = 500
+DEFAULT_RECALL_ALERT = 0.95
+
+# 窗口内样本数达到该值才告警，避免刚启动时少量样本造成误报
+MIN_ALERT_SAMPLES = 50
+
+# 同时排队的影子搜索上限，超过时跳过抽样，避免精确搜索挤占 Qdrant
+MAX_PENDING_CHECKS = 8
+
+
+class RecallMonitor:
+    """影子精确搜索的召回率监控"""
+    
+    def __init__(self, client, sample_rate: Optional[float] = None, window_size: Optional[int] = None,
+                 alert_threshold: Optional[float] = None, export_interval_seconds: Optional[float] = None):
+        """
+        初始化召回率监控
+        
+        Args:
+            client: QdrantClient（影子搜索直接调用，不经过 QdrantManager.search，避免递归抽样）
+            sample_rate: 抽样比例，默认读取 QDRANT_RECALL_SAMPLE_RATE（未设置为 0，即关闭）
+            window_size: 每个集合的滚动窗口大小，默认读取 QDRANT_RECALL_WINDOW（未设置为 500）
+            alert_threshold: 滚动召回率低于该值时告警，默认读取 QDRANT_RECALL_ALERT（未设置为 0.95）
+            export_interval_seconds: 写入缓存的最小间隔（秒），默认读取 QDRANT_RECALL_EXPORT_SECONDS（未设置为 60）
+        """
+        if sample_rate is None:
+            sample_rate = float(os.getenv('QDRANT_RECALL_SAMPLE_RATE', '0'))
+        if window_size is None:
+            window_size = int(os.getenv('QDRANT_RECALL_WINDOW', str(DEFAULT_RECALL_WINDOW)))
+        if alert_threshold is None:
+            alert_threshold = float(os.getenv('QDRANT_RECALL_ALERT', str(DEFAULT_RECALL_ALERT)))
+        if export_interval_seconds is None:
+            export_interval_seconds = float(os.getenv('QDRANT_RECALL_EXPORT_SECONDS', '60'))
+        
+        self.client = client
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.alert_threshold = alert_threshold
+        self.export_interval_seconds = export_interval_seconds
+        self.last_export = 0.0
+        # {集合名称: 滚动窗口内的 overlap@k}
+        self._samples: Dict[str, deque] = {}
+        self._totals: Dict[str, int] = {}
+        self._alerted = set()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+    
+    def observe(self, collection_name: str, results: List[Any], search_kwargs: Dict[str, Any]):
+        """
+        按抽样比例为一次 HNSW 搜索提交影子精确搜索（不阻塞调用方）
+        
+        Args:
+            collection_name: 集合名称
+            results: HNSW 搜索结果
+            search_kwargs: 原搜索的 client.search 参数（query_vector、limit、query_filter 等）
+        """
+        if self._reserve():
+            self._executor.submit(self._check, collection_name, [result.id for result in results], search_kwargs)
+    
+    def observe_groups(self, collection_name: str, groups: List[Any], search_kwargs: Dict[str, Any]):
+        """
+        按抽样比例为一次 HNSW 分组搜索提交影子精确分组搜索，按组ID（默认为意图ID）比较（不阻塞调用方）
+        
+        Args:
+            collection_name: 集合名称
+            groups: HNSW 分组搜索返回的组
+            search_kwargs: 原搜索的 client.search_groups 参数（query_vector、group_by、limit 等）
+        """
+        if self._reserve():
+            self._executor.submit(self._check, collection_name, [group.id for group in groups], search_kwargs, True)
+    
+    def _reserve(self) -> bool:
+        """按抽样比例决定是否核对本次搜索，核对时占用一个排队名额"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        
+        with self._lock:
+            if self._pending >= MAX_PENDING_CHECKS:
+                return False
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recall-monitor')
+                # 进程退出时写入最后一批指标
+                atexit.register(self.close)
+        return True
+    
+    def _check(self, collection_name: str, hnsw_ids: List[Any], search_kwargs: Dict[str, Any],
+               grouped: bool = False):
+        """执行影子精确搜索（grouped 时为分组搜索）并记录 overlap@k"""
+        try:
+            search = self.client.search_groups if grouped else self.client.search
+            exact_results = search(
+                collection_name=collection_name,
+                search_params=SearchParams(exact=True),
+                with_payload=False,
+                with_vectors=False,
+                **search_kwargs
+            )
+            if grouped:
+                exact_results = exact_results.groups
+            exact_ids = {result.id for result in exact_results}
+            if exact_ids:
+                self.record(collection_name, len(exact_ids & set(hnsw_ids)) / len(exact_ids))
+        
+        except Exception as e:
+            print(f"⚠️ 影子精确搜索失败: {collection_name}, 错误: {e}")
+        
+        finally:
+            with self._lock:
+                self._pending -= 1
+    
+    def record(self, collection_name: str, overlap: float):
+        """记录一次 overlap@k，窗口召回率低于阈值时告警，并按间隔写入缓存"""
+        with self._lock:
+            samples = self._samples.setdefault(collection_name, deque(maxlen=self.window_size))
+            samples.append(overlap)
+            self._totals[collection_name] = self._totals.get(collection_name, 0) + 1
+            recall = sum(samples) / len(samples)
+            
+            if len(samples) >= MIN_ALERT_SAMPLES and recall < self.alert_threshold:
+                if collection_name not in self._alerted:
+                    self._alerted.add(collection_name)
+                    print(f"⚠️ 集合 {collection_name} 的在线召回率降至 {recall:.3f}"
+                          f"（阈值 {self.alert_threshold}），建议运行 tune_hnsw.py 重新调优或重建索引")
+            else:
+                self._alerted.discard(collection_name)
+            
+            due = time.time() - self.last_export >= self.export_interval_seconds
+        
+        if due:
+            self.export()
+    
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """每个集合滚动窗口内的召回率统计"""
+        with self._lock:
+            return {
+                collection_name: {
+                    "window": len(samples),
+                    "total_checked": self._totals.get(collection_name, 0),
+                    "recall": sum(samples) / len(samples),
+                    "min_overlap": min(samples),
+                    "below_alert": sum(samples) / len(samples) < self.alert_threshold,
+                    "updated_at": time.time()
+                }
+                for collection_name, samples in self._samples.items() if samples
+            }
+    
+    def export(self) -> Dict[str, Dict[str, Any]]:
+        """把召回率写入缓存目录（与其他进程写入的集合合并），返回合并后的指标"""
+        self.last_export = time.time()
+        metrics = load_json(RECALL_METRICS_FILENAME, {}) or {}
+        metrics.update(self.summary())
+        try:
+            save_json(RECALL_METRICS_FILENAME, metrics)
+        except Exception as e:
+            print(f"⚠️ 写入召回率指标失败: {e}")
+        return metrics
+    
+    def close(self):
+        """等待排队中的影子搜索完成并写入最终指标"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._samples:
+            self.export()
+
+
+def load_recall_metrics() -> Dict[str, Dict[str, Any]]:
+    """读取缓存中的在线召回率指标 {集合名称: 统计}"""
+    return load_json(RECALL_METRICS_FILENAME, {}) or {}
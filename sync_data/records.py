@@ -0,0 +1,193 @@
+"""
+紧凑的知识库数据记录
+使用 __slots__ 数据类代替逐行 dict，降低大批量导出时的内存占用；
+向量点在写入 Qdrant 前以 PendingPoint 暂存，载荷字典只在序列化时构建
+"""
+
+import json
+import uuid
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Any, Optional, Callable
+
+import numpy as np
+
+
+# 向量点ID的命名空间：ID = uuid5(命名空间, originalId)，重复同步会原地覆盖
+POINT_ID_NAMESPACE = uuid.UUID('6f1c1a52-8d0e-4f7a-9b3c-2e5d4a7b9c10')
+
+
+def point_id_from_original_id(original_id: str) -> str:
+    """originalId（公司ID_意图ID_问题序号）对应的确定性点ID"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, original_id))
+
+
+def _parse_bool(value: str) -> bool:
+    """解析 COPY CSV 中的布尔值"""
+    return value == 't'
+
+
+def _parse_int(value: str, default: int = 0) -> int:
+    """解析 COPY CSV 中的整数（NULL 为空串）"""
+    return int(value) if value else default
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    """解析 COPY CSV 中的时间戳（DateStyle=ISO）"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def _parse_json(value: str, default: Any = None) -> Any:
+    """解析 COPY CSV 中的 JSON 文本"""
+    return json.loads(value) if value else default
+
+
+class _MappingAccess:
+    """兼容旧代码的字典式访问（record['id'] / record.get('keywords')）"""
+    
+    __slots__ = ()
+    
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+
+@dataclass(slots=True)
+class IntentRecord(_MappingAccess):
+    """意图记录"""
+    
+    id: str
+    name: str
+    keywords: List[str]
+    usage_count: int
+    is_active: bool
+    is_deleted: int
+    created_at: datetime
+    updated_at: datetime
+    company_id: str
+    
+    # COPY 导出的列顺序，与 from_csv_row 对应
+    COPY_COLUMNS = """
+        ki.id,
+        ki.name,
+        array_to_json(ki.keywords),
+        ki.usage_count,
+        ki."isActive",
+        ki.is_deleted,
+        ki.created_at,
+        ki.updated_at,
+        ki.company_id
+    """
+    
+    @classmethod
+    def from_row(cls, row: tuple) -> "IntentRecord":
+        """从数据库行构建记录（列顺序与字段顺序一致）"""
+        record = cls(*row)
+        if record.keywords is None:
+            record.keywords = []
+        return record
+    
+    @classmethod
+    def from_csv_row(cls, row: List[str]) -> "IntentRecord":
+        """从 COPY CSV 行构建记录"""
+        return cls(
+            id=row[0],
+            name=row[1],
+            keywords=_parse_json(row[2], []),
+            usage_count=_parse_int(row[3]),
+            is_active=_parse_bool(row[4]),
+            is_deleted=_parse_int(row[5]),
+            created_at=_parse_timestamp(row[6]),
+            updated_at=_parse_timestamp(row[7]),
+            company_id=row[8]
+        )
+
+
+@dataclass(slots=True)
+class AnswerRecord(_MappingAccess):
+    """答案记录"""
+    
+    id: str
+    type: str
+    content: Any
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+    
+    # COPY 导出的列顺序（首列为 intent_id，用于分组）
+    COPY_COLUMNS = """
+        a.intent_id,
+        a.id,
+        a.type,
+        to_jsonb(a.content),
+        a."isActive",
+        a.created_at,
+        a.updated_at
+    """
+    
+    @classmethod
+    def from_row(cls, row: tuple) -> "AnswerRecord":
+        """从数据库行构建记录（列顺序与字段顺序一致，不含 intent_id）"""
+        return cls(*row)
+    
+    @classmethod
+    def from_csv_row(cls, row: List[str]) -> "AnswerRecord":
+        """从 COPY CSV 行构建记录（忽略首列 intent_id）"""
+        return cls(
+            id=row[1],
+            type=row[2],
+            content=_parse_json(row[3]),
+            is_active=_parse_bool(row[4]),
+            created_at=_parse_timestamp(row[5]),
+            updated_at=_parse_timestamp(row[6])
+        )
+
+
+@dataclass(slots=True)
+class PendingPoint:
+    """
+    待写入的向量点
+    
+    只保存生成载荷所需的引用：同一意图的所有问题共享意图和答案记录，
+    向量以 float32 数组保存（list[float] 每个元素约 32 字节，float32 只需 4 字节）。
+    """
+    
+    id: str
+    vector: np.ndarray
+    intent: IntentRecord
+    question_index: int
+    answers: List[AnswerRecord]
+    vector_quality: float
+    content_hash: str = ""
+    record_hash: str = ""
+    
+    @property
+    def question(self) -> str:
+        return self.intent.keywords[self.question_index]
+
+
+class LazyPointList(Sequence):
+    """
+    按需构建 PointStruct 的只读序列
+    
+    upsert 按批切片时才调用 builder 生成载荷字典，批次写完即可回收，
+    整个公司的载荷不会同时驻留内存。
+    """
+    
+    def __init__(self, pending: List[PendingPoint], builder: Callable[[PendingPoint], Any]):
+        self.pending = pending
+        self.builder = builder
+    
+    def __len__(self) -> int:
+        return len(self.pending)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.builder(point) for point in self.pending[index]]
+        return self.builder(self.pending[index])
@@ -0,0 +1,356 @@
+"""
+知识库本地快照（Parquet）
+把意图、问题（keywords 列）和答案按公司分区导出为列式文件，
+快照提供与 PostgreSQLConnection 相同的读取接口，迁移器和 API 上传器可直接以它为数据源，
+换模型、换维度、换载荷结构时离线重跑，无需再访问生产数据库
+
+目录结构:
+    <root>/manifest.json
+    <root>/company_id=<公司ID>/intents.parquet
+    <root>/company_id=<公司ID>/answers.parquet
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖：pip install -e ".[snapshot]"
+    pa = None
+    pq = None
+
+from .database import PostgreSQLConnection
+from .records import IntentRecord, AnswerRecord
+
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILENAME = 'manifest.json'
+INTENTS_FILENAME = 'intents.parquet'
+ANSWERS_FILENAME = 'answers.parquet'
+
+# 每个 Parquet row group 的行数，同时也是导出时的内存缓冲上限
+DEFAULT_ROW_GROUP_SIZE = 50000
+
+
+def _require_pyarrow():
+    """检查可选依赖 pyarrow"""
+    if pa is None:
+        raise ImportError("快照功能需要 pyarrow，请执行: pip install -e \".[snapshot]\" 或 pip install pyarrow")
+
+
+def _timestamp_type(sample: Optional[datetime]):
+    """按数据库返回的时间戳类型选择列类型（timestamptz 保留 UTC 时区）"""
+    if sample is not None and sample.tzinfo is not None:
+        return pa.timestamp('us', tz='UTC')
+    return pa.timestamp('us')
+
+
+def _intent_schema(sample: Optional[IntentRecord]):
+    """意图文件的列定义"""
+    ts = _timestamp_type(sample.created_at if sample else None)
+    return pa.schema([
+        ('id', pa.string()),
+        ('name', pa.string()),
+        ('keywords', pa.list_(pa.string())),
+        ('usage_count', pa.int64()),
+        ('is_active', pa.bool_()),
+        ('is_deleted', pa.int32()),
+        ('created_at', ts),
+        ('updated_at', ts),
+        ('company_id', pa.string()),
+    ])
+
+
+def _answer_schema(sample: Optional[AnswerRecord]):
+    """答案文件的列定义"""
+    ts = _timestamp_type(sample.created_at if sample else None)
+    return pa.schema([
+        ('intent_id', pa.string()),
+        ('id', pa.string()),
+        ('type', pa.string()),
+        # 答案内容是任意 JSON，以文本形式保存
+        ('content', pa.string()),
+        ('is_active', pa.bool_()),
+        ('created_at', ts),
+        ('updated_at', ts),
+    ])
+
+
+class _BatchedParquetWriter:
+    """按 row group 大小缓冲后写入 Parquet，schema 由第一条记录确定"""
+    
+    def __init__(self, path: str, schema_factory, row_group_size: int):
+        self.path = path
+        self.schema_factory = schema_factory
+        self.row_group_size = row_group_size
+        self.columns: Dict[str, list] = {}
+        self.writer = None
+        self.rows = 0
+    
+    def append(self, row: Dict[str, Any], sample=None):
+        if self.writer is None:
+            schema = self.schema_factory(sample)
+            self.writer = pq.ParquetWriter(self.path, schema, compression='zstd')
+            self.columns = {name: [] for name in schema.names}
+        
+        for name, values in self.columns.items():
+            values.append(row[name])
+        self.rows += 1
+        
+        if len(self.columns['id']) >= self.row_group_size:
+            self.flush()
+    
+    def flush(self):
+        if self.writer is None or not self.columns['id']:
+            return
+        self.writer.write_table(pa.table(self.columns, schema=self.writer.schema))
+        self.columns = {name: [] for name in self.columns}
+    
+    def close(self):
+        if self.writer is None:
+            # 空分区也写出文件，读取时无需区分
+            pq.write_table(self.schema_factory(None).empty_table(), self.path)
+            return
+        self.flush()
+        self.writer.close()
+
+
+def get_partition_dir(root: str, company_id: str) -> str:
+    """公司分区目录"""
+    return os.path.join(root, f"company_id={quote(company_id, safe='')}")
+
+
+def export_snapshot(db: PostgreSQLConnection, root: str, company_ids: Optional[List[str]] = None,
+                    row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> Dict[str, Any]:
+    """
+    通过 COPY 流式导出知识库到 Parquet 快照
+    
+    每个公司一个分区，数据按 row group 分批写出，内存占用与公司规模无关。
+    manifest.json 最后写入，导出中断时快照不会被当作完整快照读取。
+    
+    Args:
+        db: 数据库连接管理器
+        root: 快照根目录
+        company_ids: 只导出这些公司，为 None 时导出所有公司
+        row_group_size: 每个 row group 的行数
+    
+    Returns:
+        快照清单
+    """
+    _require_pyarrow()
+    
+    if company_ids is None:
+        company_ids = [company['id'] for company in db.get_all_companies()]
+    
+    os.makedirs(root, exist_ok=True)
+    manifest_path = os.path.join(root, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    
+    print(f"📦 导出知识库快照到 {root}，共 {len(company_ids)} 个公司")
+    start_time = time.time()
+    companies = {}
+    
+    for i, company_id in enumerate(company_ids, 1):
+        partition_dir = get_partition_dir(root, company_id)
+        os.makedirs(partition_dir, exist_ok=True)
+        
+        intent_writer = _BatchedParquetWriter(
+            os.path.join(partition_dir, INTENTS_FILENAME), _intent_schema, row_group_size
+        )
+        question_count = 0
+        for intent in db.iter_company_intents_copy(company_id):
+            intent_writer.append({
+                "id": intent.id,
+                "name": intent.name,
+                "keywords": intent.keywords,
+                "usage_count": intent.usage_count,
+                "is_active": intent.is_active,
+                "is_deleted": intent.is_deleted,
+                "created_at": intent.created_at,
+                "updated_at": intent.updated_at,
+                "company_id": intent.company_id
+            }, intent)
+            question_count += len(intent.keywords or [])
+        intent_writer.close()
+        
+        answer_writer = _BatchedParquetWriter(
+            os.path.join(partition_dir, ANSWERS_FILENAME), _answer_schema, row_group_size
+        )
+        for row in db.copy_rows(*db.build_answers_copy_query(company_id)):
+            answer = AnswerRecord.from_csv_row(row)
+            answer_writer.append({
+                "intent_id": row[0],
+                "id": answer.id,
+                "type": answer.type,
+                "content": json.dumps(answer.content, ensure_ascii=False),
+                "is_active": answer.is_active,
+                "created_at": answer.created_at,
+                "updated_at": answer.updated_at
+            }, answer)
+        answer_writer.close()
+        
+        companies[company_id] = {
+            "intent_count": intent_writer.rows,
+            "question_count": question_count,
+            "answer_count": answer_writer.rows
+        }
+        print(f"   {i}/{len(company_ids)} {company_id}: {intent_writer.rows} 个意图, "
+              f"{question_count} 个问题, {answer_writer.rows} 个答案")
+    
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "source": f"{db.connection_params['database']}.{db.schema}",
+        "companies": companies
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    
+    print(f"✅ 快照导出完成，耗时 {time.time() - start_time:.2f} 秒")
+    return manifest
+
+
+class KnowledgeBaseSnapshot:
+    """
+    Parquet 快照数据源
+    
+    提供迁移器和 API 上传器用到的 PostgreSQLConnection 读取接口，
+    返回的意图和答案是 IntentRecord / AnswerRecord。
+    """
+    
+    def __init__(self, root: str):
+        """
+        打开快照
+        
+        Args:
+            root: 快照根目录（包含 manifest.json）
+        """
+        _require_pyarrow()
+        
+        manifest_path = os.path.join(root, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"快照不完整或不存在: 缺少 {manifest_path}")
+        
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        
+        if self.manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"不支持的快照版本: {self.manifest.get('format_version')}")
+        
+        self.root = root
+        self.schema = 'snapshot'
+        
+        # 最近读取的公司的答案缓存（迁移器逐个公司处理，只保留一个）
+        self._answers_company: Optional[str] = None
+        self._answers_map: Dict[str, List[AnswerRecord]] = {}
+        self._intent_company: Dict[str, str] = {}
+        
+        print(f"📦 使用知识库快照: {root} (导出于 {self.manifest['created_at']}, "
+              f"{len(self.manifest['companies'])} 个公司)")
+    
+    def test_connection(self) -> bool:
+        """快照无需连接，始终可用"""
+        return True
+    
+    def get_all_companies(self) -> List[Dict[str, Any]]:
+        """获取快照中的所有公司"""
+        return [{"id": company_id, "name": company_id} for company_id in sorted(self.manifest['companies'])]
+    
+    def get_company_counts(self, company_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, int]]:
+        """从清单读取各公司的意图数和问题数"""
+        return {
+            company_id: {
+                "intent_count": counts['intent_count'],
+                "question_count": counts['question_count']
+            }
+            for company_id, counts in self.manifest['companies'].items()
+            if company_ids is None or company_id in company_ids
+        }
+    
+    def get_database_stats(self, exact: bool = True) -> Dict[str, Any]:
+        """从清单汇总统计信息"""
+        companies = self.manifest['companies'].values()
+        return {
+            "total_companies": len(self.manifest['companies']),
+            "total_intents": sum(c['intent_count'] for c in companies),
+            "total_questions": sum(c['question_count'] for c in companies),
+            "total_answers": sum(c['answer_count'] for c in companies),
+            "estimated": False
+        }
+    
+    def _read_partition(self, company_id: str, filename: str):
+        """读取公司分区中的一个文件，公司不在快照中时返回 None"""
+        if company_id not in self.manifest['companies']:
+            return None
+        return pq.read_table(os.path.join(get_partition_dir(self.root, company_id), filename))
+    
+    def iter_company_intents_copy(self, company_id: str) -> Iterator[IntentRecord]:
+        """按导出顺序逐条读取公司的意图（与 COPY 导出接口一致）"""
+        table = self._read_partition(company_id, INTENTS_FILENAME)
+        if table is None:
+            return
+        
+        for batch in table.to_batches():
+            columns = batch.to_pydict()
+            for values in zip(*(columns[name] for name in batch.schema.names)):
+                record = IntentRecord(*values)
+                if record.keywords is None:
+                    record.keywords = []
+                yield record
+    
+    def get_company_intents(self, company_id: Optional[str] = None) -> List[IntentRecord]:
+        """获取公司的意图（company_id 为 None 时返回所有公司）"""
+        company_ids = [company_id] if company_id else sorted(self.manifest['companies'])
+        intents = [intent for cid in company_ids for intent in self.iter_company_intents_copy(cid)]
+        self._intent_company = {intent.id: intent.company_id for intent in intents}
+        return intents
+    
+    def copy_company_answers(self, company_id: str) -> Dict[str, List[AnswerRecord]]:
+        """获取公司所有意图的答案（结果缓存到下一个公司被读取为止）"""
+        if company_id == self._answers_company:
+            return self._answers_map
+        
+        answers_map: Dict[str, List[AnswerRecord]] = {}
+        table = self._read_partition(company_id, ANSWERS_FILENAME)
+        if table is not None:
+            columns = table.to_pydict()
+            for intent_id, answer_id, answer_type, content, is_active, created_at, updated_at in zip(
+                columns['intent_id'], columns['id'], columns['type'], columns['content'],
+                columns['is_active'], columns['created_at'], columns['updated_at']
+            ):
+                answers_map.setdefault(intent_id, []).append(AnswerRecord(
+                    id=answer_id,
+                    type=answer_type,
+                    content=json.loads(content) if content else None,
+                    is_active=is_active,
+                    created_at=created_at,
+                    updated_at=updated_at
+                ))
+        
+        self._answers_company = company_id
+        self._answers_map = answers_map
+        return answers_map
+    
+    def get_answers_by_intent_ids(self, intent_ids: List[str]) -> Dict[str, List[AnswerRecord]]:
+        """批量获取意图的答案（意图须先通过 get_company_intents 读取）"""
+        result = {}
+        company_ids = {self._intent_company[intent_id] for intent_id in intent_ids if intent_id in self._intent_company}
+        for company_id in company_ids:
+            answers_map = self.copy_company_answers(company_id)
+            for intent_id in intent_ids:
+                if intent_id in answers_map:
+                    result[intent_id] = answers_map[intent_id]
+        return result
+    
+    def get_intent_answers(self, intent_id: str) -> List[AnswerRecord]:
+        """获取单个意图的答案"""
+        company_id = self._intent_company.get(intent_id)
+        if company_id is None:
+            return []
+        return self.copy_company_answers(company_id).get(intent_id, [])
@@ -0,0 +1,114 @@
+"""
+集合存储配置
+按预计点数和 Qdrant 主机的 CPU 数选择存储方式和分段大小：小集合全部放在内存，
+大集合把向量放到 mmap、载荷放到磁盘，避免大租户和小租户争抢内存
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """一组集合存储参数"""
+    
+    name: str
+    description: str
+    # 自动选择时适用的点数上限（不含），None 表示不设上限
+    max_points: Optional[int]
+    on_disk_vectors: bool
+    on_disk_payload: bool
+    hnsw_on_disk: bool
+    # 分段数取 CPU 数，并限制在 [min_segments, max_segments] 之间
+    min_segments: int
+    max_segments: int
+    # 单个分段的大小上限（KB）
+    max_segment_size_kb: int
+    shard_number: int = 1
+    
+    def segment_number(self, cpu_count: int) -> int:
+        """按 CPU 数确定默认分段数（搜索时各分段并行）"""
+        return max(self.min_segments, min(cpu_count, self.max_segments))
+    
+    def summary(self, cpu_count: int) -> str:
+        """配置的简短描述（用于日志）"""
+        vectors = "mmap" if self.on_disk_vectors else "内存"
+        payload = "磁盘" if self.on_disk_payload else "内存"
+        return (f"{self.name}（向量: {vectors}, 载荷: {payload}, HNSW: {'磁盘' if self.hnsw_on_disk else '内存'}, "
+                f"{self.segment_number(cpu_count)} 个分段, 分段上限 {self.max_segment_size_kb // 1000}MB, "
+                f"{self.shard_number} 个分片）")
+
+
+STORAGE_PROFILES: Dict[str, StorageProfile] = {
+    profile.name: profile for profile in (
+        StorageProfile(
+            name="small",
+            description="全部在内存，2 个小分段（原默认配置）",
+            max_points=100_000,
+            on_disk_vectors=False,
+            on_disk_payload=False,
+            hnsw_on_disk=False,
+            min_segments=2,
+            max_segments=2,
+            max_segment_size_kb=50_000
+        ),
+        StorageProfile(
+            name="medium",
+            description="向量和 HNSW 在内存，载荷在磁盘，分段数随 CPU",
+            max_points=1_000_000,
+            on_disk_vectors=False,
+            on_disk_payload=True,
+            hnsw_on_disk=False,
+            min_segments=2,
+            max_segments=8,
+            max_segment_size_kb=200_000
+        ),
+        StorageProfile(
+            name="large",
+            description="向量 mmap、载荷在磁盘，只有 HNSW 图常驻内存，大分段",
+            max_points=None,
+            on_disk_vectors=True,
+            on_disk_payload=True,
+            hnsw_on_disk=False,
+            min_segments=2,
+            max_segments=16,
+            max_segment_size_kb=1_000_000,
+            shard_number=2
+        ),
+    )
+}
+
+# 自动选择（按点数）
+AUTO_PROFILE = "auto"
+
+
+def host_cpu_count() -> int:
+    """Qdrant 主机的 CPU 数，默认读取 QDRANT_HOST_CPUS（Qdrant 不在本机时需要设置），未设置时取本机 CPU 数"""
+    return int(os.getenv('QDRANT_HOST_CPUS', str(os.cpu_count() or 1)))
+
+
+def select_storage_profile(expected_points: int, name: Optional[str] = None) -> StorageProfile:
+    """
+    选择存储配置
+    
+    Args:
+        expected_points: 集合预计的点数
+        name: 配置名称（small / medium / large / auto），默认读取 QDRANT_STORAGE_PROFILE（未设置为 auto）
+    
+    Returns:
+        存储配置；auto 时选择点数上限大于 expected_points 的第一个配置
+    """
+    if name is None:
+        name = os.getenv('QDRANT_STORAGE_PROFILE', AUTO_PROFILE)
+    
+    if name != AUTO_PROFILE:
+        if name not in STORAGE_PROFILES:
+            raise ValueError(f"未知的存储配置: {name}（可选: {AUTO_PROFILE}, {', '.join(STORAGE_PROFILES)}）")
+        return STORAGE_PROFILES[name]
+    
+    for profile in STORAGE_PROFILES.values():
+        if profile.max_points is None or expected_points < profile.max_points:
+            return profile
+    return list(STORAGE_PROFILES.values())[-1]
+
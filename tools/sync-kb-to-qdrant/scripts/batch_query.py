@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+批量查询
+从文件读取问题，批量编码、批量搜索，把每个问题命中的 top-k 意图、分数和各阶段耗时写入 CSV / JSONL，
+用于离线评估（上千个问题几秒内完成）。输入中带有期望意图时同时统计 hit@1 / hit@k。
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+
+from sync_data.embedding_service import LocalEmbeddingService
+from sync_data.latency_stats import percentile
+from sync_data.intent_store import SEARCH_HIT_FIELDS
+from sync_data.popularity_tiers import PopularityTiers
+from sync_data.qdrant_manager import QdrantManager, DEFAULT_COLLECTION_NAME, DEFAULT_SEARCH_BATCH_SIZE
+from sync_data.tenancy import TenancyLayout
+
+
+# 输入文件中的问题列和期望意图列
+QUESTION_FIELD = "question"
+EXPECTED_INTENT_FIELD = "expected_intent_id"
+
+# CSV 输出中列表字段的分隔符
+CSV_LIST_SEPARATOR = "|"
+
+
+def read_questions(path: str) -> List[Dict[str, Any]]:
+    """
+    读取问题文件
+    
+    - .jsonl: 每行一个对象，question 为问题，可选 expected_intent_id
+    - .csv: 表头包含 question，可选 expected_intent_id
+    - 其他: 纯文本，每行一个问题
+    """
+    rows = []
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8') as f:
+        if extension == '.jsonl':
+            rows = [json.loads(line) for line in f if line.strip()]
+        elif extension == '.csv':
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [{QUESTION_FIELD: line.strip()} for line in f if line.strip()]
+    
+    return [row for row in rows if str(row.get(QUESTION_FIELD) or '').strip()]
+
+
+def top_intents(results: List[Any], top_k: int) -> List[Dict[str, Any]]:
+    """把命中的问题点按意图去重（保留每个意图的最高分），返回前 top_k 个意图"""
+    intents = {}
+    for result in results:
+        metadata = (result.payload or {}).get('metadata', {})
+        intent_id = metadata.get('intentId')
+        if intent_id is None or intent_id in intents:
+            continue
+        intents[intent_id] = {
+            "intent_id": intent_id,
+            "intent_name": metadata.get('intentName', ''),
+            "score": result.score,
+            "matched_question": (result.payload or {}).get('content', '')
+        }
+    return list(intents.values())[:top_k]
+
+
+def write_results(path: str, records: List[Dict[str, Any]]):
+    """按扩展名把结果写入 CSV 或 JSONL（CSV 中的列表字段用 | 连接）"""
+    if path.lower().endswith('.csv'):
+        # 只有部分问题带期望意图时，表头取所有记录字段的并集
+        fieldnames = list(dict.fromkeys(key for record in records for key in record)) or [QUESTION_FIELD]
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for record in records:
+                writer.writerow({
+                    key: CSV_LIST_SEPARATOR.join(str(item) for item in value) if isinstance(value, list) else value
+                    for key, value in record.items()
+                })
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def run_batch(rows: List[Dict[str, Any]], embedding: LocalEmbeddingService, qdrant: QdrantManager,
+              collection_name: str, company_id: Optional[str], top_k: int, score_threshold: float,
+              batch_size: int) -> Dict[str, Any]:
+    """
+    批量编码并批量搜索
+    
+    Returns:
+        {"records": 每个问题一条结果, "encode_seconds", "search_seconds", "batch_ms": 每批搜索耗时}
+    """
+    questions = [str(row[QUESTION_FIELD]).strip() for row in rows]
+    
+    # 阶段一：一次性批量编码
+    start = time.perf_counter()
+    vectors = embedding.encode_batch(questions)
+    encode_seconds = time.perf_counter() - start
+    encode_ms = encode_seconds * 1000 / len(questions)
+    
+    # 阶段二：按批搜索（同一意图的多个问题点会同时命中，多取一些再按意图去重）
+    search_limit = top_k * 3
+    if company_id:
+        tenancy = TenancyLayout(qdrant, collection_name)
+        print(f"📦 公司 {company_id} 的集合: {tenancy.collection_for(company_id)}")
+        
+        def search_batch(batch_vectors):
+            return tenancy.search_company_batch(company_id, batch_vectors, limit=search_limit,
+                                                score_threshold=score_threshold, payload_include=SEARCH_HIT_FIELDS,
+                                                batch_size=batch_size)
+    else:
+        tiers = PopularityTiers(qdrant)
+        
+        def search_batch(batch_vectors):
+            return tiers.search_batch(collection_name, batch_vectors, limit=search_limit,
+                                      score_threshold=score_threshold, payload_include=SEARCH_HIT_FIELDS,
+                                      batch_size=batch_size)
+    
+    records = []
+    batch_ms = []
+    search_seconds = 0.0
+    for offset in range(0, len(questions), batch_size):
+        batch_vectors = vectors[offset:offset + batch_size]
+        start = time.perf_counter()
+        batch_results = search_batch(batch_vectors)
+        elapsed = time.perf_counter() - start
+        search_seconds += elapsed
+        batch_ms.append(elapsed * 1000)
+        
+        for i, results in enumerate(batch_results):
+            row = rows[offset + i]
+            intents = top_intents(results, top_k)
+            record = {
+                "question": questions[offset + i],
+                "top_intent_id": intents[0]["intent_id"] if intents else None,
+                "top_score": round(intents[0]["score"], 4) if intents else None,
+                "intent_ids": [intent["intent_id"] for intent in intents],
+                "intent_names": [intent["intent_name"] for intent in intents],
+                "scores": [round(intent["score"], 4) for intent in intents],
+                "matched_questions": [intent["matched_question"] for intent in intents],
+                "encode_ms": round(encode_ms, 3),
+                "search_ms": round(elapsed * 1000 / len(batch_results), 3)
+            }
+            
+            expected = row.get(EXPECTED_INTENT_FIELD)
+            if expected:
+                ids = record["intent_ids"]
+                record[EXPECTED_INTENT_FIELD] = expected
+                record["hit_rank"] = ids.index(expected) + 1 if expected in ids else None
+            records.append(record)
+    
+    return {
+        "records": records,
+        "encode_seconds": encode_seconds,
+        "search_seconds": search_seconds,
+        "batch_ms": batch_ms
+    }
+
+
+def print_summary(run: Dict[str, Any], top_k: int, batch_size: int):
+    """打印吞吐量、各阶段耗时和命中率"""
+    records = run["records"]
+    total = len(records)
+    total_seconds = run["encode_seconds"] + run["search_seconds"]
+    
+    print("\n" + "=" * 60)
+    print("📊 批量查询结果")
+    print("=" * 60)
+    print(f"   问题数: {total}")
+    print(f"   编码耗时: {run['encode_seconds']:.2f}s（{run['encode_seconds'] * 1000 / total:.2f} ms/问题）")
+    print(f"   搜索耗时: {run['search_seconds']:.2f}s（{run['search_seconds'] * 1000 / total:.2f} ms/问题, "
+          f"每批 {batch_size} 个: p50 {percentile(run['batch_ms'], 50):.1f} ms, "
+          f"p99 {percentile(run['batch_ms'], 99):.1f} ms）")
+    print(f"   吞吐量: {total / total_seconds:.1f} 问题/秒")
+    print(f"   无结果: {sum(1 for record in records if not record['intent_ids'])}")
+    
+    labeled = [record for record in records if EXPECTED_INTENT_FIELD in record]
+    if labeled:
+        hit_1 = sum(1 for record in labeled if record["hit_rank"] == 1) / len(labeled)
+        hit_k = sum(1 for record in labeled if record["hit_rank"] is not None) / len(labeled)
+        print(f"   命中率（{len(labeled)} 个带期望意图的问题）: hit@1 {hit_1:.3f}, hit@{top_k} {hit_k:.3f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='从文件批量查询问题，把命中的意图、分数和耗时写入 CSV / JSONL')
+    parser.add_argument('input', help='问题文件（.txt 每行一个问题，或带 question 列的 .csv / .jsonl）')
+    parser.add_argument('--output', type=str, default='batch_results.jsonl',
+                        help='结果文件，按扩展名写入 .csv 或 .jsonl (默认: batch_results.jsonl)')
+    parser.add_argument('--collection', type=str, default=DEFAULT_COLLECTION_NAME,
+                        help=f'集合名称 (默认: {DEFAULT_COLLECTION_NAME})')
+    parser.add_argument('--company', type=str, default=None,
+                        help='只在该公司的知识库中搜索（按租户隔离策略定位集合）')
+    parser.add_argument('--model', default='shibing624/text2vec-base-chinese',
+                        help='嵌入模型名称，需与集合写入时一致 (默认: shibing624/text2vec-base-chinese)')
+    parser.add_argument('--top-k', type=int, default=5, help='每个问题输出的意图数 (默认: 5)')
+    parser.add_argument('--score-threshold', type=float, default=0.5, help='最低相似度 (默认: 0.5)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_SEARCH_BATCH_SIZE,
+                        help=f'每次搜索请求合并的问题数 (默认: {DEFAULT_SEARCH_BATCH_SIZE})')
+    
+    args = parser.parse_args()
+    
+    load_dotenv()
+    
+    print("=" * 60)
+    print("📦 批量查询")
+    print("=" * 60)
+    
+    rows = read_questions(args.input)
+    if not rows:
+        print(f"❌ 没有从 {args.input} 读取到问题")
+        return False
+    print(f"📄 读取到 {len(rows)} 个问题")
+    
+    qdrant = QdrantManager()
+    embedding = LocalEmbeddingService(args.model)
+    
+    run = run_batch(rows, embedding, qdrant, args.collection, args.company, args.top_k,
+                    args.score_threshold, args.batch_size)
+    print_summary(run, args.top_k, args.batch_size)
+    
+    write_results(args.output, run["records"])
+    print(f"💾 结果已保存: {args.output}")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
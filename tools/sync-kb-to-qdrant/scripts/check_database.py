@@ -3,9 +3,10 @@
 数据库表结构检查工具
 """
 
+import argparse
 import os
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # 添加项目路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -136,8 +137,54 @@ def interactive_schema_test():
             print(f"❌ 测试Schema '{schema_input}' 失败: {e}")
 
 
+def profile_database(company_id: Optional[str], sample_size: int, report_file: Optional[str]):
+    """剖析同步查询并检查索引"""
+    from sync_data.company_registry import CompanyRegistry
+    from sync_data.db_profiler import QueryProfiler
+    
+    print("\n🔬 同步查询剖析 (EXPLAIN ANALYZE, BUFFERS)")
+    print("=" * 50)
+    
+    try:
+        db = PostgreSQLConnection()
+        
+        if not db.test_connection():
+            print("❌ 数据库连接失败，请检查配置")
+            return
+        
+        if not company_id:
+            # 默认使用注册表中最大的公司，最能暴露导出瓶颈
+            schedule = CompanyRegistry(db).schedule()
+            companies = schedule or db.get_all_companies()
+            if not companies:
+                print("❌ 没有找到任何公司数据")
+                return
+            company_id = companies[0]['id']
+            print(f"📌 未指定公司，使用: {company_id}")
+        
+        profiler = QueryProfiler(db)
+        report = profiler.profile(company_id, sample_size)
+        profiler.print_report(report)
+        
+        if report_file is not None:
+            profiler.save_report(report, report_file or None)
+        
+    except Exception as e:
+        print(f"❌ 剖析失败: {e}")
+
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='知识库数据库结构检查工具')
+    parser.add_argument('--profile', action='store_true',
+                        help='剖析同步查询 (EXPLAIN ANALYZE) 并检查索引，给出建议的 DDL')
+    parser.add_argument('--company', type=str, help='剖析使用的公司ID (默认: 问题数最多的公司)')
+    parser.add_argument('--sample-size', type=int, default=1000,
+                        help='按ID批量查询时使用的意图ID数量 (默认: 1000)')
+    parser.add_argument('--report', nargs='?', const='', default=None, metavar='FILE',
+                        help='保存剖析报告为 JSON (默认文件名: db_profile_<时间戳>.json)')
+    args = parser.parse_args()
+    
     print("🔍 知识库数据库结构检查工具")
     print("=" * 60)
     
@@ -155,6 +202,10 @@ def main():
     # 检查数据库结构
     check_database_structure()
     
+    if args.profile:
+        profile_database(args.company, args.sample_size, args.report)
+        return
+    
     # 建议修复方案
     suggest_schema_fix()
     
@@ -5,6 +5,7 @@
 import argparse
 import sys
 import os
+import time
 from typing import Optional
 
 # 添加项目路径
@@ -91,7 +92,7 @@ def check_environment():
             return False
         
         print("✅ 数据库表结构检查通过")
-        
+    
     except Exception as e:
         print(f"\n⚠️ 数据库连接或表检查失败: {e}")
         print(f"💡 建议运行: python check_database.py")
@@ -100,20 +101,38 @@ def check_environment():
     return True
 
 
-def migrate_company(company_id: str, model_name: str):
+def open_source(snapshot_dir: Optional[str]):
+    """打开数据源：指定快照目录时读取本地快照，否则返回 None（使用 PostgreSQL）"""
+    if not snapshot_dir:
+        return None
+    
+    from sync_data.snapshot import KnowledgeBaseSnapshot
+    return KnowledgeBaseSnapshot(snapshot_dir)
+
+
+def migrate_company(company_id: str, model_name: str, bulk: bool = False, extract_workers: int = 0,
+                    snapshot_dir: Optional[str] = None, bulk_load: bool = False):
     """迁移指定公司"""
     try:
         print(f"🎯 开始迁移公司: {company_id}")
         print(f"🧠 使用模型: {model_name}")
         
-        migrator = KnowledgeBaseMigrator(model_name)
-        result = migrator.migrate_company(company_id)
+        migrator = KnowledgeBaseMigrator(model_name, source=open_source(snapshot_dir))
+        result = migrator.migrate_company(company_id, bulk=bulk, extract_workers=extract_workers,
+                                          bulk_load=bulk_load)
+        migrator.refresh_stats_snapshot()
         
         print("\n📊 迁移结果:")
         print(f"   公司ID: {result['company_id']}")
         print(f"   总意图数: {result['total_intents']}")
         print(f"   总问题数: {result['total_questions']}")
         print(f"   总向量数: {result['total_vectors']}")
+        print(f"   写入向量数: {result['upserted_vectors']}")
+        print(f"   未变化跳过: {result['skipped_vectors']}")
+        print(f"   只更新使用统计: {result['updated_payload_vectors']}")
+        if result['failed_vectors']:
+            print(f"   写入失败: {result['failed_vectors']}")
+        print(f"   删除过期点: {result['deleted_stale_vectors']}")
         print(f"   成功数: {result['success_count']}")
         print(f"   失败数: {result['error_count']}")
         print(f"   耗时: {result['duration_seconds']:.2f} 秒")
@@ -125,50 +144,185 @@ def migrate_company(company_id: str, model_name: str):
                 print(f"   - {error}")
         
         return result['success']
-        
+    
     except Exception as e:
         print(f"❌ 迁移失败: {e}")
         return False
 
 
-def migrate_all_companies(model_name: str):
+def migrate_all_companies(model_name: str, bulk: bool = False, extract_workers: int = 0,
+                          refresh_companies: bool = False, snapshot_dir: Optional[str] = None,
+                          bulk_load: bool = False):
     """迁移所有公司"""
     try:
         print("🌐 开始迁移所有公司")
         print(f"🧠 使用模型: {model_name}")
         
-        migrator = KnowledgeBaseMigrator(model_name)
-        results = migrator.migrate_all_companies()
+        migrator = KnowledgeBaseMigrator(model_name, source=open_source(snapshot_dir))
+        results = migrator.migrate_all_companies(bulk=bulk, extract_workers=extract_workers,
+                                                 refresh_companies=refresh_companies, bulk_load=bulk_load)
         
         # 返回成功状态
         total_companies = len(results)
         successful_companies = sum(1 for r in results if r['success'])
         
         return successful_companies == total_companies
-        
+    
     except Exception as e:
         print(f"❌ 批量迁移失败: {e}")
         return False
 
 
-def show_stats():
-    """显示数据库统计"""
+def rebuild_collection(model_name: str, bulk: bool = False, extract_workers: int = 0,
+                       snapshot_dir: Optional[str] = None, bulk_load: bool = False, keep_versions: int = 1):
+    """零停机重建：写入新版本集合，校验后切换别名"""
     try:
+        print("🏗️ 开始零停机重建")
+        print(f"🧠 使用模型: {model_name}")
+        
+        migrator = KnowledgeBaseMigrator(model_name, source=open_source(snapshot_dir))
+        summary = migrator.rebuild_collection(bulk=bulk, extract_workers=extract_workers,
+                                              bulk_load=bulk_load, keep_versions=keep_versions)
+        
+        print("\n📊 重建结果:")
+        print(f"   新版本: {summary['version'] or '-'}")
+        print(f"   别名已切换: {'✅ 是' if summary['activated'] else '❌ 否'}")
+        if summary['activated']:
+            print(f"   切换后追平修改: {'✅ 是' if summary['caught_up'] else '⚠️ 否'}")
+        if summary['deleted_versions']:
+            print(f"   已清理旧版本: {', '.join(summary['deleted_versions'])}")
+        
+        return summary['activated']
+    
+    except Exception as e:
+        print(f"❌ 重建失败: {e}")
+        return False
+
+
+def export_snapshot(snapshot_dir: str):
+    """导出知识库到本地 Parquet 快照"""
+    try:
+        from sync_data.database import PostgreSQLConnection
+        from sync_data.snapshot import export_snapshot as export_to_parquet
+        
+        manifest = export_to_parquet(PostgreSQLConnection(), snapshot_dir)
+        
+        companies = manifest['companies'].values()
+        print(f"\n📊 快照统计:")
+        print(f"   公司数量: {len(manifest['companies'])}")
+        print(f"   意图数量: {sum(c['intent_count'] for c in companies)}")
+        print(f"   问题数量: {sum(c['question_count'] for c in companies)}")
+        print(f"   答案数量: {sum(c['answer_count'] for c in companies)}")
+        print(f"\n💡 离线迁移: python main.py --all --from-snapshot {snapshot_dir}")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 导出快照失败: {e}")
+        return False
+
+
+def apply_storage_profile(collection_name: str, profile_name: Optional[str] = None):
+    """按当前点数（或指定的配置）为已有集合应用存储配置"""
+    try:
+        from sync_data.qdrant_manager import QdrantManager
+        from sync_data.storage_profiles import select_storage_profile
+        
+        qdrant = QdrantManager()
+        points = qdrant.count_points(collection_name, exact=False)
+        if points is None:
+            return False
+        
+        profile = select_storage_profile(points, profile_name)
+        print(f"📊 集合 {collection_name} 约有 {points} 个点，使用存储配置: {profile.name}（{profile.description}）")
+        return qdrant.apply_storage_profile(collection_name, profile)
+    
+    except Exception as e:
+        print(f"❌ 应用存储配置失败: {e}")
+        return False
+
+
+def show_companies(refresh: bool):
+    """显示公司注册表（调度顺序、规模和预计耗时）"""
+    try:
+        from sync_data.database import PostgreSQLConnection
+        from sync_data.company_registry import CompanyRegistry
+        
+        registry = CompanyRegistry(PostgreSQLConnection())
+        companies = registry.refresh(full=refresh)
+        
+        print(f"\n🏢 共 {len(companies)} 个公司（按问题数从大到小）:")
+        for i, company in enumerate(companies, 1):
+            estimate = company['estimated_seconds']
+            estimate_text = f"{estimate:.0f} 秒" if estimate is not None else "暂无历史数据"
+            print(f"   {i}. {company['id']}")
+            print(f"      意图: {company['intent_count']}  问题: {company['question_count']}  预计耗时: {estimate_text}")
+        
+        total_estimate = registry.estimate_total_seconds()
+        if total_estimate is not None:
+            print(f"\n⏱️ 预计全量迁移耗时: {total_estimate / 60:.1f} 分钟")
+    
+    except Exception as e:
+        print(f"❌ 获取公司列表失败: {e}")
+
+
+def run_daemon(model_name: str, change_source: str, debounce: float, install_triggers: bool):
+    """运行实时同步守护进程"""
+    try:
+        from sync_data.realtime_sync import RealtimeSyncDaemon
+        
+        print("👂 启动实时同步模式")
+        print(f"🧠 使用模型: {model_name}")
+        
+        migrator = KnowledgeBaseMigrator(model_name)
+        
+        if install_triggers and not migrator.db.install_change_capture(change_source):
+            return False
+        
+        daemon = RealtimeSyncDaemon(migrator, mode=change_source, debounce_seconds=debounce)
+        daemon.run()
+        return True
+    
+    except KeyboardInterrupt:
+        print("\n⏹️ 实时同步已停止")
+        return True
+    except Exception as e:
+        print(f"❌ 实时同步失败: {e}")
+        return False
+
+
+def show_stats(exact: bool = False):
+    """
+    显示数据库统计
+    
+    默认优先读取同步时刷新的统计快照，快照过期时用 pg_stats 快速估算；
+    exact=True 时执行全表 COUNT 得到精确值。
+    """
+    try:
+        from sync_data.database import PostgreSQLConnection
+        from sync_data.qdrant_manager import QdrantManager
+        from sync_data.recall_monitor import load_recall_metrics
+        from sync_data.stats_snapshot import load_stats_snapshot, refresh_stats_snapshot
+        
         print("📊 获取数据库统计信息...")
         
-        # 使用默认模型初始化（只需要数据库连接）
-        migrator = KnowledgeBaseMigrator("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+        snapshot = None if exact else load_stats_snapshot()
+        if snapshot is not None:
+            print(f"📸 使用 {snapshot['age_seconds'] / 60:.1f} 分钟前的统计快照（--exact 获取精确值）")
+        else:
+            # 只需要数据库和 Qdrant 连接，不加载嵌入模型
+            snapshot = refresh_stats_snapshot(PostgreSQLConnection(), QdrantManager(), exact=exact)
         
         # PostgreSQL统计
-        db_stats = migrator.get_database_stats()
-        print("\n📀 PostgreSQL 统计:")
-        print(f"   公司数量: {db_stats.get('total_companies', 0)}")
-        print(f"   意图数量: {db_stats.get('total_intents', 0)}")
-        print(f"   问题数量: {db_stats.get('total_questions', 0)}")
-        print(f"   答案数量: {db_stats.get('total_answers', 0)}")
+        db_stats = snapshot['database']
+        approx = "≈ " if db_stats.get('estimated') else ""
+        print(f"\n📀 PostgreSQL 统计{'（基于 pg_stats 估算）' if db_stats.get('estimated') else ''}:")
+        print(f"   公司数量: {approx}{db_stats.get('total_companies', 0)}")
+        print(f"   意图数量: {approx}{db_stats.get('total_intents', 0)}")
+        print(f"   问题数量: {approx}{db_stats.get('total_questions', 0)}")
+        print(f"   答案数量: {approx}{db_stats.get('total_answers', 0)}")
         
         # Qdrant统计
-        qdrant_stats = migrator.get_qdrant_stats()
+        qdrant_stats = snapshot['qdrant']
         print("\n🔮 Qdrant 统计:")
         print(f"   集合数量: {qdrant_stats.get('total_collections', 0)}")
         print(f"   向量数量: {qdrant_stats.get('total_points', 0)}")
@@ -183,6 +337,17 @@ def show_stats():
                 print(f"      向量维度: {collection.get('vector_size', 0)}")
                 print(f"      存储大小: {collection.get('disk_data_size', 0)} bytes")
         
+        # 在线召回率（搜索进程按 QDRANT_RECALL_SAMPLE_RATE 抽样影子精确搜索后写入）
+        recall_metrics = load_recall_metrics()
+        if recall_metrics:
+            print("\n🎯 在线召回率（影子精确搜索）:")
+            for collection_name, metrics in sorted(recall_metrics.items()):
+                flag = "⚠️" if metrics.get('below_alert') else "✅"
+                updated_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(metrics.get('updated_at', 0)))
+                print(f"   {flag} {collection_name}: 召回率 {metrics.get('recall', 0):.3f}"
+                      f"（窗口 {metrics.get('window', 0)} 次, 最低 {metrics.get('min_overlap', 0):.2f}, "
+                      f"累计 {metrics.get('total_checked', 0)} 次, 更新于 {updated_at}）")
+    
     except Exception as e:
         print(f"❌ 获取统计信息失败: {e}")
 
@@ -199,10 +364,26 @@ def main():
   python main.py --check                          # 检查环境配置
   python main.py --check-db                       # 详细检查数据库表结构
   python main.py --list-models                    # 列出可用模型
-  python main.py --stats                          # 显示数据库统计
+  python main.py --stats                          # 显示数据库统计（快照/估算）
+  python main.py --stats --exact                  # 全表扫描获取精确统计
+  python main.py --companies                      # 显示公司注册表和预计耗时
   python main.py --company company_123            # 迁移指定公司
   python main.py --all                            # 迁移所有公司
   python main.py --all --model text2vec-base      # 使用指定模型迁移所有公司
+  python main.py --all --bulk                     # 使用 COPY 批量导出全量重建
+  python main.py --all --extract-workers 4        # 4 个连接在同一快照上并行导出
+  python main.py --all --upsert-parallel 8        # 8 个写入批次同时在途
+  python main.py --all --bulk-load                # 写完再统一构建 HNSW 索引
+  python main.py --all --tenancy per_company      # 每个公司写入独立集合 kb_<公司ID>
+  python main.py --all --storage-profile large    # 新建集合时向量 mmap、载荷放磁盘
+  python main.py --apply-storage-profile wechat_diplomat  # 按点数为已有集合调整存储配置
+  python main.py --all --popularity-tiers         # HOT 意图留在内存，WARM/COLD 写入冷数据集合
+  python main.py --all --intent-centroids         # 同时维护意图质心集合，供粗排-精排搜索
+  python main.py --rebuild --model BAAI/bge-large-zh-v1.5  # 换模型/维度：写入新版本后切换别名
+  python main.py --export-snapshot ./kb_snapshot   # 导出本地 Parquet 快照
+  python main.py --all --from-snapshot ./kb_snapshot  # 从快照离线迁移（不访问数据库）
+  python main.py --daemon --install-triggers      # 实时同步（LISTEN/NOTIFY）
+  python main.py --daemon --change-source outbox  # 实时同步（轮询 outbox 表）
         """
     )
     
@@ -212,16 +393,78 @@ def main():
     action_group.add_argument('--check-db', action='store_true', help='详细检查数据库表结构')
     action_group.add_argument('--list-models', action='store_true', help='列出可用的嵌入模型')
     action_group.add_argument('--stats', action='store_true', help='显示数据库统计信息')
+    action_group.add_argument('--companies', action='store_true', help='显示公司注册表（规模和预计耗时）')
     action_group.add_argument('--company', type=str, help='迁移指定公司 (提供公司ID)')
     action_group.add_argument('--all', action='store_true', help='迁移所有公司')
+    action_group.add_argument('--rebuild', action='store_true',
+                              help='零停机重建：全部数据写入新版本集合，校验通过后切换别名并清理旧版本')
+    action_group.add_argument('--daemon', action='store_true', help='实时同步模式，持续监听知识库变更')
+    action_group.add_argument('--export-snapshot', type=str, metavar='DIR',
+                              help='把知识库按公司分区导出为本地 Parquet 快照')
+    action_group.add_argument('--apply-storage-profile', type=str, metavar='COLLECTION',
+                              help='为已有集合应用存储配置（默认按当前点数自动选择，可配合 --storage-profile）')
     
     # 模型选项
     parser.add_argument('--model', 
                        default='shibing624/text2vec-base-chinese',
                        help='嵌入模型名称 (默认: shibing624/text2vec-base-chinese)')
     
+    # 导出选项
+    parser.add_argument('--bulk', action='store_true',
+                       help='使用 COPY 流式导出数据（大租户全量重建时更快）')
+    parser.add_argument('--extract-workers', type=int, default=0,
+                       help='并行导出的连接数，所有连接共享同一快照 (默认: 0，串行导出)')
+    
+    parser.add_argument('--bulk-load', action='store_true',
+                       help='写入期间暂停 HNSW 索引构建，写完后恢复并等待集合变为 green（全量迁移更快）')
+    parser.add_argument('--keep-versions', type=int, default=1,
+                       help='--rebuild 切换别名后额外保留的旧版本数，用于回滚 (默认: 1)')
+    parser.add_argument('--tenancy', choices=['shared', 'per_company'], default=None,
+                       help='租户隔离策略: shared 共用集合 / per_company 每个公司一个集合 (默认读取 QDRANT_TENANCY)')
+    parser.add_argument('--storage-profile', choices=['auto', 'small', 'medium', 'large'], default=None,
+                       help='新建集合的存储配置，auto 按预计点数选择 (默认读取 QDRANT_STORAGE_PROFILE 或 auto)')
+    parser.add_argument('--popularity-tiers', action='store_true',
+                       help='按热度分层存储: HOT 意图在内存集合，WARM/COLD 意图在磁盘量化的 <集合>_cold (也可设置 QDRANT_POPULARITY_TIERS)')
+    parser.add_argument('--intent-centroids', action='store_true',
+                       help='同步时维护意图质心集合 <集合>_centroids，供粗排-精排搜索 (也可设置 QDRANT_INTENT_CENTROIDS)')
+    parser.add_argument('--upsert-parallel', type=int, default=None,
+                       help='写入 Qdrant 时同时在途的批次数 (默认: QDRANT_UPSERT_PARALLEL 或 4)')
+    
+    parser.add_argument('--from-snapshot', type=str, metavar='DIR',
+                       help='迁移时从本地 Parquet 快照读取数据，不访问数据库')
+    
+    parser.add_argument('--exact', action='store_true',
+                       help='--stats 时执行全表 COUNT 获取精确统计（默认使用快照或 pg_stats 估算）')
+    
+    parser.add_argument('--refresh-companies', action='store_true',
+                       help='重新统计公司注册表中所有公司的意图和问题数')
+    
+    # 实时同步选项
+    parser.add_argument('--change-source', choices=['notify', 'outbox'], default='notify',
+                       help='实时同步的变更来源 (默认: notify)')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                       help='实时同步的防抖窗口，单位秒 (默认: 2.0)')
+    parser.add_argument('--install-triggers', action='store_true',
+                       help='启动实时同步前在知识库表上安装变更捕获触发器')
+    
     args = parser.parse_args()
     
+    if args.upsert_parallel is not None:
+        # QdrantManager 从环境变量读取写入并发度
+        os.environ['QDRANT_UPSERT_PARALLEL'] = str(args.upsert_parallel)
+    if args.tenancy is not None:
+        # 迁移器从环境变量读取租户隔离策略
+        os.environ['QDRANT_TENANCY'] = args.tenancy
+    if args.storage_profile is not None:
+        # 新建集合时从环境变量读取存储配置
+        os.environ['QDRANT_STORAGE_PROFILE'] = args.storage_profile
+    if args.popularity_tiers:
+        # 迁移器和实时同步从环境变量读取热度分层开关
+        os.environ['QDRANT_POPULARITY_TIERS'] = 'true'
+    if args.intent_centroids:
+        # 迁移器和实时同步从环境变量读取意图质心开关
+        os.environ['QDRANT_INTENT_CENTROIDS'] = 'true'
+    
     # 执行操作
     try:
         if args.check:
@@ -240,20 +483,49 @@ def main():
         elif args.stats:
             if not check_environment():
                 sys.exit(1)
-            show_stats()
+            show_stats(args.exact)
         
-        elif args.company:
+        elif args.companies:
             if not check_environment():
                 sys.exit(1)
-            success = migrate_company(args.company, args.model)
-            sys.exit(0 if success else 1)
+            show_companies(args.refresh_companies)
         
-        elif args.all:
+        elif args.export_snapshot:
             if not check_environment():
                 sys.exit(1)
-            success = migrate_all_companies(args.model)
+            success = export_snapshot(args.export_snapshot)
+            sys.exit(0 if success else 1)
+        
+        elif args.apply_storage_profile:
+            success = apply_storage_profile(args.apply_storage_profile, args.storage_profile)
+            sys.exit(0 if success else 1)
+        
+        elif args.company or args.all or args.rebuild:
+            if args.from_snapshot:
+                # 离线迁移不需要数据库，并行导出也无从谈起
+                if args.extract_workers:
+                    print("⚠️ 从快照迁移时忽略 --extract-workers")
+                    args.extract_workers = 0
+            elif not check_environment():
+                sys.exit(1)
+            
+            if args.rebuild:
+                success = rebuild_collection(args.model, args.bulk, args.extract_workers, args.from_snapshot,
+                                             args.bulk_load, args.keep_versions)
+            elif args.company:
+                success = migrate_company(args.company, args.model, args.bulk, args.extract_workers,
+                                          args.from_snapshot, args.bulk_load)
+            else:
+                success = migrate_all_companies(args.model, args.bulk, args.extract_workers,
+                                                args.refresh_companies, args.from_snapshot, args.bulk_load)
             sys.exit(0 if success else 1)
         
+        elif args.daemon:
+            if not check_environment():
+                sys.exit(1)
+            success = run_daemon(args.model, args.change_source, args.debounce, args.install_triggers)
+            sys.exit(0 if success else 1)
+    
     except KeyboardInterrupt:
         print("\n\n⏹️ 用户中断操作")
         sys.exit(1)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+修复集合中的重复点和孤儿点
+历史同步使用随机ID，同一问题可能留下多个点；意图删除后也可能遗留向量点。
+本脚本只按载荷扫描集合，与 PostgreSQL 核对后分批删除，进度可断点续跑。
+"""
+
+import argparse
+import sys
+from dotenv import load_dotenv
+
+from sync_data.collection_repair import CollectionRepairJob
+from sync_data.database import PostgreSQLConnection
+from sync_data.qdrant_manager import QdrantManager, DEFAULT_COLLECTION_NAME
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='清理集合中的重复点和孤儿点')
+    parser.add_argument('collection', nargs='?', default=DEFAULT_COLLECTION_NAME,
+                        help=f'集合名称 (默认: {DEFAULT_COLLECTION_NAME})')
+    parser.add_argument('--dry-run', action='store_true', help='只统计待删除的点，不实际删除')
+    parser.add_argument('--restart', action='store_true', help='丢弃上次保存的进度，从头扫描')
+    parser.add_argument('--skip-orphans', action='store_true',
+                        help='不连接数据库核对孤儿点，只清理重复点')
+    parser.add_argument('--scan-batch-size', type=int, default=1000, help='每次滚动读取的点数 (默认: 1000)')
+    parser.add_argument('--delete-batch-size', type=int, default=1000, help='每次删除请求的点数 (默认: 1000)')
+    parser.add_argument('--yes', '-y', action='store_true', help='跳过删除确认')
+    
+    args = parser.parse_args()
+    
+    load_dotenv()
+    
+    print("=" * 60)
+    print("🧹 集合重复点/孤儿点修复")
+    print("=" * 60)
+    
+    if not args.dry_run and not args.yes:
+        print(f"\n⚠️  将从集合 {args.collection} 中删除重复点和孤儿点")
+        confirm = input("确认继续？(y/N): ").strip().lower()
+        if confirm != 'y':
+            print("❌ 操作已取消")
+            return False
+    
+    db = None
+    if not args.skip_orphans:
+        db = PostgreSQLConnection()
+        if not db.test_connection():
+            print("❌ 数据库连接失败，可使用 --skip-orphans 只清理重复点")
+            return False
+    
+    job = CollectionRepairJob(QdrantManager(), args.collection, db=db)
+    try:
+        if args.restart:
+            job.reset()
+        
+        report = job.run(
+            dry_run=args.dry_run,
+            scan_batch_size=args.scan_batch_size,
+            delete_batch_size=args.delete_batch_size
+        )
+        if report is None:
+            return False
+        
+        job.print_report(report)
+        return True
+    finally:
+        job.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
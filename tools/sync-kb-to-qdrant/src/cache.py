@@ -0,0 +1,51 @@
+"""
+本地缓存目录工具
+同步过程中产生的注册表、统计快照等小文件统一存放在这里
+"""
+
+import json
+import os
+import tempfile
+from typing import Any
+
+
+def get_cache_dir() -> str:
+    """获取缓存目录（可通过 SYNC_CACHE_DIR 配置），不存在时自动创建"""
+    cache_dir = os.getenv('SYNC_CACHE_DIR', './.sync_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_cache_path(filename: str) -> str:
+    """获取缓存文件的完整路径"""
+    return os.path.join(get_cache_dir(), filename)
+
+
+def load_json(filename: str, default: Any = None) -> Any:
+    """读取缓存中的 JSON 文件，不存在或损坏时返回默认值"""
+    path = get_cache_path(filename)
+    if not os.path.exists(path):
+        return default
+    
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 读取缓存失败 {path}: {e}")
+        return default
+
+
+def save_json(filename: str, data: Any) -> str:
+    """原子写入缓存 JSON 文件（先写临时文件再替换）"""
+    path = get_cache_path(filename)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    return path
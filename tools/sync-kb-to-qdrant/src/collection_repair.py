@@ -0,0 +1,429 @@
+"""
+集合修复任务
+清理历史随机ID遗留的重复向量点（同一 originalId 有多个点）以及意图已不存在的孤儿点。
+
+任务分四步，进度保存在缓存目录的 SQLite 文件中，中断后重新运行会从断点继续：
+1. 扫描：只取载荷中的少量字段滚动读取集合，每页连同下一页偏移量一起落盘
+2. 核对：按意图ID分批查询 PostgreSQL，记录有效意图的问题数
+3. 分类：标记孤儿点和重复点（保留确定性ID的点，否则保留最近同步的点）
+4. 删除：分批调用删除接口，每批成功后标记为已删除
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+from itertools import groupby
+from typing import Dict, Any, Optional
+
+from .cache import get_cache_path
+from .database import PostgreSQLConnection
+from .qdrant_manager import QdrantManager
+from .records import point_id_from_original_id
+
+
+# 扫描时只读取这些载荷字段，不取向量和答案内容
+REPAIR_PAYLOAD_FIELDS = [
+    "metadata.originalId",
+    "metadata.intentId",
+    "metadata.companyId",
+    "metadata.currentQuestionIndex",
+    "metadata.lastSyncAt"
+]
+
+# 估算释放空间时抽样的完整载荷数量
+PAYLOAD_SAMPLE_SIZE = 100
+
+# 意图在数据库中不存在（或已删除、已停用）时记录的问题数
+MISSING_INTENT = -1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS points (
+    point_id TEXT PRIMARY KEY,
+    id_is_int INTEGER NOT NULL,
+    original_id TEXT,
+    intent_id TEXT,
+    company_id TEXT,
+    question_index INTEGER,
+    last_sync_at INTEGER,
+    action TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS points_original_id ON points (original_id);
+CREATE INDEX IF NOT EXISTS points_intent_id ON points (intent_id);
+CREATE TABLE IF NOT EXISTS intents (
+    intent_id TEXT PRIMARY KEY,
+    question_count INTEGER NOT NULL
+);
+"""
+
+
+class CollectionRepairJob:
+    """重复点和孤儿点修复任务"""
+    
+    def __init__(self, qdrant: QdrantManager, collection_name: str,
+                 db: Optional[PostgreSQLConnection] = None, state_path: Optional[str] = None):
+        """
+        初始化修复任务
+        
+        Args:
+            qdrant: Qdrant 管理器
+            collection_name: 要修复的集合
+            db: 数据库连接管理器，为 None 时只清理重复点，不核对孤儿点
+            state_path: 进度文件路径，默认为缓存目录下的 repair_<集合名>.sqlite
+        """
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.db = db
+        
+        if state_path is None:
+            safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', collection_name)
+            state_path = get_cache_path(f"repair_{safe_name}.sqlite")
+        self.state_path = state_path
+        
+        self.conn = sqlite3.connect(self.state_path)
+        self.conn.executescript(_SCHEMA)
+    
+    def close(self):
+        """关闭进度文件"""
+        self.conn.close()
+    
+    def reset(self):
+        """丢弃已保存的进度，下次运行从头扫描"""
+        self.conn.close()
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        self.conn = sqlite3.connect(self.state_path)
+        self.conn.executescript(_SCHEMA)
+    
+    def _get_state(self, key: str, default: Any = None) -> Any:
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+    
+    def _set_state(self, key: str, value: Any):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+            (key, json.dumps(value))
+        )
+    
+    def scan(self, batch_size: int = 1000) -> int:
+        """
+        滚动扫描集合（只取载荷字段），已扫描的页不会重复读取
+        
+        Args:
+            batch_size: 每次滚动的点数
+        
+        Returns:
+            已记录的点数
+        """
+        if self._get_state('scan_done', False):
+            return self.count_scanned()
+        
+        if self._get_state('started_at') is None:
+            with self.conn:
+                self._set_state('started_at', time.time())
+                self._set_state('collection_before', self.qdrant.get_collection_info(self.collection_name))
+                self._set_state('avg_payload_bytes', self._sample_payload_bytes())
+        
+        offset = self._get_state('scan_offset')
+        if offset is not None:
+            print(f"⏩ 从上次的扫描位置继续（已记录 {self.count_scanned()} 个点）")
+        
+        pages = self.qdrant.iter_payload_pages(
+            self.collection_name,
+            payload_fields=REPAIR_PAYLOAD_FIELDS,
+            batch_size=batch_size,
+            start_offset=offset
+        )
+        for records, next_offset in pages:
+            rows = []
+            for record in records:
+                metadata = (record.payload or {}).get('metadata', {})
+                rows.append((
+                    str(record.id),
+                    1 if isinstance(record.id, int) else 0,
+                    metadata.get('originalId'),
+                    metadata.get('intentId'),
+                    metadata.get('companyId'),
+                    metadata.get('currentQuestionIndex'),
+                    metadata.get('lastSyncAt')
+                ))
+            
+            # 本页数据和下一页偏移量在同一事务中提交，中断后不会漏页
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO points "
+                    "(point_id, id_is_int, original_id, intent_id, company_id, question_index, last_sync_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._set_state('scan_offset', next_offset)
+                if next_offset is None:
+                    self._set_state('scan_done', True)
+        
+        scanned = self.count_scanned()
+        print(f"✅ 扫描完成，共 {scanned} 个点")
+        return scanned
+    
+    def _sample_payload_bytes(self) -> float:
+        """抽样完整载荷，估算单个点的载荷大小（字节）"""
+        records, _ = self.qdrant.client.scroll(
+            collection_name=self.collection_name,
+            limit=PAYLOAD_SAMPLE_SIZE,
+            with_payload=True,
+            with_vectors=False
+        )
+        if not records:
+            return 0.0
+        
+        total = sum(len(json.dumps(record.payload or {}, ensure_ascii=False).encode('utf-8')) for record in records)
+        return total / len(records)
+    
+    def count_scanned(self) -> int:
+        """已扫描记录的点数"""
+        return self.conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+    
+    def check_intents(self, chunk_size: int = 1000) -> int:
+        """
+        按意图ID分批查询数据库，记录有效意图的问题数（已核对的意图不会重复查询）
+        
+        Args:
+            chunk_size: 每次查询的意图数
+        
+        Returns:
+            数据库中已不存在（或已删除、已停用）的意图数
+        """
+        while True:
+            intent_ids = [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT p.intent_id FROM points p "
+                "LEFT JOIN intents i ON i.intent_id = p.intent_id "
+                "WHERE p.intent_id IS NOT NULL AND p.deleted = 0 AND i.intent_id IS NULL "
+                "LIMIT ?",
+                (chunk_size,)
+            )]
+            if not intent_ids:
+                break
+            
+            found = {intent.id: len(intent.keywords or []) for intent in self.db.get_intents_by_ids(intent_ids)}
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO intents (intent_id, question_count) VALUES (?, ?)",
+                    [(intent_id, found.get(intent_id, MISSING_INTENT)) for intent_id in intent_ids]
+                )
+        
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM intents WHERE question_count = ?", (MISSING_INTENT,)
+        ).fetchone()[0]
+    
+    def classify(self) -> Dict[str, int]:
+        """
+        标记需要删除的点
+        
+        - orphan_intent: 意图在数据库中已不存在、已删除或已停用
+        - orphan_question: 意图仍在，但问题序号超出了当前标准问题数
+        - duplicate: 同一 originalId 的多余点；优先保留确定性ID的点，否则保留最近同步的点
+        
+        缺少 originalId/intentId 的点无法判断归属，不做处理。
+        
+        Returns:
+            各类待删除点数
+        """
+        with self.conn:
+            self.conn.execute("UPDATE points SET action = NULL WHERE deleted = 0")
+            
+            if self.db is not None:
+                self.conn.execute(
+                    "UPDATE points SET action = 'orphan_intent' WHERE deleted = 0 AND intent_id IN "
+                    "(SELECT intent_id FROM intents WHERE question_count = ?)",
+                    (MISSING_INTENT,)
+                )
+                self.conn.execute(
+                    "UPDATE points SET action = 'orphan_question' WHERE deleted = 0 AND action IS NULL "
+                    "AND question_index IS NOT NULL AND question_index >= "
+                    "(SELECT question_count FROM intents WHERE intents.intent_id = points.intent_id)"
+                )
+            
+            rows = self.conn.execute(
+                "SELECT point_id, original_id, last_sync_at FROM points "
+                "WHERE deleted = 0 AND action IS NULL AND original_id IN ("
+                "  SELECT original_id FROM points WHERE deleted = 0 AND action IS NULL "
+                "  GROUP BY original_id HAVING COUNT(*) > 1"
+                ") ORDER BY original_id"
+            ).fetchall()
+            
+            duplicates = []
+            for original_id, group in groupby(rows, key=lambda row: row[1]):
+                group = list(group)
+                keeper_id = point_id_from_original_id(original_id)
+                if not any(row[0] == keeper_id for row in group):
+                    keeper_id = max(group, key=lambda row: (row[2] or 0, row[0]))[0]
+                duplicates.extend((row[0],) for row in group if row[0] != keeper_id)
+            
+            self.conn.executemany("UPDATE points SET action = 'duplicate' WHERE point_id = ?", duplicates)
+        
+        return self.count_actions(pending_only=True)
+    
+    def count_actions(self, pending_only: bool = False) -> Dict[str, int]:
+        """按类型统计待删除（或已删除）的点数"""
+        condition = "deleted = 0" if pending_only else "deleted = 1"
+        counts = {"orphan_intent": 0, "orphan_question": 0, "duplicate": 0}
+        for action, count in self.conn.execute(
+            f"SELECT action, COUNT(*) FROM points WHERE action IS NOT NULL AND {condition} GROUP BY action"
+        ):
+            counts[action] = count
+        return counts
+    
+    def delete(self, batch_size: int = 1000) -> int:
+        """
+        分批删除已标记的点，每批成功后记录进度
+        
+        Args:
+            batch_size: 每次删除请求的点数
+        
+        Returns:
+            本次删除的点数
+        """
+        deleted = 0
+        while True:
+            rows = self.conn.execute(
+                "SELECT point_id, id_is_int FROM points WHERE action IS NOT NULL AND deleted = 0 "
+                "ORDER BY rowid LIMIT ?",
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            
+            point_ids = [int(point_id) if id_is_int else point_id for point_id, id_is_int in rows]
+            if self.qdrant.delete_points(self.collection_name, point_ids, batch_size=batch_size) < len(point_ids):
+                print("⚠️ 删除中断，重新运行即可从当前进度继续")
+                break
+            
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE points SET deleted = 1 WHERE point_id = ?",
+                    [(row[0],) for row in rows]
+                )
+            deleted += len(rows)
+            print(f"🗑️ 已删除 {deleted} 个点")
+        
+        return deleted
+    
+    def run(self, dry_run: bool = False, scan_batch_size: int = 1000,
+            delete_batch_size: int = 1000) -> Optional[Dict[str, Any]]:
+        """
+        执行修复任务（扫描 → 核对 → 分类 → 删除）
+        
+        Args:
+            dry_run: 只统计不删除
+            scan_batch_size: 每次滚动的点数
+            delete_batch_size: 每次删除请求的点数
+        
+        Returns:
+            修复报告，集合不存在时返回 None
+        """
+        if not self.qdrant.client.collection_exists(self.collection_name):
+            print(f"❌ 集合 {self.collection_name} 不存在")
+            return None
+        
+        if self._get_state('completed', False):
+            # 上一轮已经完整结束，重新扫描当前数据
+            self.reset()
+        
+        print(f"🔍 扫描集合 {self.collection_name}...")
+        scanned = self.scan(batch_size=scan_batch_size)
+        
+        missing_intents = None
+        if self.db is not None:
+            print("🔍 核对数据库中的意图...")
+            missing_intents = self.check_intents()
+        
+        pending = self.classify()
+        if not dry_run:
+            self.delete(batch_size=delete_batch_size)
+            if not sum(self.count_actions(pending_only=True).values()):
+                with self.conn:
+                    self._set_state('completed', True)
+        
+        return self.build_report(scanned, missing_intents, pending, dry_run)
+    
+    def build_report(self, scanned: int, missing_intents: Optional[int],
+                     pending: Dict[str, int], dry_run: bool) -> Dict[str, Any]:
+        """汇总修复结果，并估算释放的磁盘空间"""
+        before = self._get_state('collection_before') or {}
+        after = self.qdrant.get_collection_info(self.collection_name) or {}
+        
+        reclaimed = self.count_actions()
+        reclaimed_points = sum(reclaimed.values())
+        
+        # 单点大小 ≈ 向量（float32）+ 载荷；实际空间在 Qdrant 的清理优化完成后才会释放
+        vector_size = before.get('vector_size')
+        vector_bytes = vector_size * 4 if isinstance(vector_size, int) else 0
+        point_bytes = vector_bytes + (self._get_state('avg_payload_bytes') or 0)
+        
+        return {
+            "collection": self.collection_name,
+            "dry_run": dry_run,
+            "scanned_points": scanned,
+            "unrecognized_points": self.conn.execute(
+                "SELECT COUNT(*) FROM points WHERE original_id IS NULL OR intent_id IS NULL"
+            ).fetchone()[0],
+            "missing_intents": missing_intents,
+            "pending": pending,
+            "reclaimed": reclaimed,
+            "reclaimed_points": reclaimed_points,
+            "estimated_reclaimed_bytes": int(reclaimed_points * point_bytes),
+            "estimated_pending_bytes": int(sum(pending.values()) * point_bytes) if dry_run else 0,
+            "points_before": before.get('points_count'),
+            "points_after": after.get('points_count'),
+            "disk_data_size_before": before.get('disk_data_size', 0),
+            "disk_data_size_after": after.get('disk_data_size', 0),
+            "state_path": self.state_path
+        }
+    
+    def print_report(self, report: Dict[str, Any]):
+        """打印修复报告"""
+        print("\n" + "=" * 60)
+        print(f"📊 集合修复报告: {report['collection']}" + ("（试运行）" if report['dry_run'] else ""))
+        print("=" * 60)
+        print(f"扫描点数: {report['scanned_points']}")
+        if report['unrecognized_points']:
+            print(f"缺少 originalId/intentId 的点（未处理）: {report['unrecognized_points']}")
+        if report['missing_intents'] is None:
+            print("孤儿点核对: 已跳过（未连接数据库）")
+        else:
+            print(f"数据库中已不存在的意图: {report['missing_intents']}")
+        
+        if report['dry_run']:
+            pending = report['pending']
+            print(f"\n待删除: {sum(pending.values())} 个点")
+            print(f"   重复点: {pending['duplicate']}")
+            print(f"   孤儿点（意图不存在）: {pending['orphan_intent']}")
+            print(f"   孤儿点（问题已移除）: {pending['orphan_question']}")
+            print(f"   预计释放: {_format_bytes(report['estimated_pending_bytes'])}")
+        else:
+            reclaimed = report['reclaimed']
+            print(f"\n已删除: {report['reclaimed_points']} 个点")
+            print(f"   重复点: {reclaimed['duplicate']}")
+            print(f"   孤儿点（意图不存在）: {reclaimed['orphan_intent']}")
+            print(f"   孤儿点（问题已移除）: {reclaimed['orphan_question']}")
+            print(f"   点数: {report['points_before']} → {report['points_after']}")
+            print(f"   估算释放: {_format_bytes(report['estimated_reclaimed_bytes'])}（Qdrant 清理优化完成后生效）")
+            if report['disk_data_size_before']:
+                print(f"   磁盘占用: {_format_bytes(report['disk_data_size_before'])} → "
+                      f"{_format_bytes(report['disk_data_size_after'])}")
+        
+        print(f"\n进度文件: {report['state_path']}")
+
+
+def _format_bytes(size: float) -> str:
+    """格式化字节数"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
@@ -0,0 +1,215 @@
+"""
+集合版本管理
+读取方统一访问别名（如 wechat_diplomat），重建时写入新的版本集合（wechat_diplomat_v20250101120000），
+校验点数和抽样搜索通过后原子切换别名，再清理不再使用的旧版本，重建期间搜索不受影响
+"""
+
+import re
+import time
+import uuid
+from typing import Any, List, Optional
+
+from .qdrant_manager import QdrantManager
+from .storage_profiles import StorageProfile
+
+
+# 版本集合名称：<别名>_v<时间戳>
+VERSION_SUFFIX_FORMAT = "%Y%m%d%H%M%S"
+
+# 抽样搜索校验的默认点数和最低命中率
+DEFAULT_SAMPLE_SIZE = 50
+DEFAULT_MIN_HIT_RATE = 0.95
+
+
+class CollectionVersionManager:
+    """别名 + 版本集合管理器"""
+    
+    def __init__(self, qdrant: QdrantManager, alias_name: str):
+        """
+        初始化版本管理器
+        
+        Args:
+            qdrant: Qdrant 管理器
+            alias_name: 读取方使用的别名
+        """
+        self.qdrant = qdrant
+        self.alias_name = alias_name
+        self._version_pattern = re.compile(rf"^{re.escape(alias_name)}_v\d{{14}}$")
+    
+    def current_version(self) -> Optional[str]:
+        """别名当前指向的集合，别名不存在时返回 None"""
+        return self.qdrant.get_alias_targets().get(self.alias_name)
+    
+    def is_legacy_collection(self) -> bool:
+        """别名的名称是否仍被一个普通集合占用（启用版本管理之前创建的集合）"""
+        if self.current_version() is not None:
+            return False
+        return any(col['name'] == self.alias_name for col in self.qdrant.list_collections())
+    
+    def list_versions(self) -> List[str]:
+        """列出全部版本集合（按时间从旧到新）"""
+        names = [col['name'] for col in self.qdrant.list_collections()]
+        return sorted(name for name in names if self._version_pattern.match(name))
+    
+    def new_version_name(self) -> str:
+        """生成新的版本集合名称（保证比已有版本新）"""
+        name = f"{self.alias_name}_v{time.strftime(VERSION_SUFFIX_FORMAT)}"
+        existing = self.list_versions()
+        while existing and name <= existing[-1]:
+            time.sleep(1)
+            name = f"{self.alias_name}_v{time.strftime(VERSION_SUFFIX_FORMAT)}"
+        return name
+    
+    def create_version(self, vector_size: int, bulk_load: bool = False,
+                       custom_sharding: bool = False, profile: Optional[StorageProfile] = None) -> Optional[str]:
+        """
+        创建新的版本集合（别名不变，读取方仍访问旧版本）
+        
+        Args:
+            vector_size: 向量维度
+            bulk_load: 创建时暂不构建 HNSW 索引
+            custom_sharding: 按公司自定义分片键
+            profile: 存储配置，默认按 QDRANT_STORAGE_PROFILE 选择
+        
+        Returns:
+            新版本集合名称，创建失败时返回 None
+        """
+        name = self.new_version_name()
+        if not self.qdrant.create_collection(name, vector_size, bulk_load=bulk_load,
+                                             custom_sharding=custom_sharding, profile=profile):
+            return None
+        return name
+    
+    def verify(self, version: str, expected_count: int, sample_size: int = DEFAULT_SAMPLE_SIZE,
+               min_hit_rate: float = DEFAULT_MIN_HIT_RATE) -> bool:
+        """
+        校验新版本：点数与期望一致，且抽样的点用自己的向量能搜到自己
+        
+        Args:
+            version: 版本集合名称
+            expected_count: 期望的点数
+            sample_size: 抽样搜索的点数
+            min_hit_rate: 抽样搜索的最低命中率（相同问题文本的向量完全相同，允许少量未命中）
+        
+        Returns:
+            是否通过校验
+        """
+        print(f"🔍 校验新版本 {version}...")
+        actual_count = self.qdrant.count_points(version)
+        print(f"   期望点数: {expected_count}，实际点数: {actual_count}")
+        if actual_count != expected_count:
+            print("❌ 点数不一致")
+            return False
+        
+        if actual_count == 0:
+            print("✅ 校验通过（空集合）")
+            return True
+        
+        samples = self.sample_points(version, min(sample_size, actual_count))
+        if not samples:
+            print("❌ 未能抽样到任何点")
+            return False
+        
+        hits = 0
+        for record in samples:
+            vector = record.vector
+            if isinstance(vector, dict):
+                # 命名向量：使用第一个向量名
+                name, vector = next(iter(vector.items()))
+                query = (name, vector)
+            else:
+                query = vector
+            
+            results = self.qdrant.client.search(
+                collection_name=version,
+                query_vector=query,
+                limit=5,
+                with_payload=False
+            )
+            if any(result.id == record.id for result in results):
+                hits += 1
+        
+        hit_rate = hits / len(samples)
+        print(f"   抽样搜索: {hits}/{len(samples)} 命中 ({hit_rate:.0%})")
+        if hit_rate < min_hit_rate:
+            print(f"❌ 抽样搜索命中率低于 {min_hit_rate:.0%}")
+            return False
+        
+        print("✅ 校验通过")
+        return True
+    
+    def sample_points(self, version: str, sample_size: int) -> List[Any]:
+        """
+        在整个集合中随机抽样点（带向量）
+        
+        点ID是 uuid5，在ID空间中均匀分布：以随机 UUID 为滚动起点取下一个点，
+        相当于从随机位置抽样，而不是只检查滚动顺序最前面的点。超过末尾时从头取第一个点。
+        """
+        samples = {}
+        for _ in range(sample_size * 3):
+            if len(samples) >= sample_size:
+                break
+            
+            records, _ = self.qdrant.client.scroll(
+                collection_name=version,
+                offset=str(uuid.uuid4()),
+                limit=1,
+                with_payload=False,
+                with_vectors=True
+            )
+            if not records:
+                records, _ = self.qdrant.client.scroll(
+                    collection_name=version,
+                    limit=1,
+                    with_payload=False,
+                    with_vectors=True
+                )
+            for record in records:
+                samples[record.id] = record
+        
+        return list(samples.values())
+    
+    def activate(self, version: str) -> bool:
+        """
+        把别名切换到指定版本
+        
+        别名名称仍被旧的普通集合占用时，需要先删除该集合才能创建别名，
+        两步之间会有极短的不可用时间（只发生在第一次启用版本管理时）。
+        """
+        if self.is_legacy_collection():
+            print(f"⚠️ {self.alias_name} 是启用版本管理前的普通集合，删除后创建同名别名")
+            if not self.qdrant.delete_collection(self.alias_name):
+                return False
+        
+        return self.qdrant.point_alias(self.alias_name, version)
+    
+    def garbage_collect(self, keep: int = 1) -> List[str]:
+        """
+        删除不再使用的版本集合
+        
+        保留别名当前指向的版本，以及它之前最近的 keep 个版本（用于回滚）；
+        比当前版本新的版本（例如校验失败的重建）一并删除。
+        
+        Args:
+            keep: 额外保留的旧版本数
+        
+        Returns:
+            已删除的集合名称
+        """
+        current = self.current_version()
+        if current is None:
+            print("⚠️ 别名未指向任何版本，跳过清理")
+            return []
+        
+        versions = self.list_versions()
+        older = [name for name in versions if name < current]
+        retained = {current, *older[len(older) - keep:]} if keep > 0 else {current}
+        
+        deleted = []
+        for name in versions:
+            if name not in retained and self.qdrant.delete_collection(name):
+                deleted.append(name)
+        
+        if deleted:
+            print(f"🗑️ 已清理 {len(deleted)} 个旧版本")
+        return deleted
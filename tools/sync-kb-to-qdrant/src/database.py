@@ -4,12 +4,28 @@ PostgreSQL数据库连接和查询模块
 
 import psycopg2
 import psycopg2.extras
+import csv
+import io
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from dotenv import load_dotenv
 
+from .records import IntentRecord, AnswerRecord
+
 load_dotenv()
 
+# 答案内容可能很长，放宽 CSV 单字段长度限制
+csv.field_size_limit(2 ** 31 - 1)
+
+# COPY 流的读取缓冲大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 实时同步使用的通知频道和 outbox 表名
+CHANGE_CHANNEL = 'kb_changes'
+OUTBOX_TABLE = 'kb_sync_outbox'
+
 
 class PostgreSQLConnection:
     """PostgreSQL数据库连接管理器"""
@@ -81,7 +97,7 @@ class PostgreSQLConnection:
                             print(f"❌ 表不存在: {self.schema}.{table_name}")
             
             return table_status
-            
+        
         except Exception as e:
             print(f"❌ 检查表结构失败: {e}")
             return {table: False for table in required_tables}
@@ -107,76 +123,132 @@ class PostgreSQLConnection:
                         print(f"   {full_name}")
                     
                     return tables
-                    
+        
         except Exception as e:
             print(f"❌ 列出表失败: {e}")
             return []
     
-    def get_company_intents(self, company_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def build_intents_query(self, company_id: Optional[str] = None,
+                            id_range: Optional[Tuple[Optional[str], Optional[str]]] = None) -> Tuple[str, tuple]:
+        """
+        构建有效意图查询
+        
+        Args:
+            company_id: 公司ID，为 None 时查询所有公司
+            id_range: 意图ID区间 [lower, upper)，任一端为 None 表示不限（并行导出使用）
+        
+        Returns:
+            (SQL, 参数)
+        """
+        conditions = ['ki.is_deleted = 0', 'ki."isActive" = true']
+        params = []
+        
+        if company_id:
+            conditions.insert(0, 'ki.company_id = %s')
+            params.append(company_id)
+        
+        if id_range:
+            lower, upper = id_range
+            if lower is not None:
+                conditions.append('ki.id >= %s')
+                params.append(lower)
+            if upper is not None:
+                conditions.append('ki.id < %s')
+                params.append(upper)
+        
+        order_by = 'ki.created_at ASC' if company_id else 'ki.company_id, ki.created_at ASC'
+        
+        query = f"""
+            SELECT 
+                ki.id,
+                ki.name,
+                ki.keywords,
+                ki.usage_count,
+                ki."isActive" as is_active,
+                ki.is_deleted,
+                ki.created_at,
+                ki.updated_at,
+                ki.company_id
+            FROM "{self.schema}".knowledge_base_intents ki
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order_by}
+        """
+        return query, tuple(params)
+    
+    def build_answers_query(self, intent_ids: List[str]) -> Tuple[str, tuple]:
+        """构建按意图ID批量查询答案的 SQL"""
+        query = f"""
+            SELECT 
+                intent_id,
+                id,
+                type,
+                content,
+                "isActive" as is_active,
+                created_at,
+                updated_at
+            FROM "{self.schema}".knowledge_base_answers
+            WHERE intent_id = ANY(%s) AND is_deleted = 0 AND "isActive" = true
+            ORDER BY intent_id, created_at ASC
+        """
+        return query, (list(intent_ids),)
+    
+    def fetch_company_intents(self, cur, company_id: Optional[str] = None,
+                              id_range: Optional[Tuple[Optional[str], Optional[str]]] = None) -> List[IntentRecord]:
+        """在给定游标上查询有效意图（游标需为普通元组游标）"""
+        cur.execute(*self.build_intents_query(company_id, id_range))
+        return [IntentRecord.from_row(row) for row in cur]
+    
+    def fetch_answers_by_intent_ids(self, cur, intent_ids: List[str]) -> Dict[str, List[AnswerRecord]]:
+        """在给定游标上批量查询答案并按 intent_id 分组（游标需为普通元组游标）"""
+        if not intent_ids:
+            return {}
+        
+        cur.execute(*self.build_answers_query(intent_ids))
+        
+        # 按 intent_id 分组（首列为 intent_id）
+        result = {}
+        for row in cur:
+            result.setdefault(row[0], []).append(AnswerRecord.from_row(row[1:]))
+        
+        return result
+    
+    def get_company_intents(self, company_id: Optional[str] = None) -> List[IntentRecord]:
         """获取公司的意图数据（不去重，保持原始数据）"""
         with self.get_connection() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                if company_id:
-                    cur.execute(f"""
-                        SELECT 
-                            ki.id,
-                            ki.name,
-                            ki.keywords,
-                            ki.usage_count,
-                            ki."isActive" as is_active,
-                            ki.is_deleted,
-                            ki.created_at,
-                            ki.updated_at,
-                            ki.company_id
-                        FROM "{self.schema}".knowledge_base_intents ki
-                        WHERE ki.company_id = %s AND ki.is_deleted = 0 AND ki."isActive" = true
-                        ORDER BY ki.created_at ASC
-                    """, (company_id,))
-                else:
-                    cur.execute(f"""
-                        SELECT 
-                            ki.id,
-                            ki.name,
-                            ki.keywords,
-                            ki.usage_count,
-                            ki."isActive" as is_active,
-                            ki.is_deleted,
-                            ki.created_at,
-                            ki.updated_at,
-                            ki.company_id
-                        FROM "{self.schema}".knowledge_base_intents ki
-                        WHERE ki.is_deleted = 0 AND ki."isActive" = true
-                        ORDER BY ki.company_id, ki.created_at ASC
-                    """)
-                
-                return [dict(row) for row in cur.fetchall()]
+            with conn.cursor() as cur:
+                return self.fetch_company_intents(cur, company_id)
     
-    def get_intent_answers(self, intent_id: str) -> List[Dict[str, Any]]:
+    def build_intent_answers_query(self, intent_id: str) -> Tuple[str, tuple]:
+        """构建查询单个意图答案的 SQL"""
+        query = f"""
+            SELECT 
+                id,
+                type,
+                content,
+                "isActive" as is_active,
+                created_at,
+                updated_at
+            FROM "{self.schema}".knowledge_base_answers
+            WHERE intent_id = %s AND is_deleted = 0 AND "isActive" = true
+            ORDER BY created_at ASC
+        """
+        return query, (intent_id,)
+    
+    def get_intent_answers(self, intent_id: str) -> List[AnswerRecord]:
         """获取意图的答案"""
         with self.get_connection() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute(f"""
-                    SELECT 
-                        id,
-                        type,
-                        content,
-                        "isActive" as is_active,
-                        created_at,
-                        updated_at
-                    FROM "{self.schema}".knowledge_base_answers
-                    WHERE intent_id = %s AND is_deleted = 0 AND "isActive" = true
-                    ORDER BY created_at ASC
-                """, (intent_id,))
+            with conn.cursor() as cur:
+                cur.execute(*self.build_intent_answers_query(intent_id))
                 
-                return [dict(row) for row in cur.fetchall()]
+                return [AnswerRecord.from_row(row) for row in cur]
     
-    def get_answers_by_intent_ids(self, intent_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    def get_answers_by_intent_ids(self, intent_ids: List[str]) -> Dict[str, List[AnswerRecord]]:
         """
         批量获取多个意图的答案（性能优化）
         
         Args:
             intent_ids: 意图ID列表
-            
+        
         Returns:
             字典，key 是 intent_id，value 是答案列表
         """
@@ -184,48 +256,107 @@ class PostgreSQLConnection:
             return {}
         
         with self.get_connection() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute(f"""
-                    SELECT 
-                        intent_id,
-                        id,
-                        type,
-                        content,
-                        "isActive" as is_active,
-                        created_at,
-                        updated_at
-                    FROM "{self.schema}".knowledge_base_answers
-                    WHERE intent_id = ANY(%s) AND is_deleted = 0 AND "isActive" = true
-                    ORDER BY intent_id, created_at ASC
-                """, (intent_ids,))
-                
-                # 按 intent_id 分组
-                result = {}
-                for row in cur.fetchall():
-                    row_dict = dict(row)
-                    intent_id = row_dict.pop('intent_id')
-                    
-                    if intent_id not in result:
-                        result[intent_id] = []
-                    result[intent_id].append(row_dict)
-                
-                return result
+            with conn.cursor() as cur:
+                return self.fetch_answers_by_intent_ids(cur, intent_ids)
+    
+    def build_companies_query(self) -> Tuple[str, tuple]:
+        """
+        构建公司发现查询
+        
+        使用递归 CTE 模拟 loose index scan（跳跃扫描）：每一步只在 company_id
+        索引上定位下一个更大的值，代价与公司数量成正比，而不是与意图行数成正比。
+        """
+        query = f"""
+            WITH RECURSIVE companies AS (
+                (
+                    SELECT ki.company_id
+                    FROM "{self.schema}".knowledge_base_intents ki
+                    WHERE ki.company_id IS NOT NULL
+                    ORDER BY ki.company_id
+                    LIMIT 1
+                )
+                UNION ALL
+                SELECT (
+                    SELECT ki.company_id
+                    FROM "{self.schema}".knowledge_base_intents ki
+                    WHERE ki.company_id > c.company_id
+                    ORDER BY ki.company_id
+                    LIMIT 1
+                )
+                FROM companies c
+                WHERE c.company_id IS NOT NULL
+            )
+            SELECT company_id as id, company_id as name
+            FROM companies
+            WHERE company_id IS NOT NULL
+        """
+        return query, ()
     
     def get_all_companies(self) -> List[Dict[str, Any]]:
-        """获取所有公司"""
+        """获取所有公司（基于索引跳跃扫描，不做全表 DISTINCT）"""
         with self.get_connection() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                # 注意：这里假设表名是 companies，请根据实际情况调整
-                cur.execute(f"""
-                    SELECT DISTINCT company_id as id, company_id as name 
-                    FROM "{self.schema}".knowledge_base_intents 
-                    WHERE company_id IS NOT NULL 
-                    ORDER BY company_id
-                """)
+                cur.execute(*self.build_companies_query())
                 return [dict(row) for row in cur.fetchall()]
     
-    def get_database_stats(self) -> Dict[str, Any]:
-        """获取数据库统计信息"""
+    def build_company_counts_query(self, company_ids: Optional[List[str]] = None) -> Tuple[str, tuple]:
+        """构建按公司统计有效意图数和问题数的 SQL"""
+        conditions = ['ki.is_deleted = 0', 'ki."isActive" = true']
+        params = []
+        if company_ids is not None:
+            conditions.insert(0, 'ki.company_id = ANY(%s)')
+            params.append(list(company_ids))
+        
+        query = f"""
+            SELECT 
+                ki.company_id,
+                COUNT(*) as intent_count,
+                COALESCE(SUM(cardinality(ki.keywords)), 0) as question_count
+            FROM "{self.schema}".knowledge_base_intents ki
+            WHERE {' AND '.join(conditions)}
+            GROUP BY ki.company_id
+        """
+        return query, tuple(params)
+    
+    def get_company_counts(self, company_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        统计各公司的有效意图数和问题数
+        
+        Args:
+            company_ids: 只统计这些公司，为 None 时统计所有公司（一次全表扫描）
+        
+        Returns:
+            字典，key 是 company_id，value 包含 intent_count 和 question_count
+        """
+        if company_ids is not None and not company_ids:
+            return {}
+        
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(*self.build_company_counts_query(company_ids))
+                
+                return {
+                    row['company_id']: {
+                        "intent_count": int(row['intent_count']),
+                        "question_count": int(row['question_count'])
+                    }
+                    for row in cur.fetchall()
+                }
+    
+    def get_database_stats(self, exact: bool = True) -> Dict[str, Any]:
+        """
+        获取数据库统计信息
+        
+        Args:
+            exact: True 时执行 COUNT/SUM 全表扫描得到精确值，
+                False 时使用 pg_class/pg_stats 的统计信息快速估算
+        """
+        if not exact:
+            estimated = self.estimate_database_stats()
+            if estimated is not None:
+                return estimated
+            print("⚠️ 表尚未 ANALYZE，无法估算，改为精确统计")
+        
         with self.get_connection() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                 # 统计意图数量
@@ -247,4 +378,406 @@ class PostgreSQLConnection:
                 """)
                 answer_stats = dict(cur.fetchone())
                 
-                return {**intent_stats, **answer_stats}
+                return {**intent_stats, **answer_stats, "estimated": False}
+    
+    def _fetch_table_estimates(self, cur, table: str) -> Optional[Dict[str, Any]]:
+        """读取单个表的 reltuples 和相关列的 pg_stats（表未 ANALYZE 时返回 None）"""
+        cur.execute("""
+            SELECT c.reltuples
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relname = %s
+        """, (self.schema, table))
+        row = cur.fetchone()
+        # PostgreSQL 14+ 未 ANALYZE 的表 reltuples 为 -1，更早版本为 0
+        if row is None or row['reltuples'] <= 0:
+            return None
+        
+        cur.execute("""
+            SELECT
+                attname,
+                null_frac,
+                n_distinct,
+                most_common_vals::text::text[] as most_common_vals,
+                most_common_freqs,
+                elem_count_histogram[array_upper(elem_count_histogram, 1)] as avg_elements
+            FROM pg_stats
+            WHERE schemaname = %s AND tablename = %s
+              AND attname IN ('is_deleted', 'company_id', 'keywords')
+        """, (self.schema, table))
+        
+        return {
+            "reltuples": float(row['reltuples']),
+            "columns": {stat['attname']: dict(stat) for stat in cur.fetchall()}
+        }
+    
+    def _value_fraction(self, column_stats: Optional[Dict[str, Any]], value: str) -> float:
+        """根据 pg_stats 的高频值估算某个值所占的行比例"""
+        if not column_stats or not column_stats.get('most_common_vals'):
+            return 1.0
+        
+        values = column_stats['most_common_vals']
+        freqs = column_stats['most_common_freqs']
+        if value in values:
+            return float(freqs[values.index(value)])
+        # 不在高频值中：用非高频值的总比例作为上限估计
+        return max(1.0 - sum(freqs) - (column_stats.get('null_frac') or 0.0), 0.0)
+    
+    def estimate_database_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        基于 pg_class.reltuples 和 pg_stats 快速估算统计信息，不扫描数据
+        
+        - 意图/答案数：reltuples × is_deleted = 0 的比例
+        - 公司数：company_id 的 n_distinct
+        - 问题数：意图数 × keywords 平均元素数（elem_count_histogram 末项）
+        
+        精度取决于最近一次 ANALYZE（autovacuum 会定期执行）。
+        
+        Returns:
+            与 get_database_stats 相同结构的字典，表从未 ANALYZE 时返回 None
+        """
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                intents = self._fetch_table_estimates(cur, 'knowledge_base_intents')
+                answers = self._fetch_table_estimates(cur, 'knowledge_base_answers')
+        
+        if intents is None or answers is None:
+            return None
+        
+        intent_columns = intents['columns']
+        total_intents = intents['reltuples'] * self._value_fraction(intent_columns.get('is_deleted'), '0')
+        
+        company_stats = intent_columns.get('company_id') or {}
+        n_distinct = company_stats.get('n_distinct') or 0
+        # n_distinct 为负数时表示不同值占总行数的比例
+        total_companies = n_distinct if n_distinct >= 0 else -n_distinct * intents['reltuples']
+        
+        keyword_stats = intent_columns.get('keywords') or {}
+        avg_keywords = keyword_stats.get('avg_elements') or 0
+        total_questions = total_intents * (1 - (keyword_stats.get('null_frac') or 0.0)) * avg_keywords
+        
+        total_answers = answers['reltuples'] * self._value_fraction(answers['columns'].get('is_deleted'), '0')
+        
+        return {
+            "total_intents": int(round(total_intents)),
+            "total_companies": int(round(total_companies)),
+            "total_questions": int(round(total_questions)),
+            "total_answers": int(round(total_answers)),
+            "estimated": True
+        }
+    
+    def build_intents_by_ids_query(self, intent_ids: List[str]) -> Tuple[str, tuple]:
+        """构建按ID批量查询有效意图的 SQL"""
+        query = f"""
+            SELECT 
+                ki.id,
+                ki.name,
+                ki.keywords,
+                ki.usage_count,
+                ki."isActive" as is_active,
+                ki.is_deleted,
+                ki.created_at,
+                ki.updated_at,
+                ki.company_id
+            FROM "{self.schema}".knowledge_base_intents ki
+            WHERE ki.id = ANY(%s) AND ki.is_deleted = 0 AND ki."isActive" = true
+            ORDER BY ki.company_id, ki.created_at ASC
+        """
+        return query, (list(intent_ids),)
+    
+    def get_intents_by_ids(self, intent_ids: List[str]) -> List[IntentRecord]:
+        """
+        按ID批量获取有效意图（实时同步使用）
+        
+        已删除或已停用的意图不会返回，调用方据此清理向量点。
+        
+        Args:
+            intent_ids: 意图ID列表
+        
+        Returns:
+            有效意图列表
+        """
+        if not intent_ids:
+            return []
+        
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(*self.build_intents_by_ids_query(intent_ids))
+                
+                return [IntentRecord.from_row(row) for row in cur]
+    
+    def get_database_time(self) -> Optional[datetime]:
+        """数据库当前时间（会话时区，与 updated_at 一样不带时区），失败时返回 None"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT LOCALTIMESTAMP")
+                    return cur.fetchone()[0]
+        except Exception as e:
+            print(f"❌ 查询数据库时间失败: {e}")
+            return None
+    
+    def get_changed_intent_ids(self, since: datetime) -> Optional[List[str]]:
+        """
+        获取 since 之后有变更的意图ID（重建集合时追平迁移期间的修改）
+        
+        包括 updated_at 不早于 since 的意图（含已删除、已停用的，调用方据此清理向量点）和答案所属的意图；
+        outbox 表存在时还包括此后记录的变更（物理删除只能从 outbox 得知）。
+        
+        Returns:
+            意图ID列表，查询失败时返回 None
+        """
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass(%s)", (f'"{self.schema}".{OUTBOX_TABLE}',))
+                    has_outbox = cur.fetchone()[0] is not None
+                    
+                    query = f"""
+                        SELECT id::text FROM "{self.schema}".knowledge_base_intents WHERE updated_at >= %s
+                        UNION
+                        SELECT intent_id::text FROM "{self.schema}".knowledge_base_answers WHERE updated_at >= %s
+                    """
+                    params = [since, since]
+                    if has_outbox:
+                        query += f"""
+                        UNION
+                        SELECT intent_id FROM "{self.schema}".{OUTBOX_TABLE} WHERE changed_at >= %s
+                        """
+                        params.append(since)
+                    
+                    cur.execute(query, tuple(params))
+                    return [row[0] for row in cur if row[0] is not None]
+        except Exception as e:
+            print(f"❌ 查询变更意图失败: {e}")
+            return None
+    
+    def install_change_capture(self, mode: str = 'notify', channel: str = CHANGE_CHANNEL) -> bool:
+        """
+        在意图表和答案表上安装变更捕获触发器
+        
+        Args:
+            mode: 'notify' 使用 LISTEN/NOTIFY 推送变更，'outbox' 写入 outbox 表
+            channel: NOTIFY 频道名称
+        
+        Returns:
+            是否安装成功
+        """
+        if mode not in ('notify', 'outbox'):
+            raise ValueError(f"不支持的变更捕获模式: {mode}")
+        
+        if mode == 'notify':
+            capture_sql = f"""
+                PERFORM pg_notify('{channel}', json_build_object(
+                    'intent_id', changed_intent_id,
+                    'table', TG_TABLE_NAME,
+                    'op', TG_OP,
+                    'changed_at', (extract(epoch from clock_timestamp()) * 1000)::bigint
+                )::text);
+            """
+        else:
+            capture_sql = f"""
+                INSERT INTO "{self.schema}".{OUTBOX_TABLE} (intent_id, source_table, op)
+                VALUES (changed_intent_id, TG_TABLE_NAME, TG_OP);
+            """
+        
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    if mode == 'outbox':
+                        cur.execute(f"""
+                            CREATE TABLE IF NOT EXISTS "{self.schema}".{OUTBOX_TABLE} (
+                                id BIGSERIAL PRIMARY KEY,
+                                intent_id TEXT NOT NULL,
+                                source_table TEXT NOT NULL,
+                                op TEXT NOT NULL,
+                                changed_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp(),
+                                processed_at TIMESTAMPTZ
+                            );
+                            CREATE INDEX IF NOT EXISTS {OUTBOX_TABLE}_pending_idx
+                                ON "{self.schema}".{OUTBOX_TABLE} (id) WHERE processed_at IS NULL;
+                        """)
+                    
+                    cur.execute(f"""
+                        CREATE OR REPLACE FUNCTION "{self.schema}".kb_capture_change() RETURNS trigger AS $$
+                        DECLARE
+                            changed_intent_ids TEXT[];
+                            changed_intent_id TEXT;
+                        BEGIN
+                            IF TG_TABLE_NAME = 'knowledge_base_intents' THEN
+                                changed_intent_ids := ARRAY[COALESCE(NEW.id, OLD.id)::text];
+                            ELSIF TG_OP = 'UPDATE' AND OLD.intent_id IS DISTINCT FROM NEW.intent_id THEN
+                                -- 答案改挂到其他意图：原意图和新意图都需要重新同步
+                                changed_intent_ids := ARRAY[OLD.intent_id::text, NEW.intent_id::text];
+                            ELSE
+                                changed_intent_ids := ARRAY[COALESCE(NEW.intent_id, OLD.intent_id)::text];
+                            END IF;
+                            FOREACH changed_intent_id IN ARRAY changed_intent_ids LOOP
+                                {capture_sql}
+                            END LOOP;
+                            RETURN NULL;
+                        END;
+                        $$ LANGUAGE plpgsql;
+                    """)
+                    
+                    for table_name in ('knowledge_base_intents', 'knowledge_base_answers'):
+                        cur.execute(f"""
+                            DROP TRIGGER IF EXISTS kb_capture_change ON "{self.schema}".{table_name};
+                            CREATE TRIGGER kb_capture_change
+                                AFTER INSERT OR UPDATE OR DELETE ON "{self.schema}".{table_name}
+                                FOR EACH ROW EXECUTE FUNCTION "{self.schema}".kb_capture_change();
+                        """)
+                        print(f"✅ 触发器已安装: {self.schema}.{table_name} ({mode})")
+            
+            return True
+        
+        except Exception as e:
+            print(f"❌ 安装变更捕获触发器失败: {e}")
+            return False
+    
+    def get_listen_connection(self, channel: str = CHANGE_CHANNEL):
+        """获取已执行 LISTEN 的自动提交连接"""
+        conn = self.get_connection()
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN "{channel}"')
+        return conn
+    
+    def fetch_outbox_changes(self, exclude_ids: Optional[List[int]] = None,
+                             limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        获取 outbox 表中未处理的变更
+        
+        不按 id 游标读取：BIGSERIAL 在插入时分配，事务提交顺序可能与 id 顺序不同，
+        较小 id 的事务晚于已读取的较大 id 提交时会被游标永久跳过。
+        
+        Args:
+            exclude_ids: 已读取、尚未标记为已处理的变更ID
+            limit: 最多返回的变更数
+        """
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(f"""
+                    SELECT id, intent_id, changed_at
+                    FROM "{self.schema}".{OUTBOX_TABLE}
+                    WHERE processed_at IS NULL AND NOT (id = ANY(%s::bigint[]))
+                    ORDER BY id
+                    LIMIT %s
+                """, (list(exclude_ids or []), limit))
+                return [dict(row) for row in cur.fetchall()]
+    
+    def mark_outbox_processed(self, change_ids: List[int]):
+        """标记 outbox 变更为已处理"""
+        if not change_ids:
+            return
+        
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE "{self.schema}".{OUTBOX_TABLE}
+                    SET processed_at = clock_timestamp()
+                    WHERE id = ANY(%s)
+                """, (list(change_ids),))
+    
+    def copy_rows(self, query: str, params: tuple = ()) -> Iterator[List[str]]:
+        """
+        使用 COPY (SELECT ...) TO STDOUT 流式导出查询结果
+        
+        COPY 在后台线程中写入管道，这里边读边解析 CSV，
+        调用方可以在导出尚未结束时就开始处理数据。
+        
+        Args:
+            query: SELECT 语句
+            params: 查询参数
+        
+        Yields:
+            CSV 行（字符串列表）
+        """
+        read_fd, write_fd = os.pipe()
+        errors = []
+        
+        def produce():
+            writer = os.fdopen(write_fd, 'wb', buffering=COPY_BUFFER_SIZE)
+            try:
+                with self.get_connection() as conn:
+                    with conn.cursor() as cur:
+                        # 保证时间戳按 ISO 格式输出，便于解析
+                        cur.execute("SET LOCAL datestyle = 'ISO, YMD'")
+                        select_sql = cur.mogrify(query, params).decode('utf-8')
+                        cur.copy_expert(
+                            f"COPY ({select_sql}) TO STDOUT WITH (FORMAT csv)",
+                            writer,
+                            size=COPY_BUFFER_SIZE
+                        )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                try:
+                    writer.close()
+                except BrokenPipeError:
+                    # 读取端提前结束（调用方中途停止迭代）
+                    pass
+        
+        producer = threading.Thread(target=produce, name="pg-copy", daemon=True)
+        producer.start()
+        
+        try:
+            with io.open(read_fd, 'r', encoding='utf-8', newline='', buffering=COPY_BUFFER_SIZE) as reader:
+                yield from csv.reader(reader)
+        finally:
+            producer.join()
+        
+        if errors and not isinstance(errors[0], BrokenPipeError):
+            print(f"❌ COPY 导出失败: {errors[0]}")
+            raise errors[0]
+    
+    def build_intents_copy_query(self, company_id: str) -> Tuple[str, tuple]:
+        """构建 COPY 导出公司有效意图的 SELECT"""
+        query = f"""
+            SELECT {IntentRecord.COPY_COLUMNS}
+            FROM "{self.schema}".knowledge_base_intents ki
+            WHERE ki.company_id = %s AND ki.is_deleted = 0 AND ki."isActive" = true
+            ORDER BY ki.created_at ASC
+        """
+        return query, (company_id,)
+    
+    def build_answers_copy_query(self, company_id: str) -> Tuple[str, tuple]:
+        """构建 COPY 导出公司有效答案的 SELECT（与意图表关联过滤）"""
+        query = f"""
+            SELECT {AnswerRecord.COPY_COLUMNS}
+            FROM "{self.schema}".knowledge_base_answers a
+            JOIN "{self.schema}".knowledge_base_intents ki ON ki.id = a.intent_id
+            WHERE ki.company_id = %s AND ki.is_deleted = 0 AND ki."isActive" = true
+              AND a.is_deleted = 0 AND a."isActive" = true
+            ORDER BY a.intent_id, a.created_at ASC
+        """
+        return query, (company_id,)
+    
+    def iter_company_intents_copy(self, company_id: str) -> Iterator[IntentRecord]:
+        """
+        通过 COPY 流式导出公司的有效意图（全量重建使用）
+        
+        Args:
+            company_id: 公司ID
+        
+        Yields:
+            意图记录，顺序与 get_company_intents 一致
+        """
+        for row in self.copy_rows(*self.build_intents_copy_query(company_id)):
+            yield IntentRecord.from_csv_row(row)
+    
+    def copy_company_answers(self, company_id: str) -> Dict[str, List[AnswerRecord]]:
+        """
+        通过 COPY 导出公司所有有效意图的答案
+        
+        Args:
+            company_id: 公司ID
+        
+        Returns:
+            字典，key 是 intent_id，value 是答案记录列表
+        """
+        result = {}
+        for row in self.copy_rows(*self.build_answers_copy_query(company_id)):
+            result.setdefault(row[0], []).append(AnswerRecord.from_csv_row(row))
+        
+        return result
@@ -0,0 +1,362 @@
+"""
+数据库查询剖析与索引建议
+对同步工具发出的每条查询执行 EXPLAIN (ANALYZE, BUFFERS)，检查支撑索引是否存在，
+并给出耗时报告和建议的 DDL，用于诊断新客户库上的导出性能
+"""
+
+import json
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import psycopg2
+
+from .database import PostgreSQLConnection
+
+
+# 同步查询依赖的索引：(表名, 需要的前导列, 建议的索引名, 用途)
+EXPECTED_INDEXES = [
+    (
+        'knowledge_base_intents',
+        ['company_id', 'is_deleted', 'isActive', 'created_at'],
+        'idx_kb_intents_company_active_created',
+        '按公司导出意图、公司跳跃扫描、按公司统计'
+    ),
+    (
+        'knowledge_base_intents',
+        ['id'],
+        'idx_kb_intents_id',
+        '按ID批量查询意图（实时同步）、答案关联'
+    ),
+    (
+        'knowledge_base_answers',
+        ['intent_id'],
+        'idx_kb_answers_intent_id',
+        '按 intent_id = ANY(...) 批量查询答案'
+    ),
+]
+
+# 超过该行数的表上出现顺序扫描时给出警告
+SEQ_SCAN_WARN_ROWS = 10000
+
+
+def _quote_ident(name: str) -> str:
+    """为 DDL 引用标识符（含大写字母的列名需要双引号）"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class QueryProfiler:
+    """查询剖析器"""
+    
+    def __init__(self, db: PostgreSQLConnection):
+        """
+        初始化查询剖析器
+        
+        Args:
+            db: 数据库连接管理器
+        """
+        self.db = db
+    
+    def collect_queries(self, company_id: str, sample_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        收集同步工具会发出的所有查询及其代表性参数
+        
+        Args:
+            company_id: 用于剖析的公司ID
+            sample_size: 按ID批量查询时使用的意图ID数量
+        
+        Returns:
+            查询列表，每项包含 name、description、sql、params
+        """
+        intents = self.db.get_company_intents(company_id)
+        intent_ids = [intent['id'] for intent in intents[:sample_size]]
+        sample_intent_id = intent_ids[0] if intent_ids else ''
+        
+        queries = [
+            ("companies", "公司发现（跳跃扫描）", self.db.build_companies_query()),
+            ("company_counts", "按公司统计意图和问题数", self.db.build_company_counts_query()),
+            ("company_intents", "按公司导出意图", self.db.build_intents_query(company_id)),
+            ("answers_by_intent_ids", f"按 intent_id = ANY(...) 查询答案 ({len(intent_ids)} 个ID)",
+             self.db.build_answers_query(intent_ids)),
+            ("intent_answers", "查询单个意图的答案", self.db.build_intent_answers_query(sample_intent_id)),
+            ("intents_by_ids", f"按ID批量查询意图 ({len(intent_ids)} 个ID)",
+             self.db.build_intents_by_ids_query(intent_ids)),
+            ("copy_intents", "COPY 导出意图（内部 SELECT）", self.db.build_intents_copy_query(company_id)),
+            ("copy_answers", "COPY 导出答案（内部 SELECT）", self.db.build_answers_copy_query(company_id)),
+        ]
+        
+        return [
+            {"name": name, "description": description, "sql": sql, "params": params}
+            for name, description, (sql, params) in queries
+        ]
+    
+    def explain(self, sql: str, params: tuple = ()) -> Dict[str, Any]:
+        """
+        执行 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) 并提取关键指标
+        
+        ANALYZE 会真正执行查询，因此放在只读事务中执行并回滚。
+        
+        Args:
+            sql: 查询语句
+            params: 查询参数
+        
+        Returns:
+            包含耗时、缓冲区命中/读取、顺序扫描等信息的摘要
+        """
+        conn = self.db.get_connection()
+        try:
+            conn.set_session(readonly=True)
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+                raw = cur.fetchone()[0]
+            conn.rollback()
+        finally:
+            conn.close()
+        
+        plan_doc = raw[0] if isinstance(raw, list) else json.loads(raw)[0]
+        plan = plan_doc['Plan']
+        
+        nodes = []
+        self._walk_plan(plan, nodes)
+        
+        seq_scans = [
+            {
+                "relation": node.get('Relation Name'),
+                "rows_removed": node.get('Rows Removed by Filter', 0),
+                "actual_rows": node.get('Actual Rows', 0) * node.get('Actual Loops', 1)
+            }
+            for node in nodes if node.get('Node Type') == 'Seq Scan'
+        ]
+        index_scans = sorted({
+            node['Index Name'] for node in nodes if node.get('Index Name')
+        })
+        
+        return {
+            "planning_ms": round(plan_doc.get('Planning Time', 0.0), 3),
+            "execution_ms": round(plan_doc.get('Execution Time', 0.0), 3),
+            "rows": plan.get('Actual Rows', 0),
+            "shared_hit_blocks": plan.get('Shared Hit Blocks', 0),
+            "shared_read_blocks": plan.get('Shared Read Blocks', 0),
+            "temp_written_blocks": plan.get('Temp Written Blocks', 0),
+            "top_node": plan.get('Node Type'),
+            "index_scans": index_scans,
+            "seq_scans": seq_scans,
+            "plan": plan_doc
+        }
+    
+    def _walk_plan(self, node: Dict[str, Any], nodes: List[Dict[str, Any]]):
+        """深度优先展开执行计划节点"""
+        nodes.append(node)
+        for child in node.get('Plans', []):
+            self._walk_plan(child, nodes)
+    
+    def get_table_indexes(self, table: str) -> List[Dict[str, Any]]:
+        """
+        获取表上所有有效索引及其有序列名
+        
+        Args:
+            table: 表名（不含 schema）
+        
+        Returns:
+            索引列表，每项包含 name、columns、is_partial、definition
+        """
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT
+                        ic.relname,
+                        array_agg(a.attname::text ORDER BY k.ord) FILTER (WHERE a.attname IS NOT NULL),
+                        i.indpred IS NOT NULL,
+                        pg_get_indexdef(i.indexrelid)
+                    FROM pg_index i
+                    JOIN pg_class tc ON tc.oid = i.indrelid
+                    JOIN pg_namespace n ON n.oid = tc.relnamespace
+                    JOIN pg_class ic ON ic.oid = i.indexrelid
+                    CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                    LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                    WHERE n.nspname = %s AND tc.relname = %s AND i.indisvalid
+                    GROUP BY ic.relname, i.indpred, i.indexrelid
+                    ORDER BY ic.relname
+                """, (self.db.schema, table))
+                
+                return [
+                    {
+                        "name": row[0],
+                        "columns": row[1] or [],
+                        "is_partial": row[2],
+                        "definition": row[3]
+                    }
+                    for row in cur.fetchall()
+                ]
+    
+    def check_indexes(self) -> List[Dict[str, Any]]:
+        """
+        检查同步查询依赖的索引是否存在
+        
+        已有索引的前导列覆盖所需列即视为满足（部分索引不计入，
+        其谓词不一定与同步查询的过滤条件一致）。
+        
+        Returns:
+            检查结果列表，缺失时附带建议的 CREATE INDEX 语句
+        """
+        results = []
+        indexes_by_table: Dict[str, List[Dict[str, Any]]] = {}
+        
+        for table, columns, index_name, purpose in EXPECTED_INDEXES:
+            if table not in indexes_by_table:
+                indexes_by_table[table] = self.get_table_indexes(table)
+            
+            matched = next(
+                (
+                    index for index in indexes_by_table[table]
+                    if not index['is_partial'] and index['columns'][:len(columns)] == columns
+                ),
+                None
+            )
+            
+            ddl = None
+            if matched is None:
+                column_list = ', '.join(_quote_ident(column) for column in columns)
+                ddl = (
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} '
+                    f'ON "{self.db.schema}".{table} ({column_list});'
+                )
+            
+            results.append({
+                "table": table,
+                "columns": columns,
+                "purpose": purpose,
+                "exists": matched is not None,
+                "matched_index": matched['name'] if matched else None,
+                "suggested_ddl": ddl
+            })
+        
+        return results
+    
+    def get_table_sizes(self) -> Dict[str, Dict[str, Any]]:
+        """获取知识库表的估算行数和占用空间"""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+                    FROM pg_class c
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = %s AND c.relname = ANY(%s)
+                """, (self.db.schema, ['knowledge_base_intents', 'knowledge_base_answers']))
+                
+                return {
+                    row[0]: {"estimated_rows": max(row[1], 0), "total_bytes": row[2]}
+                    for row in cur.fetchall()
+                }
+    
+    def profile(self, company_id: str, sample_size: int = 1000) -> Dict[str, Any]:
+        """
+        剖析所有同步查询并检查索引
+        
+        Args:
+            company_id: 用于剖析的公司ID
+            sample_size: 按ID批量查询时使用的意图ID数量
+        
+        Returns:
+            剖析报告
+        """
+        table_sizes = self.get_table_sizes()
+        index_checks = self.check_indexes()
+        
+        query_results = []
+        for query in self.collect_queries(company_id, sample_size):
+            print(f"⏱️ EXPLAIN ANALYZE: {query['description']}...")
+            start = time.time()
+            try:
+                summary = self.explain(query['sql'], query['params'])
+                error = None
+            except psycopg2.Error as e:
+                summary = {}
+                error = str(e).strip()
+                print(f"   ❌ 剖析失败: {error}")
+            
+            warnings = []
+            for scan in summary.get('seq_scans', []):
+                table_rows = table_sizes.get(scan['relation'], {}).get('estimated_rows', 0)
+                if table_rows >= SEQ_SCAN_WARN_ROWS:
+                    warnings.append(f"在 {scan['relation']} (约 {table_rows} 行) 上顺序扫描")
+            if summary.get('temp_written_blocks'):
+                warnings.append(f"排序/哈希溢出到临时文件 ({summary['temp_written_blocks']} 块)，可考虑调大 work_mem")
+            
+            query_results.append({
+                "name": query['name'],
+                "description": query['description'],
+                "wall_ms": round((time.time() - start) * 1000, 3),
+                "error": error,
+                "warnings": warnings,
+                **summary
+            })
+        
+        return {
+            "profiled_at": datetime.now().isoformat(),
+            "schema": self.db.schema,
+            "company_id": company_id,
+            "sample_size": sample_size,
+            "table_sizes": table_sizes,
+            "index_checks": index_checks,
+            "queries": query_results,
+            "suggested_ddl": [check['suggested_ddl'] for check in index_checks if check['suggested_ddl']]
+        }
+    
+    def print_report(self, report: Dict[str, Any]):
+        """打印剖析报告"""
+        print(f"\n📊 表规模 (schema: {report['schema']})")
+        print("-" * 64)
+        for table, size in report['table_sizes'].items():
+            print(f"   {table}: 约 {size['estimated_rows']} 行, {size['total_bytes'] / 1024 / 1024:.1f} MB")
+        
+        print(f"\n🗂️ 索引检查")
+        print("-" * 64)
+        for check in report['index_checks']:
+            columns = ', '.join(check['columns'])
+            if check['exists']:
+                print(f"   ✅ {check['table']} ({columns}) -> {check['matched_index']}")
+            else:
+                print(f"   ❌ {check['table']} ({columns}) 缺失，用途: {check['purpose']}")
+        
+        print(f"\n⏱️ 查询剖析 (公司: {report['company_id']})")
+        print("-" * 64)
+        print(f"{'查询':<24}{'行数':>10}{'规划(ms)':>12}{'执行(ms)':>12}{'命中块':>10}{'读取块':>10}")
+        for query in report['queries']:
+            if query['error']:
+                print(f"{query['name']:<24}   ❌ {query['error']}")
+                continue
+            print(f"{query['name']:<24}{query['rows']:>10}{query['planning_ms']:>12.2f}{query['execution_ms']:>12.2f}"
+                  f"{query['shared_hit_blocks']:>10}{query['shared_read_blocks']:>10}")
+            if query['index_scans']:
+                print(f"{'':<24}索引: {', '.join(query['index_scans'])}")
+            for warning in query['warnings']:
+                print(f"{'':<24}⚠️ {warning}")
+        
+        if report['suggested_ddl']:
+            print(f"\n💡 建议的索引 DDL:")
+            for ddl in report['suggested_ddl']:
+                print(f"   {ddl}")
+        else:
+            print(f"\n✅ 同步查询所需的索引均已存在")
+    
+    def save_report(self, report: Dict[str, Any], filename: Optional[str] = None) -> str:
+        """
+        保存剖析报告为 JSON 文件
+        
+        Args:
+            report: 剖析报告
+            filename: 文件名，默认 db_profile_<时间戳>.json
+        
+        Returns:
+            报告文件名
+        """
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"db_profile_{timestamp}.json"
+        
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        
+        print(f"📄 剖析报告已保存到: {filename}")
+        return filename
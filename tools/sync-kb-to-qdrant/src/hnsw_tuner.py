@@ -0,0 +1,303 @@
+"""
+HNSW 参数调优
+把集合中的一部分向量复制到临时集合，以精确搜索（暴力比较）的结果为基准，
+扫描建图参数（m、ef_construct）和搜索参数（ef），统计 recall@k、p50/p99 延迟和内存估算，并推荐一组配置
+"""
+
+import contextlib
+import os
+import random
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional
+
+from qdrant_client.models import (
+    VectorParams, Distance, PointStruct, HnswConfigDiff, OptimizersConfigDiff
+)
+
+from .qdrant_manager import QdrantManager
+from .latency_stats import percentile
+
+
+# 默认扫描的参数
+DEFAULT_M_VALUES = [8, 16, 32]
+DEFAULT_EF_CONSTRUCT_VALUES = [64, 128, 256]
+DEFAULT_EF_VALUES = [32, 64, 128, 256]
+
+# 默认的目标召回率
+DEFAULT_TARGET_RECALL = 0.98
+
+# 临时集合名称后缀
+TUNE_COLLECTION_SUFFIX = "_hnsw_tune"
+
+# HNSW 图中每条边的字节数（点ID为 u32）
+HNSW_LINK_BYTES = 4
+
+# 计时前的预热查询数
+WARMUP_QUERIES = 10
+
+
+@dataclass
+class SweepResult:
+    """一组参数的测量结果"""
+    
+    m: int
+    ef_construct: int
+    ef: int
+    recall: float
+    p50_ms: float
+    p99_ms: float
+    build_seconds: float
+    # 按源集合的点数估算的常驻内存（原始向量 + HNSW 图）
+    memory_bytes: int
+
+
+def estimate_memory_bytes(points: int, dimensions: int, m: int) -> int:
+    """估算常驻内存：float32 原始向量，加上 HNSW 图（第 0 层每点 2m 条边，上层合计约为第 0 层的 1/(m-1)）"""
+    vectors = points * dimensions * 4
+    links = points * 2 * m * HNSW_LINK_BYTES * (1 + 1 / max(m - 1, 1))
+    return int(vectors + links)
+
+
+class HnswTuner:
+    """HNSW 参数扫描"""
+    
+    def __init__(self, qdrant: QdrantManager, collection_name: str, max_points: int = 50000,
+                 sample_size: int = 200, top_k: int = 10):
+        """
+        初始化调优任务
+        
+        Args:
+            qdrant: Qdrant 管理器
+            collection_name: 源集合名称（只读取，不修改）
+            max_points: 复制到临时集合的最大点数
+            sample_size: 作为查询的抽样点数（使用已存问题的向量）
+            top_k: recall@k 的 k
+        """
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.tune_collection = f"{collection_name}{TUNE_COLLECTION_SUFFIX}"
+        self.max_points = max_points
+        self.sample_size = sample_size
+        self.top_k = top_k
+        self.points: List[PointStruct] = []
+        self.queries: List[List[float]] = []
+        self.total_points = 0
+        self.dimensions = 0
+        self.distance = Distance.COSINE
+        self.segment_number = 0
+        # 调优自己计算召回率，关闭影子精确搜索，避免干扰延迟测量
+        self.qdrant.recall_monitor.sample_rate = 0
+    
+    def load_vectors(self) -> bool:
+        """从源集合读取向量（不取载荷）并抽样查询，命名向量只取第一个"""
+        try:
+            info = self.qdrant.client.get_collection(self.collection_name)
+        except Exception as e:
+            print(f"❌ 获取集合信息失败: {self.collection_name}, 错误: {e}")
+            return False
+        
+        params = info.config.params.vectors
+        if isinstance(params, dict):
+            params = next(iter(params.values()))
+        self.dimensions = params.size
+        self.distance = params.distance
+        self.segment_number = info.config.optimizer_config.default_segment_number or 0
+        self.total_points = self.qdrant.count_points(self.collection_name, exact=False) or 0
+        
+        print(f"📥 读取 {self.collection_name} 的向量（最多 {self.max_points} 个，共约 {self.total_points} 个）...")
+        offset = None
+        while len(self.points) < self.max_points:
+            records, offset = self.qdrant.client.scroll(
+                collection_name=self.collection_name,
+                limit=min(1000, self.max_points - len(self.points)),
+                offset=offset,
+                with_payload=False,
+                with_vectors=True
+            )
+            for record in records:
+                vector = record.vector
+                if isinstance(vector, dict):
+                    vector = next(iter(vector.values()))
+                self.points.append(PointStruct(id=record.id, vector=vector, payload={}))
+            if offset is None:
+                break
+        
+        if len(self.points) < self.top_k:
+            print(f"❌ 集合中只有 {len(self.points)} 个点，少于 top_k={self.top_k}")
+            return False
+        
+        self.queries = [point.vector for point in random.sample(self.points, min(self.sample_size, len(self.points)))]
+        print(f"✅ 已读取 {len(self.points)} 个向量（{self.dimensions} 维），抽样 {len(self.queries)} 个查询")
+        return True
+    
+    def build(self, m: int, ef_construct: int) -> Optional[float]:
+        """
+        用指定的建图参数重建临时集合，等待索引构建完成
+        
+        Returns:
+            写入和建图的总耗时（秒），失败时返回 None
+        """
+        self.cleanup()
+        start = time.perf_counter()
+        try:
+            self.qdrant.client.create_collection(
+                collection_name=self.tune_collection,
+                vectors_config=VectorParams(size=self.dimensions, distance=self.distance),
+                hnsw_config=HnswConfigDiff(m=m, ef_construct=ef_construct),
+                # 与源集合相同的分段数；阈值设为 1KB，保证样本量较小时也会构建 HNSW
+                optimizers_config=OptimizersConfigDiff(default_segment_number=self.segment_number,
+                                                       indexing_threshold=1)
+            )
+        except Exception as e:
+            print(f"❌ 创建临时集合失败: {e}")
+            return None
+        
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            upsert_result = self.qdrant.upsert_points(self.tune_collection, self.points)
+        if not upsert_result:
+            print(f"❌ 写入临时集合失败: {upsert_result.error}")
+            return None
+        
+        if not self.qdrant.wait_for_green(self.tune_collection):
+            return None
+        return time.perf_counter() - start
+    
+    def ground_truth(self) -> List[List[Any]]:
+        """每个查询的精确 top_k 点ID（暴力比较，与 HNSW 参数无关）"""
+        return [
+            [hit.id for hit in self.qdrant.search(self.tune_collection, query, limit=self.top_k,
+                                                  score_threshold=None, exact=True)]
+            for query in self.queries
+        ]
+    
+    def measure(self, truth: List[List[Any]], ef: int) -> Dict[str, float]:
+        """用指定的 ef 执行全部查询，返回 recall@k 和延迟分位数（毫秒）"""
+        for query in self.queries[:WARMUP_QUERIES]:
+            self.qdrant.search(self.tune_collection, query, limit=self.top_k, score_threshold=None, hnsw_ef=ef)
+        
+        latencies = []
+        found = 0
+        for query, expected in zip(self.queries, truth):
+            start = time.perf_counter()
+            hits = self.qdrant.search(self.tune_collection, query, limit=self.top_k, score_threshold=None, hnsw_ef=ef)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found += len({hit.id for hit in hits} & set(expected))
+        
+        total = sum(len(expected) for expected in truth)
+        return {
+            "recall": found / total if total else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99)
+        }
+    
+    def run(self, m_values: List[int], ef_construct_values: List[int], ef_values: List[int]) -> List[SweepResult]:
+        """
+        扫描参数组合：每组 (m, ef_construct) 重建一次临时集合，再逐个测量 ef
+        
+        Returns:
+            全部测量结果（建图失败的组合不包含在内）
+        """
+        results = []
+        truth = None
+        try:
+            for m in m_values:
+                for ef_construct in ef_construct_values:
+                    print(f"\n🏗️ 构建 m={m}, ef_construct={ef_construct}...")
+                    build_seconds = self.build(m, ef_construct)
+                    if build_seconds is None:
+                        print(f"⚠️ 跳过 m={m}, ef_construct={ef_construct}")
+                        continue
+                    
+                    if truth is None:
+                        print(f"🎯 计算 {len(self.queries)} 个查询的精确 top {self.top_k}...")
+                        truth = self.ground_truth()
+                    
+                    for ef in ef_values:
+                        metrics = self.measure(truth, ef)
+                        results.append(SweepResult(
+                            m=m, ef_construct=ef_construct, ef=ef,
+                            recall=metrics['recall'], p50_ms=metrics['p50_ms'], p99_ms=metrics['p99_ms'],
+                            build_seconds=build_seconds,
+                            memory_bytes=estimate_memory_bytes(max(self.total_points, len(self.points)),
+                                                               self.dimensions, m)
+                        ))
+                        print(f"   ef={ef}: recall@{self.top_k}={metrics['recall']:.4f}, "
+                              f"p50={metrics['p50_ms']:.2f}ms, p99={metrics['p99_ms']:.2f}ms")
+        finally:
+            self.cleanup()
+        
+        return results
+    
+    @staticmethod
+    def recommend(results: List[SweepResult], target_recall: float = DEFAULT_TARGET_RECALL,
+                  max_memory_bytes: Optional[int] = None) -> Optional[SweepResult]:
+        """
+        推荐配置：在内存预算内、召回率达标的组合中选 p99 延迟最低的（相同时选内存更小、建图更快的）；
+        没有组合达标时选召回率最高的
+        """
+        candidates = [r for r in results if max_memory_bytes is None or r.memory_bytes <= max_memory_bytes]
+        if not candidates:
+            return None
+        
+        qualified = [r for r in candidates if r.recall >= target_recall]
+        if qualified:
+            return min(qualified, key=lambda r: (r.p99_ms, r.memory_bytes, r.build_seconds))
+        return max(candidates, key=lambda r: (r.recall, -r.p99_ms))
+    
+    def print_report(self, results: List[SweepResult], recommended: Optional[SweepResult],
+                     target_recall: float):
+        """打印扫描结果表格和推荐配置"""
+        print(f"\n📊 HNSW 参数扫描: {self.collection_name} ({len(self.points)} 个点, {self.dimensions} 维, "
+              f"{len(self.queries)} 个查询, recall@{self.top_k})")
+        print("-" * 86)
+        print(f"{'m':>4}{'ef_construct':>14}{'ef':>6}{'recall':>10}{'p50(ms)':>10}{'p99(ms)':>10}"
+              f"{'建图(秒)':>10}{'内存估算(MB)':>16}")
+        for r in results:
+            marker = " ⭐" if r is recommended else ""
+            print(f"{r.m:>4}{r.ef_construct:>14}{r.ef:>6}{r.recall:>10.4f}{r.p50_ms:>10.2f}{r.p99_ms:>10.2f}"
+                  f"{r.build_seconds:>12.1f}{r.memory_bytes / 1024 / 1024:>16.1f}{marker}")
+        
+        if recommended is None:
+            print("\n⚠️ 没有满足内存预算的配置")
+            return
+        
+        if recommended.recall >= target_recall:
+            print(f"\n✅ 推荐配置（recall ≥ {target_recall} 中 p99 最低）: m={recommended.m}, "
+                  f"ef_construct={recommended.ef_construct}, ef={recommended.ef}")
+        else:
+            print(f"\n⚠️ 没有配置达到 recall {target_recall}，召回率最高的配置: m={recommended.m}, "
+                  f"ef_construct={recommended.ef_construct}, ef={recommended.ef}")
+        print(f"💡 搜索参数: 在 .env 中设置 QDRANT_HNSW_EF={recommended.ef}")
+        print(f"💡 建图参数: 使用 --apply 更新 {self.collection_name}（后台重建索引）")
+    
+    def apply(self, recommended: SweepResult) -> bool:
+        """把推荐的建图参数应用到源集合，优化器在后台按新参数重建索引"""
+        try:
+            self.qdrant.client.update_collection(
+                collection_name=self.collection_name,
+                hnsw_config=HnswConfigDiff(m=recommended.m, ef_construct=recommended.ef_construct)
+            )
+            print(f"✅ 已更新 {self.collection_name} 的 HNSW 配置 (m={recommended.m}, "
+                  f"ef_construct={recommended.ef_construct})，索引将在后台重建")
+            return True
+        
+        except Exception as e:
+            print(f"❌ 更新 HNSW 配置失败: {e}")
+            return False
+    
+    @staticmethod
+    def to_report(results: List[SweepResult], recommended: Optional[SweepResult]) -> Dict[str, Any]:
+        """扫描结果的 JSON 报告"""
+        return {
+            "results": [asdict(r) for r in results],
+            "recommended": asdict(recommended) if recommended is not None else None
+        }
+    
+    def cleanup(self):
+        """删除临时集合"""
+        try:
+            if self.qdrant.client.collection_exists(self.tune_collection):
+                self.qdrant.client.delete_collection(self.tune_collection)
+        except Exception as e:
+            print(f"⚠️ 删除临时集合失败: {e}")
@@ -0,0 +1,232 @@
+"""
+意图质心索引
+每个意图的标准问题向量取平均并归一化得到质心，写入质心集合（<问题集合>_centroids，每个意图一个点）。
+搜索分两步：先在质心集合中粗排出最相近的若干意图，再只在这些意图的问题点中精排，
+标准问题很多的意图不必逐个比较全部问题点。
+"""
+
+import os
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchAny
+
+from .intent_store import intent_point_id
+from .popularity_tiers import PopularityTiers
+from .qdrant_manager import QdrantManager
+
+
+# 质心集合名称后缀
+CENTROID_COLLECTION_SUFFIX = "_centroids"
+
+# 粗排默认保留的意图数
+DEFAULT_COARSE_INTENTS = 20
+
+# 回填质心时每次读取的问题点数
+CENTROID_RETRIEVE_BATCH = 1000
+
+
+def centroid_collection_name(collection_name: str) -> str:
+    """问题集合对应的质心集合名称"""
+    return f"{collection_name}{CENTROID_COLLECTION_SUFFIX}"
+
+
+def compute_centroid(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """意图质心：问题向量的均值再归一化（余弦距离下与各问题的平均相似度方向一致）"""
+    centroid = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(centroid)
+    return centroid / norm if norm > 0 else centroid
+
+
+class IntentCentroids:
+    """意图质心集合的读写和粗排-精排搜索"""
+    
+    def __init__(self, qdrant: QdrantManager, tiers: PopularityTiers, enabled: Optional[bool] = None,
+                 coarse_intents: Optional[int] = None):
+        """
+        初始化意图质心索引
+        
+        Args:
+            qdrant: Qdrant 管理器
+            tiers: 热度分层策略（精排时按分层搜索问题点）
+            enabled: 同步时是否维护质心集合，默认读取 QDRANT_INTENT_CENTROIDS（未设置为 False）
+            coarse_intents: 粗排保留的意图数，默认读取 QDRANT_COARSE_INTENTS（未设置为 20）
+        """
+        if enabled is None:
+            enabled = os.getenv('QDRANT_INTENT_CENTROIDS', 'false').lower() in ('1', 'true', 'yes')
+        if coarse_intents is None:
+            coarse_intents = int(os.getenv('QDRANT_COARSE_INTENTS', str(DEFAULT_COARSE_INTENTS)))
+        
+        self.qdrant = qdrant
+        self.tiers = tiers
+        self.enabled = enabled
+        self.coarse_intents = coarse_intents
+    
+    @staticmethod
+    def is_centroid_collection(collection_name: str) -> bool:
+        return collection_name.endswith(CENTROID_COLLECTION_SUFFIX)
+    
+    def ensure_collection(self, collection_name: str, vector_size: int) -> bool:
+        """
+        质心集合不存在时创建
+        
+        载荷沿用问题点的 metadata 结构（metadata.companyId / metadata.intentId），租户过滤条件可以直接复用。
+        """
+        return self.qdrant.create_collection(centroid_collection_name(collection_name), vector_size)
+    
+    @staticmethod
+    def build_point(intent: Dict[str, Any], centroid: np.ndarray, content_hash: str) -> PointStruct:
+        """构建意图的质心点（点ID与意图集合中的记录相同）"""
+        return PointStruct(
+            id=intent_point_id(intent['id']),
+            vector=centroid.tolist(),
+            payload={
+                "metadata": {
+                    "companyId": intent['company_id'],
+                    "intentId": intent['id'],
+                    "intentName": intent['name'],
+                    "questionCount": len(intent['keywords']),
+                    "contentHash": content_hash
+                }
+            }
+        )
+    
+    def upsert_centroids(self, collection_name: str, points: Sequence[PointStruct]) -> bool:
+        """写入质心点，全部写入成功时返回 True"""
+        if not points:
+            return True
+        
+        name = centroid_collection_name(collection_name)
+        print(f"🎯 写入 {len(points)} 个意图质心到 {name}...")
+        return bool(self.qdrant.upsert_points(name, points))
+    
+    def delete_centroids(self, collection_name: str, intent_ids: List[str]) -> int:
+        """删除意图的质心点，返回已删除数"""
+        if not intent_ids:
+            return 0
+        return self.qdrant.delete_points(centroid_collection_name(collection_name),
+                                         [intent_point_id(intent_id) for intent_id in intent_ids])
+    
+    def existing_hashes(self, collection_name: str, points_filter: Filter) -> Dict[str, Optional[str]]:
+        """质心集合中已有质心的 {意图ID: 内容指纹}"""
+        name = centroid_collection_name(collection_name)
+        if not self.qdrant.client.collection_exists(name):
+            return {}
+        
+        return {
+            metadata.get('intentId'): metadata.get('contentHash')
+            for metadata in (
+                (record.payload or {}).get('metadata', {})
+                for record in self.qdrant.iter_point_payloads(
+                    name, points_filter, payload_fields=["metadata.intentId", "metadata.contentHash"]
+                )
+            )
+        }
+    
+    def centroids_from_collection(self, collection_name: str,
+                                  point_ids: Dict[str, List[str]]) -> Dict[str, np.ndarray]:
+        """
+        从已写入的问题点读取向量计算质心（用于只更新了部分问题，或开启质心前已同步的意图）
+        
+        Args:
+            collection_name: 问题点所在的集合
+            point_ids: {意图ID: 该意图全部问题点的ID}
+        
+        Returns:
+            {意图ID: 质心}，问题点不全的意图不包含在结果中
+        """
+        owners = {point_id: intent_id for intent_id, ids in point_ids.items() for point_id in ids}
+        vectors: Dict[str, List[Any]] = {}
+        all_ids = list(owners)
+        
+        try:
+            for i in range(0, len(all_ids), CENTROID_RETRIEVE_BATCH):
+                records = self.qdrant.client.retrieve(
+                    collection_name=collection_name,
+                    ids=all_ids[i:i + CENTROID_RETRIEVE_BATCH],
+                    with_payload=False,
+                    with_vectors=True
+                )
+                for record in records:
+                    vector = record.vector
+                    if isinstance(vector, dict):
+                        # 命名向量取第一个
+                        vector = next(iter(vector.values()), None)
+                    if vector is not None:
+                        vectors.setdefault(owners[str(record.id)], []).append(vector)
+        
+        except Exception as e:
+            print(f"❌ 读取问题向量失败: {collection_name}, 错误: {e}")
+            return {}
+        
+        return {
+            intent_id: compute_centroid(intent_vectors)
+            for intent_id, intent_vectors in vectors.items()
+            if len(intent_vectors) == len(point_ids[intent_id])
+        }
+    
+    @staticmethod
+    def intent_filter(intent_ids: List[str], filter_conditions: Optional[Filter] = None) -> Filter:
+        """只搜索指定意图的问题点（与已有过滤条件合并）"""
+        intent_condition = FieldCondition(key="metadata.intentId", match=MatchAny(any=intent_ids))
+        if filter_conditions is None:
+            return Filter(must=[intent_condition])
+        
+        must = filter_conditions.must or []
+        if not isinstance(must, list):
+            must = [must]
+        return Filter(
+            must=[intent_condition, *must],
+            should=filter_conditions.should,
+            must_not=filter_conditions.must_not,
+            min_should=filter_conditions.min_should
+        )
+    
+    def coarse_search(self, collection_name: str, query_vector: List[float],
+                      filter_conditions: Optional[Filter] = None,
+                      coarse_intents: Optional[int] = None) -> List[str]:
+        """
+        粗排：在质心集合中找出与查询最相近的意图
+        
+        Args:
+            collection_name: 问题集合名称
+            query_vector: 查询向量
+            filter_conditions: 过滤条件（只能使用 metadata.companyId / metadata.intentId 等质心点也有的字段）
+            coarse_intents: 保留的意图数，默认使用 QDRANT_COARSE_INTENTS
+        
+        Returns:
+            按质心相似度排序的意图ID
+        """
+        hits = self.qdrant.search(
+            centroid_collection_name(collection_name),
+            query_vector,
+            limit=coarse_intents or self.coarse_intents,
+            score_threshold=None,
+            filter_conditions=filter_conditions,
+            payload_include=["metadata.intentId"]
+        )
+        return [hit.payload['metadata']['intentId'] for hit in hits if hit.payload]
+    
+    def search(self, collection_name: str, query_vector: List[float], limit: int = 10,
+               score_threshold: float = 0.7, filter_conditions: Optional[Filter] = None,
+               coarse_intents: Optional[int] = None, **search_kwargs) -> List[Any]:
+        """
+        粗排-精排搜索：先取最相近的 coarse_intents 个意图，再只在这些意图的问题点中分层搜索
+        （按公司搜索请使用 TenancyLayout.search_company_coarse）
+        
+        Args:
+            collection_name: 问题集合名称（热数据集合）
+            query_vector: 查询向量
+            limit: 返回结果数
+            score_threshold: 最低相似度
+            filter_conditions: 过滤条件（粗排时同样生效）
+            coarse_intents: 粗排保留的意图数
+            search_kwargs: 透传给 QdrantManager.search 的其他参数（如 payload_include）
+        """
+        intent_ids = self.coarse_search(collection_name, query_vector, filter_conditions, coarse_intents)
+        if not intent_ids:
+            return []
+        
+        return self.tiers.search(collection_name, query_vector, limit=limit, score_threshold=score_threshold,
+                                 filter_conditions=self.intent_filter(intent_ids, filter_conditions),
+                                 **search_kwargs)
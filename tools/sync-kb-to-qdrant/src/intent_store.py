@@ -0,0 +1,228 @@
+"""
+意图级存储
+答案和标准问题列表每个意图只存一份，放在无向量的意图集合（<问题集合>_intents）中；
+问题向量点只保留 intentId 和可过滤的小字段，搜索后由 AnswerResolver 按 intentId 批量取回答案
+"""
+
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
+
+from qdrant_client.models import (
+    PointStruct, Filter, FieldCondition, MatchValue,
+    PayloadSchemaType, KeywordIndexParams, KeywordIndexType
+)
+
+from .qdrant_manager import QdrantManager
+
+
+# 意图集合名称后缀
+INTENT_COLLECTION_SUFFIX = "_intents"
+
+# 搜索命中只需要的载荷字段（配合 search 的 payload_include 使用，答案由 AnswerResolver 取回）
+SEARCH_HIT_FIELDS = [
+    "content",
+    "metadata.intentId",
+    "metadata.intentName",
+    "metadata.contentHash",
+    "metadata.recordHash",
+    "metadata.syncVersion"
+]
+
+# 答案缓存默认容量（意图数）
+DEFAULT_ANSWER_CACHE_SIZE = 10000
+
+# 意图记录的点ID命名空间：ID = uuid5(命名空间, intentId)
+INTENT_POINT_ID_NAMESPACE = uuid.UUID('3b8e2f6a-51c4-4d9e-8a07-c6f2d19e4b35')
+
+
+def intent_point_id(intent_id: str) -> str:
+    """意图记录的确定性点ID"""
+    return str(uuid.uuid5(INTENT_POINT_ID_NAMESPACE, intent_id))
+
+
+def intent_collection_name(collection_name: str) -> str:
+    """问题集合对应的意图集合名称（版本集合 <别名>_v<时间戳> 对应别名的意图集合）"""
+    return re.sub(r"_v\d{14}$", "", collection_name) + INTENT_COLLECTION_SUFFIX
+
+
+class IntentStore:
+    """意图集合：每个意图一条记录（标准问题列表 + 答案），不带向量"""
+    
+    def __init__(self, qdrant: QdrantManager, collection_name: str):
+        """
+        初始化意图存储
+        
+        Args:
+            qdrant: Qdrant 管理器
+            collection_name: 意图集合名称
+        """
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+    
+    def ensure_collection(self) -> bool:
+        """意图集合不存在时创建（无向量，只建 intentId 和 companyId 索引）"""
+        return self.qdrant.create_payload_collection(self.collection_name, [
+            ("intentId", PayloadSchemaType.KEYWORD),
+            ("companyId", KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)),
+        ])
+    
+    def upsert_intents(self, points: Sequence[PointStruct]) -> bool:
+        """写入意图记录（points 可以是惰性构建的序列），全部写入成功时返回 True"""
+        if not points:
+            return True
+        
+        print(f"🗂️ 写入 {len(points)} 条意图记录到 {self.collection_name}...")
+        return bool(self.qdrant.upsert_points(self.collection_name, points))
+    
+    def delete_intents(self, intent_ids: List[str]) -> int:
+        """删除意图记录，返回已删除数"""
+        if not intent_ids:
+            return 0
+        return self.qdrant.delete_points(self.collection_name, [intent_point_id(intent_id) for intent_id in intent_ids])
+    
+    def list_intent_ids(self, company_id: str) -> Set[str]:
+        """意图集合中某个公司的全部意图ID"""
+        company_filter = Filter(must=[FieldCondition(key="companyId", match=MatchValue(value=company_id))])
+        return {
+            (record.payload or {}).get('intentId')
+            for record in self.qdrant.iter_point_payloads(self.collection_name, company_filter,
+                                                          payload_fields=["intentId"])
+        }
+    
+    def get_intents(self, intent_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        按意图ID批量读取意图记录（一次请求）
+        
+        Returns:
+            {意图ID: 意图记录}，不存在的意图不包含在结果中
+        """
+        unique_ids = list(dict.fromkeys(intent_ids))
+        if not unique_ids:
+            return {}
+        
+        try:
+            records = self.qdrant.client.retrieve(
+                collection_name=self.collection_name,
+                ids=[intent_point_id(intent_id) for intent_id in unique_ids],
+                with_payload=True,
+                with_vectors=False
+            )
+            return {record.payload['intentId']: record.payload for record in records if record.payload}
+        
+        except Exception as e:
+            print(f"❌ 读取意图记录失败: {e}")
+            return {}
+    
+    def resolve(self, results: List[Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        为搜索结果批量取回意图记录
+        
+        Args:
+            results: 问题集合的搜索结果（载荷中带 metadata.intentId）
+        
+        Returns:
+            {意图ID: 意图记录}
+        """
+        intent_ids = [
+            (result.payload or {}).get('metadata', {}).get('intentId') for result in results
+        ]
+        return self.get_intents([intent_id for intent_id in intent_ids if intent_id])
+
+
+class AnswerResolver:
+    """
+    搜索结果的答案解析器
+    
+    对命中结果去重后，缓存未命中的意图一次性从意图集合取回；缓存按 (intentId, syncVersion, recordHash)
+    做键，意图名称、标准问题或答案变化后问题点的 recordHash 随之更新，旧缓存自然失效。
+    """
+    
+    def __init__(self, store: IntentStore, cache_size: Optional[int] = None):
+        """
+        初始化答案解析器
+        
+        Args:
+            store: 意图集合
+            cache_size: LRU 缓存容量（意图数），默认读取 ANSWER_CACHE_SIZE（未设置为 10000），0 表示不缓存
+        """
+        if cache_size is None:
+            cache_size = int(os.getenv('ANSWER_CACHE_SIZE', str(DEFAULT_ANSWER_CACHE_SIZE)))
+        
+        self.store = store
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def cache_key(metadata: Dict[str, Any]) -> Tuple[str, str, str]:
+        """命中结果对应的缓存键"""
+        return metadata.get('intentId'), metadata.get('syncVersion', ''), metadata.get('recordHash', '')
+    
+    def resolve(self, results: List[Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        为搜索结果取回意图记录（缓存未命中的意图合并为一次请求）
+        
+        Args:
+            results: 搜索结果，载荷至少包含 SEARCH_HIT_FIELDS 中的 metadata 字段
+        
+        Returns:
+            {意图ID: 意图记录}
+        """
+        keys = list(dict.fromkeys(
+            self.cache_key((result.payload or {}).get('metadata', {})) for result in results
+        ))
+        keys = [key for key in keys if key[0]]
+        
+        resolved = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                record = self._cache.get(key)
+                if record is None:
+                    missing.append(key)
+                    continue
+                self._cache.move_to_end(key)
+                resolved[key[0]] = record
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        
+        if not missing:
+            return resolved
+        
+        fetched = self.store.get_intents([key[0] for key in missing])
+        with self._lock:
+            for key in missing:
+                record = fetched.get(key[0])
+                if record is None:
+                    continue
+                resolved[key[0]] = record
+                # 意图记录先于问题点写入，两者的记录指纹不一致时说明同步正在进行，不缓存
+                # （旧版本同步的点没有 recordHash，同样不缓存）
+                if self.cache_size > 0 and key[2] and record.get('recordHash') == key[2]:
+                    self._cache[key] = record
+                    self._cache.move_to_end(key)
+            
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        
+        return resolved
+    
+    def resolve_groups(self, groups: List[Any]) -> Dict[str, Dict[str, Any]]:
+        """为分组搜索结果取回意图记录（每组取一次，用组内最高分的命中定位缓存）"""
+        return self.resolve([group.hits[0] for group in groups if group.hits])
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "cached_intents": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
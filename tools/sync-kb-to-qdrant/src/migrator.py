@@ -3,34 +3,72 @@
 从PostgreSQL迁移到Qdrant向量数据库
 """
 
+import hashlib
 import json
+import os
+import tempfile
 import time
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Set, Tuple
 from tqdm import tqdm
-from qdrant_client.models import PointStruct
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue, MatchAny
 
 from .database import PostgreSQLConnection
-from .qdrant_manager import QdrantManager
+from .company_registry import CompanyRegistry
+from .qdrant_manager import QdrantManager, DEFAULT_COLLECTION_NAME
 from .embedding_service import LocalEmbeddingService
+from .parallel_extractor import SnapshotParallelExtractor
+from .records import (
+    IntentRecord, AnswerRecord, PendingPoint, LazyPointList, POINT_ID_NAMESPACE, point_id_from_original_id
+)
+from .stats_snapshot import refresh_stats_snapshot
+from .cache import get_cache_dir
+from .collection_versions import CollectionVersionManager
+from .tenancy import TenancyLayout
+from .storage_profiles import select_storage_profile
+from .intent_store import intent_point_id
+from .intent_centroids import compute_centroid
+
+
+# 载荷结构版本：0.0.2 起答案和标准问题列表只存在意图集合中，问题点不再重复保存；
+# 0.0.3 起问题点的 contentHash 只覆盖向量依赖的数据，意图记录另有 recordHash
+SYNC_VERSION = "0.0.3"
+
+# 问题点载荷中不参与内容指纹的字段（见 build_mutable_metadata 和 build_record_metadata），变化时用 set_payload 原地更新
+MUTABLE_METADATA_FIELDS = [
+    "intentUsageCount", "popularityTier", "searchPriority", "isDeleted", "intentIsActive", "updatedAt",
+    "intentName", "answerCount", "activeAnswerCount", "hasActiveAnswers", "recordHash"
+]
+
+# 重建追平变更时 updated_at 的容差：应用服务器与数据库的时钟可能略有偏差，多同步几个意图只会按内容指纹跳过
+CATCH_UP_CLOCK_SKEW = timedelta(minutes=1)
 
 
 class KnowledgeBaseMigrator:
     """知识库数据迁移器"""
     
-    def __init__(self, model_name: str = "BAAI/bge-large-zh-v1.5"):
+    def __init__(self, model_name: str = "BAAI/bge-large-zh-v1.5", source=None):
         """
         初始化迁移器
         
         Args:
             model_name: 嵌入模型名称
+            source: 数据源，默认连接 PostgreSQL；传入 KnowledgeBaseSnapshot 时离线读取本地快照
         """
         print("🚀 初始化知识库迁移器...")
         
         # 初始化各个组件
-        self.db = PostgreSQLConnection()
+        self.offline = source is not None
+        self.db = source if self.offline else PostgreSQLConnection()
         self.qdrant = QdrantManager()
         self.embedding_service = LocalEmbeddingService(model_name)
+        self.collection_name = DEFAULT_COLLECTION_NAME
+        # 租户隔离策略：共用集合（默认）或每个公司一个集合，见 QDRANT_TENANCY
+        self.tenancy = TenancyLayout(self.qdrant, DEFAULT_COLLECTION_NAME)
+        self._ready_shard_keys = set()
+        self.company_registry = CompanyRegistry(self.db)
+        # 批量导入期间需要恢复的索引配置 {集合名称: 配置}（None 表示未处于批量导入）
+        self.bulk_load_config = None
         
         # 默认向量配置
         self.vector_config = {
@@ -63,10 +101,16 @@ class KnowledgeBaseMigrator:
         """计算搜索优先级"""
         return min(max(usage_count // 10 + 1, 1), 10)
     
-    def build_payload(self, intent: Dict[str, Any], question: str, 
-                     question_index: int, answers: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """构建向量点的payload（规范结构：content + metadata）"""
+    def build_payload(self, intent: IntentRecord, question: str, 
+                     question_index: int, answers: List[AnswerRecord]) -> Dict[str, Any]:
+        """
+        构建向量点的payload（规范结构：content + metadata）
+        
+        只保存可过滤的小字段；答案和标准问题列表每个意图一份，见 build_intent_record。
+        """
         current_time = int(time.time() * 1000)
+        mutable = self.build_mutable_metadata(intent)
+        record = self.build_record_metadata(intent, answers)
         
         return {
             # 主要内容：用于向量化的文本
@@ -77,28 +121,19 @@ class KnowledgeBaseMigrator:
                 # 核心业务标识
                 "companyId": intent['company_id'],
                 "intentId": intent['id'],
-                "intentName": intent['name'],
+                "intentName": record["intentName"],
                 "originalId": f"{intent['company_id']}_{intent['id']}_{question_index}",  # 原始字符串ID用于追踪
                 
-                # 标准问题信息
+                # 标准问题信息（问题列表在意图集合中）
                 "currentQuestionIndex": question_index,
-                "allStandardQuestions": intent['keywords'],
                 "questionCount": len(intent['keywords']),
                 
-                # 答案信息
-                "answers": [
-                    {
-                        "id": ans['id'],
-                        "type": ans['type'],
-                        "content": ans['content'],
-                        "isActive": ans['is_active']
-                    } for ans in answers
-                ],
-                "answerCount": len(answers),
-                "activeAnswerCount": sum(1 for ans in answers if ans['is_active']),
+                # 答案统计（答案内容在意图集合中）
+                "answerCount": record["answerCount"],
+                "activeAnswerCount": record["activeAnswerCount"],
                 
                 # 使用统计
-                "intentUsageCount": intent.get('usage_count', 0),
+                "intentUsageCount": mutable["intentUsageCount"],
                 "usageCount24h": 0,  # 初始值
                 "lastMatchedAt": 0,  # 初始值
                 
@@ -107,31 +142,213 @@ class KnowledgeBaseMigrator:
                 "matchSuccessRate": 0.0,  # 初始值
                 
                 # 性能分层
-                "popularityTier": self.calculate_popularity_tier(intent.get('usage_count', 0)),
-                "searchPriority": self.calculate_search_priority(intent.get('usage_count', 0)),
+                "popularityTier": mutable["popularityTier"],
+                "searchPriority": mutable["searchPriority"],
                 
                 # 向量质量
                 "vectorQuality": 0.5,  # 将在计算向量后更新
                 "language": "zh-CN",  # 中文语言标识
                 
                 # 基础状态
-                "isDeleted": intent.get('is_deleted', 0) == 1,
-                "intentIsActive": intent.get('is_active', True),
-                "hasActiveAnswers": any(ans['is_active'] for ans in answers),
+                "isDeleted": mutable["isDeleted"],
+                "intentIsActive": mutable["intentIsActive"],
+                "hasActiveAnswers": record["hasActiveAnswers"],
                 
                 # 时间追踪
                 "createdAt": int(intent['created_at'].timestamp() * 1000),
-                "updatedAt": int(intent['updated_at'].timestamp() * 1000),
+                "updatedAt": mutable["updatedAt"],
                 "lastAccessedAt": current_time,
                 
                 # 同步管理
-                "syncVersion": "0.0.1",
+                "syncVersion": SYNC_VERSION,
                 "lastSyncAt": current_time
             }
         }
     
-    def process_intent(self, intent: Dict[str, Any]) -> List[PointStruct]:
-        """处理单个意图，为每个问题生成向量点"""
+    def build_mutable_metadata(self, intent: IntentRecord) -> Dict[str, Any]:
+        """
+        问题点载荷中不影响向量的字段：使用次数、热度分层、搜索优先级和意图状态
+        
+        这些字段不参与内容指纹，使用次数频繁变化时不会触发重新向量化，见 payload_updates。
+        """
+        usage_count = intent.get('usage_count', 0)
+        return {
+            "intentUsageCount": usage_count,
+            "popularityTier": self.calculate_popularity_tier(usage_count),
+            "searchPriority": self.calculate_search_priority(usage_count),
+            "isDeleted": intent.get('is_deleted', 0) == 1,
+            "intentIsActive": intent.get('is_active', True),
+            "updatedAt": int(intent['updated_at'].timestamp() * 1000)
+        }
+    
+    @staticmethod
+    def build_record_metadata(intent: IntentRecord, answers: List[AnswerRecord]) -> Dict[str, Any]:
+        """
+        问题点载荷中来自意图记录的字段：意图名称和答案统计
+        
+        这些字段不影响向量，只修改答案或意图名称时重写意图记录并原地更新这些字段（连同 recordHash），
+        不重新向量化，见 payload_updates。
+        """
+        return {
+            "intentName": intent['name'],
+            "answerCount": len(answers),
+            "activeAnswerCount": sum(1 for ans in answers if ans['is_active']),
+            "hasActiveAnswers": any(ans['is_active'] for ans in answers)
+        }
+    
+    def build_intent_record(self, intent: IntentRecord, answers: List[AnswerRecord],
+                            record_hash: str) -> Dict[str, Any]:
+        """构建意图集合中的记录：标准问题列表和答案，每个意图只存一份"""
+        return {
+            "companyId": intent['company_id'],
+            "intentId": intent['id'],
+            "intentName": intent['name'],
+            "standardQuestions": intent['keywords'],
+            "answers": [
+                {
+                    "id": ans['id'],
+                    "type": ans['type'],
+                    "content": ans['content'],
+                    "isActive": ans['is_active']
+                } for ans in answers
+            ],
+            "recordHash": record_hash,
+            "updatedAt": int(intent['updated_at'].timestamp() * 1000),
+            "syncVersion": SYNC_VERSION,
+            "lastSyncAt": int(time.time() * 1000)
+        }
+    
+    def build_intent_point(self, record: Tuple[IntentRecord, List[AnswerRecord], str]) -> PointStruct:
+        """把 (意图, 答案, 意图记录指纹) 序列化为不带向量的 PointStruct"""
+        intent, answers, record_hash = record
+        return PointStruct(
+            id=intent_point_id(intent['id']),
+            vector={},
+            payload=self.build_intent_record(intent, answers, record_hash)
+        )
+    
+    @staticmethod
+    def intent_record_changed(record_hash: str, point_ids: List[str], points: List[PendingPoint],
+                              existing_metadata: Dict[str, Dict[str, Any]]) -> bool:
+        """意图记录是否需要重写：有问题点重新写入，或已有问题点记录的意图记录指纹与当前不同"""
+        return bool(points) or any(
+            existing_metadata.get(point_id, {}).get('recordHash') != record_hash for point_id in point_ids
+        )
+    
+    def make_point_id(self, company_id: str, intent_id: str, question_index: int) -> str:
+        """由 originalId 派生确定性的点ID（uuid5），同一问题每次同步得到相同ID"""
+        return point_id_from_original_id(f"{company_id}_{intent_id}_{question_index}")
+    
+    def compute_vector_hash(self, intent: IntentRecord) -> str:
+        """
+        计算意图级向量指纹（问题点的 contentHash）
+        
+        只覆盖向量依赖的源数据（标准问题文本）和模型名称，指纹不变说明该意图的点无需重新向量化。
+        意图名称和答案见 compute_record_hash，使用次数等字段见 build_mutable_metadata。
+        """
+        source = {
+            "model": self.embedding_service.model_name,
+            "syncVersion": SYNC_VERSION,
+            "keywords": intent['keywords']
+        }
+        return self._hash_source(source)
+    
+    def compute_record_hash(self, intent: IntentRecord, answers: List[AnswerRecord]) -> str:
+        """
+        计算意图记录指纹（recordHash）
+        
+        覆盖意图集合中记录的内容（意图名称、标准问题、答案），指纹变化时重写意图记录并原地更新问题点的答案统计。
+        """
+        source = {
+            "syncVersion": SYNC_VERSION,
+            "name": intent['name'],
+            "keywords": intent['keywords'],
+            "answers": [[ans['id'], ans['type'], ans['content'], ans['is_active']] for ans in answers]
+        }
+        return self._hash_source(source)
+    
+    @staticmethod
+    def _hash_source(source: Dict[str, Any]) -> str:
+        encoded = json.dumps(source, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+    
+    def get_existing_metadata(self, collection_name: str, points_filter: Filter) -> Dict[str, Dict[str, Any]]:
+        """读取集合中已有点的内容指纹和可原地更新的字段 {点ID: metadata}"""
+        fields = ["metadata.contentHash", *(f"metadata.{name}" for name in MUTABLE_METADATA_FIELDS)]
+        return {
+            str(record.id): (record.payload or {}).get('metadata', {})
+            for record in self.qdrant.iter_point_payloads(collection_name, points_filter, payload_fields=fields)
+        }
+    
+    @staticmethod
+    def content_hashes(existing_metadata: Dict[str, Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """已有点的 {点ID: 内容指纹}"""
+        return {point_id: metadata.get('contentHash') for point_id, metadata in existing_metadata.items()}
+    
+    def payload_updates(self, intent: IntentRecord, answers: List[AnswerRecord], record_hash: str,
+                        point_ids: List[str], points: List[PendingPoint],
+                        existing_metadata: Dict[str, Dict[str, Any]]) -> List[Tuple[Dict[str, Any], List[str]]]:
+        """
+        内容指纹未变、跳过重新写入的点中，使用次数、答案统计等字段与当前值不同的点
+        
+        Returns:
+            [(新的字段值, 点ID)]，传给 QdrantManager.set_payloads；没有需要更新的点时为空列表
+        """
+        metadata = {
+            **self.build_mutable_metadata(intent),
+            **self.build_record_metadata(intent, answers),
+            "recordHash": record_hash
+        }
+        upserted = {point.id for point in points}
+        stale_ids = [
+            point_id for point_id in point_ids
+            if point_id not in upserted and point_id in existing_metadata
+            and any(existing_metadata[point_id].get(name) != value for name, value in metadata.items())
+        ]
+        return [(metadata, stale_ids)] if stale_ids else []
+    
+    def apply_payload_updates(self, updates: Dict[str, List[Tuple[Dict[str, Any], List[str]]]],
+                              shard_keys: Dict[str, Optional[str]], errors: List[str],
+                              failed_ids: Optional[List[str]] = None) -> int:
+        """
+        按集合写入 payload_updates 收集的字段更新，返回已更新的点数（失败记录到 errors）
+        
+        传入 failed_ids 时记录更新失败的集合中全部待更新的点ID（set_payload 可以安全重试）。
+        """
+        updated = 0
+        for name, collection_updates in updates.items():
+            expected = sum(len(point_ids) for _, point_ids in collection_updates)
+            if not expected:
+                continue
+            
+            print(f"📝 更新 {name} 中 {expected} 个向量点的使用和答案统计...")
+            collection_updated = self.qdrant.set_payloads(name, collection_updates, key="metadata",
+                                                          shard_key=shard_keys[name])
+            if collection_updated < expected:
+                errors.append(f"{name}: {expected - collection_updated} 个向量点的使用和答案统计更新失败")
+                if failed_ids is not None:
+                    failed_ids.extend(point_id for _, point_ids in collection_updates for point_id in point_ids)
+            updated += collection_updated
+        return updated
+    
+    def process_intent(self, intent: IntentRecord,
+                       answers: Optional[List[AnswerRecord]] = None,
+                       existing_hashes: Optional[Dict[str, Optional[str]]] = None,
+                       failed_point_ids: Optional[List[str]] = None,
+                       record_hash: Optional[str] = None) -> List[PendingPoint]:
+        """
+        处理单个意图，为每个问题生成待写入的向量点
+        
+        载荷字典此时还不构建，写入时由 build_point 按批生成（见 LazyPointList）。
+        编码失败的问题（零向量，质量分为 0）不生成向量点：集合中的旧点和内容指纹保持不变，下次同步重试。
+        
+        Args:
+            intent: 意图数据
+            answers: 预先批量查询的答案，为 None 时单独查询
+            existing_hashes: 集合中已有点的 {点ID: 向量指纹}，指纹未变的问题直接跳过，不再向量化
+            failed_point_ids: 传入时记录编码失败、本次没有生成的点ID
+            record_hash: 调用方已计算的意图记录指纹，为 None 时在这里计算
+        """
         intent_id = intent['id']
         company_id = intent['company_id']
         keywords = intent.get('keywords', [])
@@ -140,69 +357,309 @@ class KnowledgeBaseMigrator:
             print(f"⚠️ 意图 {intent_id} 没有标准问题，跳过")
             return []
         
-        print(f"🔄 处理意图: {intent['name']} ({len(keywords)} 个问题)")
-        
         # 获取答案
-        answers = self.db.get_intent_answers(intent_id)
+        if answers is None:
+            answers = self.db.get_intent_answers(intent_id)
         
-        # 批量向量化所有标准问题
-        print(f"   🧠 正在向量化 {len(keywords)} 个问题...")
-        vectors = self.embedding_service.encode_batch(keywords)
+        # 找出需要重新写入的问题（新问题或向量指纹变化）
+        content_hash = self.compute_vector_hash(intent)
+        point_ids = [self.make_point_id(company_id, intent_id, i) for i in range(len(keywords))]
+        changed = [
+            i for i, point_id in enumerate(point_ids)
+            if existing_hashes is None or existing_hashes.get(point_id) != content_hash
+        ]
         
-        if len(vectors) != len(keywords):
-            print(f"❌ 向量化数量不匹配: 期望 {len(keywords)}, 实际 {len(vectors)}")
+        if not changed:
             return []
         
-        # 构建向量点
+        if record_hash is None:
+            record_hash = self.compute_record_hash(intent, answers)
+        
+        print(f"🔄 处理意图: {intent['name']} ({len(changed)}/{len(keywords)} 个问题需要更新)")
+        
+        # 批量向量化需要更新的标准问题
+        print(f"   🧠 正在向量化 {len(changed)} 个问题...")
+        vectors = self.embedding_service.encode_batch([keywords[i] for i in changed], as_array=True)
+        
+        if len(vectors) != len(changed):
+            print(f"❌ 向量化数量不匹配: 期望 {len(changed)}, 实际 {len(vectors)}")
+            if failed_point_ids is not None:
+                failed_point_ids.extend(point_ids[i] for i in changed)
+            return []
+        
+        # 构建待写入的向量点（同一意图的问题共享意图和答案记录）
         points = []
-        for i, (question, vector) in enumerate(zip(keywords, vectors)):
-            # 构建payload
-            payload = self.build_payload(intent, question, i, answers)
-            
-            # 更新向量质量
-            payload["metadata"]["vectorQuality"] = self.embedding_service.calculate_vector_quality(vector)
+        failed = []
+        for i, vector in zip(changed, vectors):
+            vector_quality = self.embedding_service.calculate_vector_quality(vector)
+            if vector_quality == 0.0:
+                # 编码失败时 encode_batch 以零向量占位，不能带着新的内容指纹写入，否则之后会被当作未变化跳过
+                failed.append(point_ids[i])
+                continue
             
-            # 创建向量点（使用UUID格式ID）
-            import uuid
-            # 生成UUID格式的ID，确保唯一性
-            point_id = str(uuid.uuid4())
-            
-            # 添加UUID到metadata中
-            payload["metadata"]["id"] = point_id
-            
-            # 根据向量配置创建向量点
-            if hasattr(self, 'vector_config') and self.vector_config.get('has_named_vectors', False):
-                # 命名向量配置
-                vector_names = self.vector_config.get('vector_names', [])
-                if vector_names:
-                    vector_name = vector_names[0]  # 使用第一个向量名
-                    print(f"   🔧 使用命名向量: {vector_name}")
-                    point = PointStruct(
-                        id=point_id,
-                        vectors={vector_name: vector},
-                        payload=payload
-                    )
-                else:
-                    # 如果没有向量名，回退到默认配置
-                    point = PointStruct(
-                        id=point_id,
-                        vector=vector,
-                        payload=payload
-                    )
-            else:
-                # 单一向量配置
-                point = PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload=payload
-                )
-            points.append(point)
+            points.append(PendingPoint(
+                id=point_ids[i],
+                vector=vector,
+                intent=intent,
+                question_index=i,
+                answers=answers,
+                vector_quality=vector_quality,
+                content_hash=content_hash,
+                record_hash=record_hash
+            ))
+        
+        if failed:
+            print(f"   ⚠️ {len(failed)} 个问题编码失败，暂不写入，下次同步重试")
+            if failed_point_ids is not None:
+                failed_point_ids.extend(failed)
         
         print(f"   ✅ 生成了 {len(points)} 个向量点")
         return points
     
-    def migrate_company(self, company_id: str) -> Dict[str, Any]:
-        """迁移单个公司的数据"""
+    def build_point(self, pending: PendingPoint) -> PointStruct:
+        """把待写入的向量点序列化为 PointStruct（构建完整载荷）"""
+        payload = self.build_payload(pending.intent, pending.question, pending.question_index, pending.answers)
+        
+        # 更新向量质量
+        payload["metadata"]["vectorQuality"] = pending.vector_quality
+        
+        # 添加点ID和内容指纹到metadata中
+        payload["metadata"]["id"] = pending.id
+        payload["metadata"]["contentHash"] = pending.content_hash
+        payload["metadata"]["recordHash"] = pending.record_hash
+        
+        vector = pending.vector.tolist()
+        
+        # 根据向量配置创建向量点
+        if hasattr(self, 'vector_config') and self.vector_config.get('has_named_vectors', False):
+            # 命名向量配置
+            vector_names = self.vector_config.get('vector_names', [])
+            if vector_names:
+                vector_name = vector_names[0]  # 使用第一个向量名
+                return PointStruct(
+                    id=pending.id,
+                    vector={vector_name: vector},
+                    payload=payload
+                )
+        
+        # 单一向量配置（或没有向量名时回退到默认配置）
+        return PointStruct(
+            id=pending.id,
+            vector=vector,
+            payload=payload
+        )
+    
+    def expected_points(self, company_id: Optional[str] = None) -> int:
+        """
+        集合预计的点数（每个问题一个点），取自公司注册表的问题数
+        
+        每个公司一个集合时为该公司的问题数，共用集合时为全部公司的问题数之和。
+        """
+        companies = self.company_registry.companies
+        if self.tenancy.per_company and company_id is not None:
+            return companies.get(company_id, {}).get('question_count', 0)
+        return sum(entry.get('question_count', 0) for entry in companies.values())
+    
+    def prepare_collection(self, collection_name: str, bulk_load: bool = False,
+                           company_id: Optional[str] = None):
+        """
+        准备目标集合：不存在时创建，并读取向量配置（维度不匹配时报错，需要 --rebuild）
+        
+        Args:
+            collection_name: 集合名称
+            bulk_load: 新建集合时暂不构建 HNSW 索引
+            company_id: 集合所属的公司（每个公司一个集合时），新建时按其问题数选择存储配置
+        
+        启用热度分层时一并准备冷数据集合（向量放磁盘并量化），启用意图质心时一并准备质心集合。
+        """
+        print(f"📦 准备集合: {collection_name}")
+        
+        # 检查集合是否存在
+        collection_info = self.qdrant.get_collection_info(collection_name)
+        if collection_info:
+            print(f"✅ 集合已存在，向量维度: {collection_info.get('vector_size', 'unknown')}")
+            expected_size = self.embedding_service.dimensions
+            actual_size = collection_info.get('vector_size', 0)
+            
+            # 维度不匹配时不再原地删除重建（重建期间搜索不可用），改为重建到新版本集合后切换别名
+            if actual_size != expected_size and actual_size != 'unknown':
+                print(f"⚠️ 向量维度不匹配：期望 {expected_size}，实际 {actual_size}")
+                raise Exception(f"向量维度不匹配（期望 {expected_size}，实际 {actual_size}），"
+                                f"请使用 --rebuild 重建到新版本集合")
+            else:
+                print(f"✅ 向量维度匹配，使用现有集合")
+                
+                if not bulk_load and self.bulk_load_config is None and self.qdrant.is_indexing_deferred(collection_name):
+                    # 上次批量导入中途退出，索引构建仍处于暂停状态
+                    print("⚠️ 集合的索引构建仍处于暂停状态，恢复生产索引配置")
+                    self.qdrant.end_bulk_load(collection_name, wait=False)
+        
+        # 创建集合（如果不存在或已删除）
+        if not self.qdrant.get_collection_info(collection_name):
+            print(f"🏗️ 创建新集合: {collection_name} ({self.embedding_service.dimensions}维)")
+            profile, quantization = self.tenancy.tiers.storage_for(
+                collection_name, select_storage_profile(self.expected_points(company_id))
+            )
+            if not self.qdrant.create_collection(collection_name, self.embedding_service.dimensions,
+                                                 bulk_load=bulk_load, custom_sharding=self.tenancy.shard_keys,
+                                                 profile=profile, quantization_config=quantization):
+                raise Exception("集合创建失败")
+            print(f"✅ 集合创建成功")
+        elif not self.tenancy.per_company:
+            # 共用集合按公司过滤搜索，旧集合的 companyId 索引升级为租户索引
+            self.qdrant.ensure_tenant_index(collection_name)
+        
+        # 获取向量配置
+        vector_config = self.qdrant.get_vector_config(collection_name)
+        print(f"🔧 向量配置: {vector_config['vector_config_type']}")
+        self.vector_config = vector_config
+        
+        if self.tenancy.tiers.enabled and not self.tenancy.tiers.is_cold_collection(collection_name):
+            for tier_collection in self.tenancy.tiers.collections(collection_name)[1:]:
+                self.prepare_collection(tier_collection, bulk_load, company_id)
+        
+        if self.tenancy.centroids.enabled and not self.tenancy.tiers.is_cold_collection(collection_name):
+            if not self.tenancy.centroids.ensure_collection(collection_name, self.embedding_service.dimensions):
+                raise Exception("质心集合创建失败")
+    
+    def company_collection(self, company_id: str) -> str:
+        """公司数据写入的集合（共用集合时即 collection_name，重建期间是新的版本集合）"""
+        if self.tenancy.per_company:
+            return self.tenancy.collection_for(company_id)
+        return self.collection_name
+    
+    def sync_collections(self) -> List[str]:
+        """实时同步可能涉及的全部集合（清理已删除意图时逐个处理），包含冷数据集合"""
+        collections = self.tenancy.company_collections() if self.tenancy.per_company else [self.collection_name]
+        return [name for collection_name in collections for name in self.tenancy.tiers.collections(collection_name)]
+    
+    def tier_collection(self, collection_name: str, intent: IntentRecord) -> str:
+        """意图的问题点按热度分层写入的集合（未启用分层时即 collection_name）"""
+        tier = self.calculate_popularity_tier(intent.get('usage_count', 0))
+        return self.tenancy.tiers.collection_for(collection_name, tier)
+    
+    def group_by_tier(self, collection_name: str, points: List[PendingPoint]) -> Dict[str, List[PendingPoint]]:
+        """把待写入的点按目标集合（热/冷数据集合）分组"""
+        groups = {}
+        for point in points:
+            groups.setdefault(self.tier_collection(collection_name, point.intent), []).append(point)
+        return groups
+    
+    def plan_centroid(self, intent: IntentRecord, target: str, point_ids: List[str], points: List[PendingPoint],
+                      existing_hashes: Dict[str, Optional[str]], centroid_hashes: Dict[str, Optional[str]],
+                      plan: Dict[str, Any]):
+        """
+        决定意图的质心是否需要更新，记入 plan
+        
+        全部问题都重新向量化时直接用新向量计算；只更新了部分问题，或质心缺失/过期而问题未变时，
+        记入回填，问题点写入后从集合读取向量计算。
+        """
+        content_hash = points[0].content_hash if points else existing_hashes.get(point_ids[0])
+        if content_hash is None or (not points and centroid_hashes.get(intent['id']) == content_hash):
+            return
+        
+        if len(points) == len(point_ids):
+            centroid = compute_centroid([point.vector for point in points])
+            plan["ready"].append(self.tenancy.centroids.build_point(intent, centroid, content_hash))
+        else:
+            plan["backfill"].setdefault(target, {})[intent['id']] = (intent, point_ids, content_hash)
+    
+    def write_centroids(self, collection_name: str, plan: Dict[str, Any],
+                        failed_intent_ids: Optional[Set[str]] = None) -> bool:
+        """
+        写入 plan 中的意图质心（回填的质心从已写入的问题点计算），全部写入成功时返回 True
+        
+        Args:
+            collection_name: 问题集合名称
+            plan: plan_centroid 生成的计划
+            failed_intent_ids: 传入时记录质心未能更新的意图ID（需要重试）
+        """
+        centroids = self.tenancy.centroids
+        points = plan["ready"]
+        incomplete = []
+        for target, pending in plan["backfill"].items():
+            computed = centroids.centroids_from_collection(
+                target, {intent_id: point_ids for intent_id, (_, point_ids, _) in pending.items()}
+            )
+            points.extend(
+                centroids.build_point(intent, computed[intent_id], content_hash)
+                for intent_id, (intent, _, content_hash) in pending.items() if intent_id in computed
+            )
+            incomplete.extend(intent_id for intent_id in pending if intent_id not in computed)
+        
+        if incomplete:
+            print(f"⚠️ {len(incomplete)} 个意图的问题点不完整，暂不更新质心，下次同步重试")
+        
+        success = centroids.upsert_centroids(collection_name, points)
+        if failed_intent_ids is not None:
+            failed_intent_ids.update(incomplete)
+            if not success:
+                failed_intent_ids.update(point.payload['metadata']['intentId'] for point in points)
+        return success
+    
+    def prepare_shard_key(self, collection_name: str, company_id: str) -> Optional[str]:
+        """公司在集合中的分片键（首次使用时创建），未启用自定义分片时返回 None"""
+        shard_key = self.tenancy.shard_key_for(company_id, collection_name)
+        if shard_key is None or (collection_name, shard_key) in self._ready_shard_keys:
+            return shard_key
+        
+        if not self.qdrant.ensure_shard_key(collection_name, shard_key):
+            raise Exception(f"分片键 {shard_key} 创建失败")
+        self._ready_shard_keys.add((collection_name, shard_key))
+        return shard_key
+    
+    def start_bulk_load(self, collection_name: str, company_id: Optional[str] = None) -> bool:
+        """准备集合并暂停索引构建，返回是否成功进入批量导入模式"""
+        self.prepare_collection(collection_name, bulk_load=True, company_id=company_id)
+        
+        # {集合名称: 需要恢复的索引配置}，分层时热、冷数据集合都暂停
+        index_configs = {}
+        for name in self.tenancy.tiers.collections(collection_name):
+            index_config = self.qdrant.begin_bulk_load(name)
+            if index_config is None:
+                print("⚠️ 无法暂停索引构建，按普通模式写入")
+                for paused_name, paused_config in index_configs.items():
+                    self.qdrant.end_bulk_load(paused_name, paused_config, wait=False)
+                return False
+            index_configs[name] = index_config
+        
+        self.bulk_load_config = index_configs
+        return True
+    
+    def finish_bulk_load(self, collection_name: str) -> bool:
+        """恢复索引配置并等待集合变为 green"""
+        index_configs, self.bulk_load_config = self.bulk_load_config or {}, None
+        return all([self.qdrant.end_bulk_load(name, index_config) for name, index_config in index_configs.items()])
+    
+    def migrate_company(self, company_id: str, bulk: bool = False,
+                        prefetched: Optional[Tuple[List[IntentRecord], Dict[str, List[AnswerRecord]]]] = None,
+                        extract_workers: int = 0, bulk_load: bool = False) -> Dict[str, Any]:
+        """
+        迁移单个公司的数据
+        
+        Args:
+            company_id: 公司ID
+            bulk: 使用 COPY 流式导出（大租户全量重建时更快）
+            prefetched: 已导出的 (意图列表, 答案字典)，通常来自并行导出
+            extract_workers: 大于 0 时按意图ID区间在同一快照上并行导出
+            bulk_load: 写入期间暂停 HNSW 索引构建，写完后恢复索引配置并等待集合变为 green
+        """
+        if not bulk_load or self.bulk_load_config is not None:
+            # 未启用批量导入，或已由 migrate_all_companies 统一暂停了索引构建
+            return self._migrate_company(company_id, bulk, prefetched, extract_workers)
+        
+        collection_name = self.company_collection(company_id)
+        started = self.start_bulk_load(collection_name, company_id)
+        result = self._migrate_company(company_id, bulk, prefetched, extract_workers)
+        if started and not self.finish_bulk_load(collection_name):
+            result["success"] = False
+            result["errors"].append("恢复索引配置后集合未能变为 green")
+        return result
+    
+    def _migrate_company(self, company_id: str, bulk: bool,
+                         prefetched: Optional[Tuple[List[IntentRecord], Dict[str, List[AnswerRecord]]]],
+                         extract_workers: int) -> Dict[str, Any]:
+        """迁移单个公司的数据（参数见 migrate_company）"""
         print(f"\n{'='*60}")
         print(f"📦 开始迁移公司: {company_id}")
         print(f"{'='*60}")
@@ -213,6 +670,11 @@ class KnowledgeBaseMigrator:
             "total_intents": 0,
             "total_questions": 0,
             "total_vectors": 0,
+            "upserted_vectors": 0,
+            "skipped_vectors": 0,
+            "updated_payload_vectors": 0,
+            "failed_vectors": 0,
+            "deleted_stale_vectors": 0,
             "success_count": 0,
             "error_count": 0,
             "errors": [],
@@ -223,94 +685,183 @@ class KnowledgeBaseMigrator:
         start_time = time.time()
         
         try:
-            # 1. 强制重建集合以确保维度匹配
-            collection_name = "wechat_diplomat"
-            print(f"📦 准备集合: {collection_name}")
-            
-            # 检查集合是否存在
-            collection_info = self.qdrant.get_collection_info(collection_name)
-            if collection_info:
-                print(f"✅ 集合已存在，向量维度: {collection_info.get('vector_size', 'unknown')}")
-                expected_size = self.embedding_service.dimensions
-                actual_size = collection_info.get('vector_size', 0)
-                
-                # 如果维度不匹配，删除并重建
-                if actual_size != expected_size and actual_size != 'unknown':
-                    print(f"⚠️ 向量维度不匹配：期望 {expected_size}，实际 {actual_size}")
-                    print(f"🗑️ 删除现有集合并重建...")
-                    
-                    try:
-                        self.qdrant.client.delete_collection(collection_name)
-                        print(f"✅ 已删除现有集合: {collection_name}")
-                    except Exception as e:
-                        print(f"❌ 删除集合失败: {e}")
-                        raise Exception(f"无法删除现有集合: {e}")
-                else:
-                    print(f"✅ 向量维度匹配，使用现有集合")
-            
-            # 创建集合（如果不存在或已删除）
-            if not self.qdrant.get_collection_info(collection_name):
-                print(f"🏗️ 创建新集合: {collection_name} ({self.embedding_service.dimensions}维)")
-                if not self.qdrant.create_collection(collection_name, self.embedding_service.dimensions):
-                    raise Exception("集合创建失败")
-                print(f"✅ 集合创建成功")
-            
-            # 获取向量配置
-            vector_config = self.qdrant.get_vector_config(collection_name)
-            print(f"🔧 向量配置: {vector_config['vector_config_type']}")
-            self.vector_config = vector_config
+            # 1. 准备集合（维度不匹配时报错）和分片键
+            collection_name = self.company_collection(company_id)
+            self.prepare_collection(collection_name, company_id=company_id)
+            tier_collections = self.tenancy.tiers.collections(collection_name)
+            shard_keys = {name: self.prepare_shard_key(name, company_id) for name in tier_collections}
+            intent_store = self.tenancy.intent_store_for(company_id)
+            if not intent_store.ensure_collection():
+                raise Exception(f"意图集合 {intent_store.collection_name} 创建失败")
             
             # 2. 获取公司的意图数据
-            print("📊 获取意图数据...")
-            intents = self.db.get_company_intents(company_id)
-            
-            result["total_intents"] = len(intents)
-            result["total_questions"] = sum(len(intent.get('keywords', [])) for intent in intents)
+            if bulk:
+                # COPY 流式导出：答案先整体导出，意图边解析边向量化
+                print("📊 使用 COPY 批量导出数据...")
+                answers_map = self.db.copy_company_answers(company_id)
+                intents = self.db.iter_company_intents_copy(company_id)
+            else:
+                if prefetched is not None:
+                    intents, answers_map = prefetched
+                elif extract_workers > 0:
+                    print(f"📊 使用 {extract_workers} 个快照连接并行获取意图数据...")
+                    with SnapshotParallelExtractor(self.db, extract_workers) as extractor:
+                        intents, answers_map = extractor.extract_company_by_ranges(company_id)
+                else:
+                    print("📊 获取意图数据...")
+                    intents = self.db.get_company_intents(company_id)
+                    answers_map = None
+                
+                result["total_intents"] = len(intents)
+                result["total_questions"] = sum(len(intent.get('keywords', [])) for intent in intents)
+                
+                print(f"📈 统计信息:")
+                print(f"   总意图数: {result['total_intents']}")
+                print(f"   总问题数: {result['total_questions']}")
+                
+                if result["total_intents"] == 0:
+                    print("⚠️ 没有找到意图数据，跳过迁移")
+                    result["success"] = True
+                    return result
             
-            print(f"📈 统计信息:")
-            print(f"   总意图数: {result['total_intents']}")
-            print(f"   总问题数: {result['total_questions']}")
+            # 3. 读取已有点的内容指纹（分层时按集合分别读取），未变化的问题跳过
+            company_filter = Filter(must=[FieldCondition(key="metadata.companyId", match=MatchValue(value=company_id))])
+            existing_metadata = {name: self.get_existing_metadata(name, company_filter) for name in tier_collections}
+            existing_hashes = {name: self.content_hashes(metadata) for name, metadata in existing_metadata.items()}
+            print(f"🔎 集合中已有该公司 {sum(len(hashes) for hashes in existing_hashes.values())} 个向量点")
+            centroids_enabled = self.tenancy.centroids.enabled
+            centroid_hashes = (self.tenancy.centroids.existing_hashes(collection_name, company_filter)
+                               if centroids_enabled else {})
+            centroid_plan = {"ready": [], "backfill": {}}
             
-            if result["total_intents"] == 0:
-                print("⚠️ 没有找到意图数据，跳过迁移")
-                result["success"] = True
-                return result
-            
-            # 3. 处理每个意图
+            # 4. 处理每个意图
             print("\n🔄 开始处理意图...")
             all_points = []
+            intent_records = []
+            payload_updates = {name: [] for name in tier_collections}
+            expected_ids = {name: set() for name in tier_collections}
+            expected_intent_ids = set()
             
             for intent in tqdm(intents, desc="处理意图", ncols=80):
+                if bulk:
+                    result["total_intents"] += 1
+                    result["total_questions"] += len(intent.keywords)
+                
+                keywords = intent.get('keywords') or []
+                # 先登记期望的点ID，处理失败的意图也不会被当作过期点删除
+                target = self.tier_collection(collection_name, intent)
+                point_ids = [self.make_point_id(company_id, intent['id'], i) for i in range(len(keywords))]
+                expected_ids[target].update(point_ids)
+                if keywords:
+                    expected_intent_ids.add(intent['id'])
+                
                 try:
-                    points = self.process_intent(intent)
+                    if answers_map is not None:
+                        answers = answers_map.get(intent['id'], [])
+                    else:
+                        answers = self.db.get_intent_answers(intent['id']) if keywords else []
+                    record_hash = self.compute_record_hash(intent, answers)
+                    # 只有已在目标层的点才能跳过，换层的意图需要写入新的集合
+                    failed_point_ids = []
+                    points = self.process_intent(intent, answers, existing_hashes[target], failed_point_ids,
+                                                 record_hash)
                     all_points.extend(points)
+                    if failed_point_ids:
+                        result["failed_vectors"] += len(failed_point_ids)
+                        result["errors"].append(f"意图 {intent['id']}: {len(failed_point_ids)} 个问题编码失败")
+                    if keywords and self.intent_record_changed(record_hash, point_ids, points, existing_metadata[target]):
+                        intent_records.append((intent, answers, record_hash))
+                    payload_updates[target].extend(
+                        self.payload_updates(intent, answers, record_hash, point_ids, points, existing_metadata[target])
+                    )
+                    # 有问题编码失败时质心暂不更新，与问题点一起在下次同步重试
+                    if centroids_enabled and keywords and not failed_point_ids:
+                        self.plan_centroid(intent, target, point_ids, points, existing_hashes[target],
+                                           centroid_hashes, centroid_plan)
+                    result["skipped_vectors"] += len(keywords) - len(points) - len(failed_point_ids)
                     result["success_count"] += 1
-                    
+                
                 except Exception as e:
+                    # 处理失败的意图保留它在各层中的旧点
+                    for name in tier_collections:
+                        expected_ids[name].update(point_ids)
                     error_msg = f"意图 {intent['id']} 处理失败: {str(e)}"
                     result["errors"].append(error_msg)
                     result["error_count"] += 1
                     print(f"\n❌ {error_msg}")
             
-            result["total_vectors"] = len(all_points)
+            if bulk and result["total_intents"] == 0:
+                print("⚠️ 没有找到意图数据，跳过迁移")
+                result["success"] = True
+                return result
+            
+            result["total_vectors"] = len(set().union(*expected_ids.values()))
+            result["upserted_vectors"] = len(all_points)
             print(f"\n📊 处理完成:")
             print(f"   成功意图数: {result['success_count']}")
             print(f"   失败意图数: {result['error_count']}")
-            print(f"   生成向量数: {result['total_vectors']}")
+            print(f"   向量总数: {result['total_vectors']}")
+            print(f"   需要写入: {result['upserted_vectors']}")
+            print(f"   未变化跳过: {result['skipped_vectors']}")
+            print(f"   只更新使用和答案统计: {sum(len(ids) for updates in payload_updates.values() for _, ids in updates)}")
+            
+            # 5. 先写意图记录再写问题点：意图记录写入失败时问题点的向量指纹和记录指纹都不更新，下次同步会重试
+            if not intent_store.upsert_intents(LazyPointList(intent_records, self.build_intent_point)):
+                raise Exception("意图记录写入失败")
             
-            # 4. 批量插入到Qdrant
+            # 6. 批量插入到Qdrant（确定性ID，重复同步原地覆盖；分层时按热度写入各自的集合）
             if all_points:
                 print(f"\n📤 开始插入向量到Qdrant...")
-                if self.qdrant.upsert_points(collection_name, all_points):
+                result["upserted_vectors"] = 0
+                for tier_name, tier_points in self.group_by_tier(collection_name, all_points).items():
+                    upsert_result = self.qdrant.upsert_points(tier_name, LazyPointList(tier_points, self.build_point),
+                                                              shard_key=shard_keys[tier_name])
+                    if upsert_result.error:
+                        raise Exception(f"向量插入失败: {upsert_result.error}")
+                    
+                    # 个别批次失败不中断迁移：失败的点没有写入新的内容哈希，下次同步会重新写入
+                    result["upserted_vectors"] += upsert_result.upserted_points
+                    result["failed_vectors"] += upsert_result.failed_points
+                    for batch in upsert_result.batches:
+                        if batch.failed_ids:
+                            result["errors"].append(
+                                f"{tier_name} 批次 {batch.index}: {len(batch.failed_ids)} 个向量点写入失败: {batch.error}"
+                            )
+                if result["failed_vectors"] == 0:
                     print("✅ 向量插入成功")
                 else:
-                    raise Exception("向量插入失败")
+                    print(f"⚠️ {result['failed_vectors']} 个向量点编码或写入失败，其余已写入")
+            
+            # 向量未变的点只原地更新使用和答案统计，不重新写入向量
+            result["updated_payload_vectors"] = self.apply_payload_updates(payload_updates, shard_keys,
+                                                                           result["errors"])
+            
+            # 问题点写入后再写质心（回填的质心需要读取已写入的问题向量）
+            if centroids_enabled and not self.write_centroids(collection_name, centroid_plan):
+                result["errors"].append("意图质心写入失败")
             
-            # 5. 验证结果
+            # 7. 删除过期的点（已删除的意图/问题、换层后旧层中的点，以及旧版随机ID留下的重复点）和过期的意图记录
+            for name in tier_collections:
+                stale_ids = [point_id for point_id in existing_hashes[name] if point_id not in expected_ids[name]]
+                if stale_ids:
+                    print(f"🗑️ 删除 {name} 中 {len(stale_ids)} 个过期向量点...")
+                    result["deleted_stale_vectors"] += self.qdrant.delete_points(name, stale_ids)
+            
+            stale_intent_ids = list(intent_store.list_intent_ids(company_id) - expected_intent_ids)
+            if stale_intent_ids:
+                print(f"🗑️ 删除 {len(stale_intent_ids)} 条过期意图记录...")
+                intent_store.delete_intents(stale_intent_ids)
+            
+            stale_centroid_ids = [intent_id for intent_id in centroid_hashes if intent_id not in expected_intent_ids]
+            if stale_centroid_ids:
+                print(f"🗑️ 删除 {len(stale_centroid_ids)} 个过期意图质心...")
+                self.tenancy.centroids.delete_centroids(collection_name, stale_centroid_ids)
+            
+            # 8. 验证结果
             print("\n🔍 验证迁移结果...")
-            collection_info = self.qdrant.get_collection_info(collection_name)
-            if collection_info:
-                actual_count = collection_info['points_count']
+            counts = [self.qdrant.count_points(name, company_filter) for name in tier_collections]
+            actual_count = None if None in counts else sum(counts)
+            if actual_count is not None:
                 print(f"📈 验证结果:")
                 print(f"   期望向量数: {result['total_vectors']}")
                 print(f"   实际向量数: {actual_count}")
@@ -320,16 +871,21 @@ class KnowledgeBaseMigrator:
                 else:
                     print("⚠️ 数据数量不匹配")
             
-            # 6. 计算耗时
+            # 9. 计算耗时
             result["duration_seconds"] = time.time() - start_time
-            result["success"] = result["error_count"] == 0
+            result["success"] = result["error_count"] == 0 and result["failed_vectors"] == 0 and not result["errors"]
+            
+            # 用实际结果更新公司注册表，供下次调度排序和估算耗时
+            self.company_registry.record_run(
+                company_id, result["total_intents"], result["total_questions"], result["duration_seconds"]
+            )
             
             print(f"\n🎉 公司 {company_id} 迁移完成!")
             print(f"   耗时: {result['duration_seconds']:.2f} 秒")
             print(f"   状态: {'✅ 成功' if result['success'] else '⚠️ 部分成功'}")
             
             return result
-            
+        
         except Exception as e:
             result["duration_seconds"] = time.time() - start_time
             error_msg = f"公司迁移失败: {str(e)}"
@@ -337,12 +893,177 @@ class KnowledgeBaseMigrator:
             print(f"\n❌ {error_msg}")
             return result
     
-    def migrate_all_companies(self) -> List[Dict[str, Any]]:
-        """迁移所有公司的数据"""
+    def sync_intents(self, intent_ids: List[str]) -> Dict[str, Any]:
+        """
+        增量同步一组意图（实时同步使用）
+        
+        重新向量化内容有变化的意图并写入集合，随后清理这些意图的过期向量点
+        （例如被删掉的问题）；已删除或停用的意图直接删除其全部向量点。
+        
+        Args:
+            intent_ids: 发生变更的意图ID列表
+        
+        Returns:
+            同步结果统计，failed_intent_ids 为需要重试的意图（处理或写入失败）
+        """
+        result = {
+            "changed_intents": len(intent_ids),
+            "upserted_intents": 0,
+            "removed_intents": 0,
+            "total_vectors": 0,
+            "skipped_vectors": 0,
+            "updated_payload_vectors": 0,
+            "failed_intent_ids": [],
+            "errors": []
+        }
+        
+        intents = self.db.get_intents_by_ids(intent_ids)
+        answers_map = self.db.get_answers_by_intent_ids([intent['id'] for intent in intents])
+        
+        # 按公司分组：不同公司可能位于不同的集合或分片
+        intents_by_company = {}
+        for intent in intents:
+            intents_by_company.setdefault(intent['company_id'], []).append(intent)
+        
+        synced_ids = []
+        for company_id, company_intents in intents_by_company.items():
+            synced_ids.extend(self._sync_company_intents(company_id, company_intents, answers_map, result))
+        
+        removed_ids = set(intent_ids) - {intent['id'] for intent in intents}
+        if removed_ids:
+            for collection_name in self.sync_collections():
+                if not self.qdrant.delete_points_by_intent_ids(collection_name, list(removed_ids)):
+                    result["errors"].append(f"删除失效意图向量点失败: {collection_name}")
+                    result["failed_intent_ids"].extend(removed_ids)
+            for intent_store in self.tenancy.intent_stores():
+                intent_store.delete_intents(list(removed_ids))
+            if self.tenancy.centroids.enabled:
+                for collection_name in self.tenancy.company_collections():
+                    self.tenancy.centroids.delete_centroids(collection_name, list(removed_ids))
+        
+        failed_ids = set(result["failed_intent_ids"])
+        result["failed_intent_ids"] = sorted(failed_ids)
+        result["upserted_intents"] = len(set(synced_ids) - failed_ids)
+        result["removed_intents"] = len(removed_ids - failed_ids)
+        return result
+    
+    def _sync_company_intents(self, company_id: str, intents: List[IntentRecord],
+                              answers_map: Dict[str, List[AnswerRecord]], result: Dict[str, Any]) -> List[str]:
+        """
+        增量同步同一公司的一组意图，统计累加到 result，返回已处理的意图ID
+        
+        处理或写入失败的意图记入 result["failed_intent_ids"]，调用方需要重新同步。
+        """
+        collection_name = self.company_collection(company_id)
+        if self.tenancy.per_company:
+            # 新公司的集合可能还不存在
+            self.prepare_collection(collection_name, company_id=company_id)
+        tier_collections = self.tenancy.tiers.collections(collection_name)
+        shard_keys = {name: self.prepare_shard_key(name, company_id) for name in tier_collections}
+        intent_store = self.tenancy.intent_store_for(company_id)
+        if not intent_store.ensure_collection():
+            raise Exception(f"意图集合 {intent_store.collection_name} 创建失败")
+        
+        intents_filter = Filter(must=[
+            FieldCondition(key="metadata.intentId", match=MatchAny(any=[intent['id'] for intent in intents]))
+        ])
+        existing_metadata = {name: self.get_existing_metadata(name, intents_filter) for name in tier_collections}
+        existing_hashes = {name: self.content_hashes(metadata) for name, metadata in existing_metadata.items()}
+        centroids_enabled = self.tenancy.centroids.enabled
+        centroid_hashes = self.tenancy.centroids.existing_hashes(collection_name, intents_filter) if centroids_enabled else {}
+        centroid_plan = {"ready": [], "backfill": {}}
+        
+        all_points = []
+        intent_records = []
+        payload_updates = {name: [] for name in tier_collections}
+        synced_ids = []
+        failed_ids = set()
+        point_owners = {}
+        expected_ids = {name: [] for name in tier_collections}
+        for intent in intents:
+            try:
+                target = self.tier_collection(collection_name, intent)
+                answers = answers_map.get(intent['id'], [])
+                record_hash = self.compute_record_hash(intent, answers)
+                failed_point_ids = []
+                points = self.process_intent(intent, answers, existing_hashes[target], failed_point_ids, record_hash)
+                all_points.extend(points)
+                synced_ids.append(intent['id'])
+                if failed_point_ids:
+                    failed_ids.add(intent['id'])
+                    result["errors"].append(f"意图 {intent['id']}: {len(failed_point_ids)} 个问题编码失败")
+                
+                keywords = intent.get('keywords') or []
+                point_ids = [self.make_point_id(intent['company_id'], intent['id'], i) for i in range(len(keywords))]
+                expected_ids[target].extend(point_ids)
+                point_owners.update((point_id, intent['id']) for point_id in point_ids)
+                if keywords and self.intent_record_changed(record_hash, point_ids, points, existing_metadata[target]):
+                    intent_records.append((intent, answers, record_hash))
+                payload_updates[target].extend(
+                    self.payload_updates(intent, answers, record_hash, point_ids, points, existing_metadata[target])
+                )
+                if centroids_enabled and keywords and not failed_point_ids:
+                    self.plan_centroid(intent, target, point_ids, points, existing_hashes[target],
+                                       centroid_hashes, centroid_plan)
+                result["skipped_vectors"] += len(keywords) - len(points) - len(failed_point_ids)
+            except Exception as e:
+                failed_ids.add(intent['id'])
+                result["errors"].append(f"意图 {intent['id']} 处理失败: {str(e)}")
+        
+        # 先写意图记录，搜索命中新问题点时一定能取到答案
+        if not intent_store.upsert_intents(LazyPointList(intent_records, self.build_intent_point)):
+            raise Exception("意图记录写入失败")
+        
+        if all_points:
+            for tier_name, tier_points in self.group_by_tier(collection_name, all_points).items():
+                upsert_result = self.qdrant.upsert_points(tier_name, LazyPointList(tier_points, self.build_point),
+                                                          shard_key=shard_keys[tier_name])
+                if upsert_result.error:
+                    raise Exception(f"向量插入失败: {upsert_result.error}")
+                if upsert_result.failed_points:
+                    result["errors"].append(f"{tier_name}: {upsert_result.failed_points} 个向量点写入失败")
+                    failed_ids.update(point_owners[str(point_id)] for point_id in upsert_result.failed_ids)
+        
+        failed_payload_ids = []
+        result["updated_payload_vectors"] += self.apply_payload_updates(payload_updates, shard_keys, result["errors"],
+                                                                        failed_payload_ids)
+        failed_ids.update(point_owners[point_id] for point_id in failed_payload_ids)
+        
+        if centroids_enabled and not self.write_centroids(collection_name, centroid_plan, failed_ids):
+            result["errors"].append(f"意图质心写入失败: {collection_name}")
+        
+        # 先写新点再删过期点，避免意图在同步期间不可搜索（换层的意图在这里删除旧层中的点）
+        for name in tier_collections:
+            if not self.qdrant.delete_points_by_intent_ids(name, synced_ids, keep_ids=expected_ids[name]):
+                result["errors"].append(f"清理旧向量点失败: {name}")
+                failed_ids.update(synced_ids)
+        
+        # 标准问题被清空的意图不再有问题点，意图记录和质心一并删除
+        emptied_ids = [intent['id'] for intent in intents if not intent.get('keywords')]
+        if intent_store.delete_intents(emptied_ids) < len(emptied_ids):
+            failed_ids.update(emptied_ids)
+        if centroids_enabled and self.tenancy.centroids.delete_centroids(collection_name, emptied_ids) < len(emptied_ids):
+            failed_ids.update(emptied_ids)
+        
+        result["failed_intent_ids"].extend(failed_ids)
+        result["total_vectors"] += len(all_points)
+        return synced_ids
+    
+    def migrate_all_companies(self, bulk: bool = False, extract_workers: int = 0,
+                              refresh_companies: bool = False, bulk_load: bool = False) -> List[Dict[str, Any]]:
+        """
+        迁移所有公司的数据
+        
+        Args:
+            bulk: 使用 COPY 流式导出
+            extract_workers: 大于 0 时在同一快照上用多个连接并行导出各公司数据（导出后落盘并释放快照，再逐个处理）
+            refresh_companies: 强制重新统计公司注册表中的计数
+            bulk_load: 全部公司写入期间暂停 HNSW 索引构建，最后统一恢复并等待集合变为 green
+        """
         print("🌐 开始迁移所有公司的知识库数据...")
         
-        # 获取所有公司
-        companies = self.db.get_all_companies()
+        # 获取所有公司（按问题数从大到小调度）
+        companies = self.company_registry.refresh(full=refresh_companies)
         print(f"📊 找到 {len(companies)} 个公司")
         
         if not companies:
@@ -350,28 +1071,48 @@ class KnowledgeBaseMigrator:
             return []
         
         # 显示公司列表
-        print("\n📋 公司列表:")
-        for i, company in enumerate(companies, 1):
-            print(f"   {i}. {company['name']} ({company['id']})")
+        self.print_company_schedule(companies)
         
         # 迁移每个公司
         results = []
-        for i, company in enumerate(companies, 1):
-            print(f"\n{'🔸' * 20} {i}/{len(companies)} {'🔸' * 20}")
-            print(f"正在处理: {company['name']} ({company['id']})")
-            
-            result = self.migrate_company(company['id'])
-            results.append(result)
-            
-            # 显示进度摘要
-            if result['success']:
-                print(f"✅ 完成: {result['success_count']} 个意图, {result['total_vectors']} 个向量")
-            else:
-                print(f"⚠️ 部分完成: {result['success_count']}/{result['total_intents']} 个意图")
-            
-            # 短暂休息，避免过载
-            if i < len(companies):
-                time.sleep(1)
+        # 共用集合统一暂停/恢复索引构建；每个公司一个集合时由 migrate_company 逐个处理
+        company_bulk_load = bulk_load and self.tenancy.per_company
+        bulk_load_started = bulk_load and not self.tenancy.per_company and self.start_bulk_load(self.collection_name)
+        if extract_workers > 0 and not bulk:
+            # 所有公司在同一快照上并行导出并落盘（看到的是同一时间点的数据），导出完成即释放快照，
+            # 向量化和写入期间不再持有快照事务，避免整个迁移期间阻止 VACUUM
+            company_names = {company['id']: company['name'] for company in companies}
+            with tempfile.TemporaryDirectory(prefix='extract_', dir=get_cache_dir()) as spill_dir:
+                with SnapshotParallelExtractor(self.db, extract_workers) as extractor:
+                    spilled = extractor.spill_companies(list(company_names), spill_dir)
+                
+                for i, (company_id, path) in enumerate(spilled, 1):
+                    print(f"\n{'🔸' * 20} {i}/{len(companies)} {'🔸' * 20}")
+                    print(f"正在处理: {company_names[company_id]} ({company_id})")
+                    
+                    result = self.migrate_company(company_id, prefetched=SnapshotParallelExtractor.load_spilled(path),
+                                                  bulk_load=company_bulk_load)
+                    results.append(result)
+                    self._print_company_progress(result)
+                    os.remove(path)
+        else:
+            for i, company in enumerate(companies, 1):
+                print(f"\n{'🔸' * 20} {i}/{len(companies)} {'🔸' * 20}")
+                print(f"正在处理: {company['name']} ({company['id']})")
+                
+                result = self.migrate_company(company['id'], bulk=bulk, bulk_load=company_bulk_load)
+                results.append(result)
+                self._print_company_progress(result)
+                
+                # 短暂休息，避免过载
+                if i < len(companies):
+                    time.sleep(1)
+        
+        if bulk_load_started and not self.finish_bulk_load(self.collection_name):
+            # 索引未就绪时搜索性能无法保证，不报告成功
+            for result in results:
+                result["success"] = False
+                result["errors"].append("恢复索引配置后集合未能变为 green")
         
         # 保存迁移报告
         self.save_migration_report(results)
@@ -379,8 +1120,152 @@ class KnowledgeBaseMigrator:
         # 显示总体统计
         self.print_migration_summary(results)
         
+        # 刷新统计快照，之后 --stats 直接读取
+        self.refresh_stats_snapshot()
+        
         return results
     
+    def rebuild_collection(self, bulk: bool = False, extract_workers: int = 0, bulk_load: bool = False,
+                           keep_versions: int = 1) -> Dict[str, Any]:
+        """
+        零停机重建：全部数据写入新的版本集合，校验通过后原子切换别名，再清理旧版本
+        
+        重建期间读取方（以及实时同步）仍然访问别名指向的旧版本；校验失败时别名保持不变，
+        新版本保留供排查，下次清理时删除。迁移开始后修改的意图只写入了旧版本，
+        切换前把它们同步到新版本，切换后再追平一次切换前最后一轮之后的修改（见 catch_up_changes）。
+        
+        Args:
+            bulk: 使用 COPY 流式导出
+            extract_workers: 大于 0 时在同一快照上并行导出
+            bulk_load: 写入期间暂停 HNSW 索引构建
+            keep_versions: 切换后额外保留的旧版本数（用于回滚）
+        
+        Returns:
+            重建结果（version、activated、caught_up、deleted_versions、results）
+        """
+        alias_name = self.collection_name
+        versions = CollectionVersionManager(self.qdrant, alias_name)
+        summary = {"version": None, "activated": False, "deleted_versions": [], "results": [], "caught_up": False}
+        
+        if self.tenancy.per_company:
+            print("❌ 每个公司一个集合时不支持 --rebuild，请使用共用集合（QDRANT_TENANCY=shared）")
+            return summary
+        if self.tenancy.tiers.enabled:
+            # 冷数据集合没有版本和别名，重建期间无法与热数据集合一起切换
+            print("❌ 热度分层时不支持 --rebuild，请先关闭 QDRANT_POPULARITY_TIERS")
+            return summary
+        if self.tenancy.centroids.enabled:
+            # 质心集合随嵌入模型变化，但没有版本和别名，重建期间无法与问题集合一起切换
+            print("❌ 维护意图质心时不支持 --rebuild，请先关闭 QDRANT_INTENT_CENTROIDS，切换后删除旧的质心集合再重新同步")
+            return summary
+        
+        # 迁移期间实时同步仍写入旧版本，记录开始时间，切换前后把此后的修改追平到新版本
+        started_at = None
+        if not self.offline:
+            started_at = self.db.get_database_time()
+            if started_at is None:
+                print("❌ 无法记录重建开始时间，已取消重建")
+                return summary
+        
+        print(f"🏗️ 重建集合 {alias_name}（当前版本: {versions.current_version() or alias_name}）")
+        version = versions.create_version(self.embedding_service.dimensions, bulk_load=bulk_load,
+                                          custom_sharding=self.tenancy.shard_keys,
+                                          profile=select_storage_profile(self.expected_points()))
+        if version is None:
+            print("❌ 创建新版本集合失败")
+            return summary
+        summary["version"] = version
+        
+        # 迁移期间写入新版本，结束后恢复为别名
+        self.collection_name = version
+        try:
+            results = self.migrate_all_companies(bulk=bulk, extract_workers=extract_workers, bulk_load=bulk_load)
+        finally:
+            self.collection_name = alias_name
+        summary["results"] = results
+        
+        if not results or not all(result['success'] for result in results):
+            print(f"❌ 部分公司迁移失败，别名保持不变，新版本 {version} 保留供排查")
+            return summary
+        
+        expected_count = sum(result['total_vectors'] for result in results)
+        if not versions.verify(version, expected_count):
+            print(f"❌ 新版本未通过校验，别名保持不变，新版本 {version} 保留供排查")
+            return summary
+        
+        if started_at is not None:
+            caught_up_at = self.catch_up_changes(version, started_at)
+            if caught_up_at is None:
+                print(f"❌ 迁移期间的修改未能同步到新版本，别名保持不变，新版本 {version} 保留供排查")
+                return summary
+        else:
+            print("⚠️ 从离线快照重建，快照之后的修改需要在切换后重新同步")
+        
+        if not versions.activate(version):
+            return summary
+        summary["activated"] = True
+        
+        # 上一轮追平到切换之间，实时同步处理的修改只写入了旧版本，切换后再追平一次
+        if started_at is not None:
+            summary["caught_up"] = self.catch_up_changes(alias_name, caught_up_at) is not None
+            if not summary["caught_up"]:
+                print("⚠️ 切换后追平失败，请运行 python main.py --all 重新同步（内容未变的点会跳过）")
+        
+        summary["deleted_versions"] = versions.garbage_collect(keep=keep_versions)
+        print(f"🎉 重建完成，{alias_name} 已指向 {version}")
+        return summary
+    
+    def catch_up_changes(self, collection_name: str, since: datetime) -> Optional[datetime]:
+        """
+        把 since 之后有变更的意图同步到 collection_name（重建的新版本集合，或切换后的别名）
+        
+        Returns:
+            本轮开始查询的数据库时间（下一轮追平的起点），查询或同步失败时返回 None
+        """
+        round_started_at = self.db.get_database_time()
+        changed_ids = self.db.get_changed_intent_ids(since - CATCH_UP_CLOCK_SKEW)
+        if round_started_at is None or changed_ids is None:
+            return None
+        
+        if not changed_ids:
+            print(f"✅ {since:%Y-%m-%d %H:%M:%S} 之后没有新的修改")
+            return round_started_at
+        
+        print(f"🔁 同步 {since:%Y-%m-%d %H:%M:%S} 之后修改的 {len(changed_ids)} 个意图到 {collection_name}...")
+        original_collection = self.collection_name
+        self.collection_name = collection_name
+        try:
+            result = self.sync_intents(changed_ids)
+        finally:
+            self.collection_name = original_collection
+        
+        if result["failed_intent_ids"]:
+            print(f"❌ {len(result['failed_intent_ids'])} 个意图同步失败: {'; '.join(result['errors'][:3])}")
+            return None
+        
+        print(f"✅ 已追平: 更新 {result['upserted_intents']} 个意图，删除 {result['removed_intents']} 个意图的向量点")
+        return round_started_at
+    
+    def print_company_schedule(self, companies: List[Dict[str, Any]]):
+        """显示公司调度顺序和预计耗时"""
+        print("\n📋 公司列表（按问题数从大到小）:")
+        for i, company in enumerate(companies, 1):
+            estimate = company.get('estimated_seconds')
+            estimate_text = f", 预计 {estimate:.0f} 秒" if estimate is not None else ""
+            print(f"   {i}. {company['name']} ({company['id']}) - "
+                  f"{company['intent_count']} 个意图, {company['question_count']} 个问题{estimate_text}")
+        
+        total_estimate = self.company_registry.estimate_total_seconds()
+        if total_estimate is not None:
+            print(f"⏱️ 预计总耗时: {total_estimate / 60:.1f} 分钟")
+    
+    def _print_company_progress(self, result: Dict[str, Any]):
+        """显示单个公司的进度摘要"""
+        if result['success']:
+            print(f"✅ 完成: {result['success_count']} 个意图, {result['total_vectors']} 个向量")
+        else:
+            print(f"⚠️ 部分完成: {result['success_count']}/{result['total_intents']} 个意图")
+    
     def save_migration_report(self, results: List[Dict[str, Any]]) -> str:
         """保存迁移报告"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -403,7 +1288,7 @@ class KnowledgeBaseMigrator:
             
             print(f"\n📄 迁移报告已保存: {filename}")
             return filename
-            
+        
         except Exception as e:
             print(f"❌ 保存报告失败: {e}")
             return ""
@@ -439,12 +1324,26 @@ class KnowledgeBaseMigrator:
         
         print(f"\n✨ 迁移完成!")
     
-    def get_database_stats(self) -> Dict[str, Any]:
-        """获取数据库统计信息"""
+    def get_database_stats(self, exact: bool = True) -> Dict[str, Any]:
+        """获取数据库统计信息（exact=False 时使用 pg_stats 估算）"""
         print("📊 获取数据库统计信息...")
-        return self.db.get_database_stats()
+        return self.db.get_database_stats(exact=exact)
     
     def get_qdrant_stats(self) -> Dict[str, Any]:
         """获取Qdrant统计信息"""
         print("📊 获取Qdrant统计信息...")
         return self.qdrant.get_system_info()
+    
+    def refresh_stats_snapshot(self) -> Optional[Dict[str, Any]]:
+        """刷新本地统计快照（数据库使用估算值，不做全表扫描）"""
+        if self.offline:
+            # 离线数据源的统计不代表线上数据库
+            return None
+        
+        try:
+            snapshot = refresh_stats_snapshot(self.db, self.qdrant)
+            print("📸 统计快照已更新")
+            return snapshot
+        except Exception as e:
+            print(f"⚠️ 更新统计快照失败: {e}")
+            return None
@@ -0,0 +1,225 @@
+"""
+基于导出快照的一致性并行导出
+协调连接调用 pg_export_snapshot()，各工作连接通过 SET TRANSACTION SNAPSHOT
+挂到同一快照上，多连接并行读取但看到的是同一个时间点的数据
+"""
+
+import os
+import pickle
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional, Iterator, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from .database import PostgreSQLConnection
+from .records import IntentRecord, AnswerRecord
+
+
+class SnapshotParallelExtractor:
+    """快照一致的并行导出器"""
+    
+    def __init__(self, db: PostgreSQLConnection, workers: int = 4):
+        """
+        初始化并行导出器
+        
+        Args:
+            db: 数据库连接管理器
+            workers: 工作连接数量
+        """
+        self.db = db
+        self.workers = max(workers, 1)
+        self.snapshot_id: Optional[str] = None
+        self._opened_at: Optional[float] = None
+        self._coordinator = None
+        self._connections = queue.Queue()
+        self._all_connections = []
+    
+    def __enter__(self) -> "SnapshotParallelExtractor":
+        self.open()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def open(self):
+        """
+        打开协调连接并导出快照，再建立挂载到该快照的工作连接
+        
+        协调事务在 close() 之前保持打开，快照才会一直有效；
+        导出期间该事务会阻止 VACUUM 回收更新的行版本，用完应尽快关闭
+        （需要边导出边做慢处理时先用 spill_companies 落盘）。
+        """
+        self._opened_at = time.time()
+        self._coordinator = self.db.get_connection()
+        self._coordinator.set_session(
+            isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+            readonly=True
+        )
+        with self._coordinator.cursor() as cur:
+            cur.execute("SELECT pg_export_snapshot()")
+            self.snapshot_id = cur.fetchone()[0]
+        
+        print(f"📸 已导出快照: {self.snapshot_id}，建立 {self.workers} 个工作连接...")
+        
+        for _ in range(self.workers):
+            conn = self.db.get_connection()
+            conn.set_session(
+                isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+                readonly=True
+            )
+            with conn.cursor() as cur:
+                # 必须是事务中的第一条语句
+                cur.execute("SET TRANSACTION SNAPSHOT %s", (self.snapshot_id,))
+            self._all_connections.append(conn)
+            self._connections.put(conn)
+    
+    def close(self):
+        """结束所有事务并关闭连接"""
+        for conn in self._all_connections:
+            try:
+                conn.rollback()
+                conn.close()
+            except psycopg2.Error:
+                pass
+        self._all_connections = []
+        self._connections = queue.Queue()
+        
+        if self._coordinator is not None:
+            try:
+                self._coordinator.rollback()
+                self._coordinator.close()
+            except psycopg2.Error:
+                pass
+            self._coordinator = None
+            self.snapshot_id = None
+            print(f"📸 快照已释放（持有 {time.time() - self._opened_at:.1f} 秒）")
+    
+    def _run_on_worker(self, func, *args):
+        """借用一个工作连接执行 func(cur, *args)"""
+        conn = self._connections.get()
+        try:
+            with conn.cursor() as cur:
+                return func(cur, *args)
+        finally:
+            self._connections.put(conn)
+    
+    def _extract_company(self, cur, company_id: str) -> Tuple[str, List[IntentRecord], Dict[str, List[AnswerRecord]]]:
+        """在工作连接上导出一个公司的意图和答案"""
+        intents = self.db.fetch_company_intents(cur, company_id)
+        answers_map = self.db.fetch_answers_by_intent_ids(cur, [intent['id'] for intent in intents])
+        return company_id, intents, answers_map
+    
+    def _extract_range(self, cur, company_id: str,
+                       id_range: Tuple[Optional[str], Optional[str]]) -> Tuple[List[IntentRecord], Dict[str, List[AnswerRecord]]]:
+        """在工作连接上导出一个意图ID区间"""
+        intents = self.db.fetch_company_intents(cur, company_id, id_range)
+        answers_map = self.db.fetch_answers_by_intent_ids(cur, [intent['id'] for intent in intents])
+        return intents, answers_map
+    
+    def extract_companies(self, company_ids: List[str]) -> Iterator[Tuple[str, List[IntentRecord], Dict[str, List[AnswerRecord]]]]:
+        """
+        按公司划分任务并行导出
+        
+        结果按完成顺序产出；同时在途的任务数不超过工作连接数，
+        调用方处理较慢时不会把所有公司的数据都堆在内存里。
+        
+        Args:
+            company_ids: 公司ID列表
+        
+        Yields:
+            (公司ID, 意图列表, 答案字典)
+        """
+        if self.snapshot_id is None:
+            raise RuntimeError("并行导出器尚未打开，请先调用 open() 或使用 with 语句")
+        
+        pending_ids = list(company_ids)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pg-snapshot") as executor:
+            in_flight = set()
+            while pending_ids or in_flight:
+                while pending_ids and len(in_flight) < self.workers:
+                    in_flight.add(executor.submit(self._run_on_worker, self._extract_company, pending_ids.pop(0)))
+                
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+    
+    def spill_companies(self, company_ids: List[str], spill_dir: str) -> List[Tuple[str, str]]:
+        """
+        并行导出全部公司，每个公司写入 spill_dir 下的一个文件
+        
+        导出完成后调用方即可关闭快照，之后较慢的向量化和写入不再占用快照事务
+        （快照事务持有旧的 xmin，全量迁移期间一直打开会阻止 VACUUM，导致知识库表膨胀）。
+        
+        Args:
+            company_ids: 公司ID列表
+            spill_dir: 落盘目录（由调用方负责清理）
+        
+        Returns:
+            [(公司ID, 文件路径)]，按导出完成顺序，用 load_spilled 读取
+        """
+        spilled = []
+        for company_id, intents, answers_map in self.extract_companies(company_ids):
+            path = os.path.join(spill_dir, f"{len(spilled):06d}.pkl")
+            with open(path, 'wb') as f:
+                pickle.dump((intents, answers_map), f, protocol=pickle.HIGHEST_PROTOCOL)
+            spilled.append((company_id, path))
+        return spilled
+    
+    @staticmethod
+    def load_spilled(path: str) -> Tuple[List[IntentRecord], Dict[str, List[AnswerRecord]]]:
+        """读取 spill_companies 写入的一个公司 (意图列表, 答案字典)"""
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    
+    def get_intent_id_boundaries(self, company_id: str, parts: int) -> List[str]:
+        """在快照内计算把公司意图按ID均分为 parts 段的分界点"""
+        if parts <= 1:
+            return []
+        
+        fractions = [i / parts for i in range(1, parts)]
+        
+        def query(cur):
+            cur.execute(f"""
+                SELECT percentile_disc(%s::float8[]) WITHIN GROUP (ORDER BY ki.id) AS boundaries
+                FROM "{self.db.schema}".knowledge_base_intents ki
+                WHERE ki.company_id = %s AND ki.is_deleted = 0 AND ki."isActive" = true
+            """, (fractions, company_id))
+            return cur.fetchone()[0] or []
+        
+        boundaries = self._run_on_worker(query)
+        # 分位点已按数据库排序规则递增，只需去重；数据很少时多个分位点可能落在同一个ID上
+        return list(dict.fromkeys(b for b in boundaries if b is not None))
+    
+    def extract_company_by_ranges(self, company_id: str) -> Tuple[List[IntentRecord], Dict[str, List[AnswerRecord]]]:
+        """
+        把单个大公司按意图ID区间拆分，多个工作连接并行导出
+        
+        Args:
+            company_id: 公司ID
+        
+        Returns:
+            (意图列表, 答案字典)，意图顺序与 get_company_intents 一致
+        """
+        if self.snapshot_id is None:
+            raise RuntimeError("并行导出器尚未打开，请先调用 open() 或使用 with 语句")
+        
+        boundaries = self.get_intent_id_boundaries(company_id, self.workers)
+        edges = [None] + boundaries + [None]
+        ranges = list(zip(edges[:-1], edges[1:]))
+        print(f"🔀 公司 {company_id} 拆分为 {len(ranges)} 个意图ID区间并行导出")
+        
+        intents = []
+        answers_map = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pg-snapshot") as executor:
+            futures = [executor.submit(self._run_on_worker, self._extract_range, company_id, id_range)
+                       for id_range in ranges]
+            for future in futures:
+                range_intents, range_answers = future.result()
+                intents.extend(range_intents)
+                answers_map.update(range_answers)
+        
+        intents.sort(key=lambda intent: intent['created_at'])
+        return intents, answers_map
@@ -5,35 +5,202 @@ Qdrant向量数据库管理模块
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
     Distance, VectorParams, CreateCollection, PointStruct,
-    Filter, FieldCondition, MatchValue, PayloadSchemaType
+    Filter, FieldCondition, MatchValue, MatchAny, HasIdCondition,
+    FilterSelector, PayloadSchemaType, PointIdsList,
+    HnswConfigDiff, OptimizersConfigDiff, CollectionStatus,
+    VectorParamsDiff, CollectionParamsDiff, QuantizationConfig,
+    KeywordIndexParams, KeywordIndexType, SearchParams, SearchRequest, ShardingMethod,
+    PayloadSelectorInclude, PayloadSelectorExclude, SetPayload, SetPayloadOperation,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
 )
-from qdrant_client.http.exceptions import ResponseHandlingException
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+import grpc
+import httpx
+import json
 import os
-from typing import List, Dict, Any, Optional
+import random
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Sequence, Iterator, Tuple
 import time
 
+from .recall_monitor import RecallMonitor
+from .storage_profiles import StorageProfile, select_storage_profile, host_cpu_count
+
+
+# 默认写入的向量集合（读取方访问的别名）
+DEFAULT_COLLECTION_NAME = "wechat_diplomat"
+
+# 单个 float 在请求体中的大致字节数：REST 按十进制文本编码，gRPC 按 float32 二进制编码
+VECTOR_FLOAT_JSON_BYTES = 20
+VECTOR_FLOAT_GRPC_BYTES = 4
+
+# 生产环境的 HNSW 配置（Qdrant 默认值），批量导入结束后恢复
+PRODUCTION_HNSW_M = 16
+PRODUCTION_EF_CONSTRUCT = 100
+
+# 分组搜索默认的分组字段：每个意图只返回一组
+INTENT_GROUP_FIELD = "metadata.intentId"
+
+# search_batch 单次请求合并的查询数
+DEFAULT_SEARCH_BATCH_SIZE = 64
+
+# Qdrant 默认的索引阈值（KB）：段内向量超过该大小才构建 HNSW，设为 0 即暂停索引构建
+DEFAULT_INDEXING_THRESHOLD = 20000
+
+# 超时以外值得重试的 HTTP 状态码（限流和服务端错误）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 对应的 gRPC 状态码
+RETRYABLE_GRPC_CODES = {
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.ABORTED
+}
+
+# 请求体过大或网关超时：拆小批次比原样重试更可能成功
+SPLIT_STATUS_CODES = {413, 504}
+
+
+def estimate_point_bytes(point: PointStruct, float_bytes: int = VECTOR_FLOAT_JSON_BYTES) -> int:
+    """估算向量点序列化后的请求体大小（字节）"""
+    vector = point.vector
+    if isinstance(vector, dict):
+        floats = sum(len(values) for values in vector.values())
+    else:
+        floats = len(vector) if vector is not None else 0
+    
+    payload = json.dumps(point.payload or {}, ensure_ascii=False, default=str)
+    return floats * float_bytes + len(payload.encode('utf-8'))
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """超时、连接错误、限流和服务端错误可以退避重试，其余（如参数错误）重试也不会成功"""
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, grpc.RpcError):
+        return error.code() in RETRYABLE_GRPC_CODES
+    return isinstance(error, (ResponseHandlingException, TimeoutError, ConnectionError))
+
+
+def is_split_error(error: Exception) -> bool:
+    """请求体过大或写入超时，批次应拆小后再写"""
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code in SPLIT_STATUS_CODES
+    if isinstance(error, grpc.RpcError):
+        if error.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+            return True
+        # 限流同样返回 RESOURCE_EXHAUSTED，只有消息超限才拆分
+        return error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED and 'larger than max' in (error.details() or '')
+    if isinstance(error, ResponseHandlingException):
+        error = error.source
+    return isinstance(error, (TimeoutError, httpx.TimeoutException))
+
+
+@dataclass
+class BatchOutcome:
+    """单个写入批次的结果"""
+    
+    index: int
+    points: int
+    bytes: int
+    attempts: int = 0
+    splits: int = 0
+    upserted: int = 0
+    failed_ids: List[Any] = field(default_factory=list)
+    error: Optional[str] = None
+    
+    @property
+    def status(self) -> str:
+        if not self.failed_ids:
+            return "ok"
+        return "partial" if self.upserted else "failed"
+
+
+@dataclass
+class UpsertResult:
+    """
+    一次 upsert_points 的结果
+    
+    布尔值表示是否全部写入成功，兼容原来返回 bool 的调用方式。
+    """
+    
+    total_points: int = 0
+    batches: List[BatchOutcome] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+    error: Optional[str] = None
+    
+    @property
+    def upserted_points(self) -> int:
+        return sum(batch.upserted for batch in self.batches)
+    
+    @property
+    def failed_ids(self) -> List[Any]:
+        return [point_id for batch in self.batches for point_id in batch.failed_ids]
+    
+    @property
+    def failed_points(self) -> int:
+        return sum(len(batch.failed_ids) for batch in self.batches)
+    
+    @property
+    def points_per_second(self) -> float:
+        return self.upserted_points / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+    
+    def __bool__(self) -> bool:
+        return self.error is None and self.upserted_points == self.total_points
+
 
 class QdrantManager:
     """Qdrant向量数据库管理器"""
     
-    def __init__(self):
-        """初始化Qdrant客户端"""
+    def __init__(self, prefer_grpc: Optional[bool] = None, grpc_port: Optional[int] = None):
+        """
+        初始化Qdrant客户端
+        
+        Args:
+            prefer_grpc: 优先使用 gRPC 传输（向量按二进制编码，省去 JSON 编解码），
+                默认读取 QDRANT_PREFER_GRPC，未设置为 False
+            grpc_port: gRPC 端口，默认读取 QDRANT_GRPC_PORT，未设置为 6334
+        """
         self.qdrant_url = os.getenv('QDRANT_URL', 'http://localhost:6333')
         self.qdrant_api_key = os.getenv('QDRANT_API_KEY')
+        if prefer_grpc is None:
+            prefer_grpc = os.getenv('QDRANT_PREFER_GRPC', 'false').lower() in ('1', 'true', 'yes')
+        self.prefer_grpc = prefer_grpc
+        self.grpc_port = grpc_port if grpc_port is not None else int(os.getenv('QDRANT_GRPC_PORT', '6334'))
+        # 写入时同时在途的批次数
+        self.upsert_parallel = int(os.getenv('QDRANT_UPSERT_PARALLEL', '4'))
+        # 单个写入请求的字节预算，以及失败时的重试次数和退避基数（秒）
+        self.upsert_max_bytes = int(os.getenv('QDRANT_UPSERT_MAX_BYTES', str(4 * 1024 * 1024)))
+        self.upsert_max_retries = int(os.getenv('QDRANT_UPSERT_MAX_RETRIES', '3'))
+        self.upsert_backoff_seconds = float(os.getenv('QDRANT_UPSERT_BACKOFF_SECONDS', '0.5'))
+        # 搜索时的 HNSW ef（候选列表大小），未设置时使用集合配置（见 tune_hnsw.py 的推荐值）
+        search_ef = os.getenv('QDRANT_HNSW_EF')
+        self.search_ef = int(search_ef) if search_ef else None
         
-        print(f"🔗 连接到Qdrant: {self.qdrant_url}")
+        if self.prefer_grpc:
+            print(f"🔗 连接到Qdrant: {self.qdrant_url} (gRPC 端口 {self.grpc_port})")
+        else:
+            print(f"🔗 连接到Qdrant: {self.qdrant_url}")
         
         try:
             self.client = QdrantClient(
                 url=self.qdrant_url,
                 api_key=self.qdrant_api_key,
-                timeout=30
+                timeout=30,
+                prefer_grpc=self.prefer_grpc,
+                grpc_port=self.grpc_port
             )
             
             # 测试连接
             collections = self.client.get_collections()
             print(f"✅ Qdrant连接成功！当前有 {len(collections.collections)} 个集合")
             
+            # 抽样影子精确搜索，监控线上召回率（QDRANT_RECALL_SAMPLE_RATE 未设置时关闭）
+            self.recall_monitor = RecallMonitor(self.client)
+        
         except Exception as e:
             print(f"❌ Qdrant连接失败: {e}")
             print("💡 请检查：")
@@ -51,8 +218,21 @@ class QdrantManager:
             print(f"❌ Qdrant连接测试失败: {e}")
             return False
     
-    def create_collection(self, collection_name: str, vector_size: int) -> bool:
-        """创建向量集合"""
+    def create_collection(self, collection_name: str, vector_size: int, bulk_load: bool = False,
+                          custom_sharding: bool = False, profile: Optional[StorageProfile] = None,
+                          quantization_config: Optional[QuantizationConfig] = None) -> bool:
+        """
+        创建向量集合
+        
+        Args:
+            collection_name: 集合名称
+            vector_size: 向量维度
+            bulk_load: 批量导入模式，创建时不构建 HNSW（m=0, indexing_threshold=0），
+                导入完成后由 end_bulk_load 恢复生产配置
+            custom_sharding: 使用自定义分片键（按公司分片），写入前需为每个公司 ensure_shard_key
+            profile: 存储配置（向量/载荷是否放磁盘、分段数和大小），默认按 QDRANT_STORAGE_PROFILE 选择
+            quantization_config: 向量量化配置（如冷数据集合的 int8 标量量化），默认不量化
+        """
         try:
             # 检查集合是否已存在
             collections = self.client.get_collections().collections
@@ -65,20 +245,41 @@ class QdrantManager:
             print(f"🏗️ 正在创建集合: {collection_name}")
             print(f"   向量维度: {vector_size}")
             
+            if profile is None:
+                profile = select_storage_profile(0)
+            cpu_count = host_cpu_count()
+            print(f"   存储配置: {profile.summary(cpu_count)}")
+            if quantization_config is not None:
+                print(f"   向量量化: {type(quantization_config).__name__}")
+            
+            # 优化配置
+            optimizers_config = {
+                "default_segment_number": profile.segment_number(cpu_count),
+                "max_segment_size": profile.max_segment_size_kb
+            }
+            hnsw_config = HnswConfigDiff(on_disk=profile.hnsw_on_disk)
+            if bulk_load:
+                print("   批量导入模式: 暂不构建 HNSW 索引")
+                optimizers_config["indexing_threshold"] = 0
+                hnsw_config = HnswConfigDiff(m=0, on_disk=profile.hnsw_on_disk)
+            if custom_sharding:
+                print("   分片方式: 按公司自定义分片键")
+            
             # 创建集合
             self.client.create_collection(
                 collection_name=collection_name,
                 vectors_config=VectorParams(
                     size=vector_size,
-                    distance=Distance.COSINE
+                    distance=Distance.COSINE,
+                    on_disk=profile.on_disk_vectors
                 ),
-                # 优化配置
-                optimizers_config={
-                    "default_segment_number": 2,
-                    "max_segment_size": 50000
-                },
-                # 分片配置（根据数据量调整）
-                shard_number=1,
+                on_disk_payload=profile.on_disk_payload,
+                optimizers_config=optimizers_config,
+                hnsw_config=hnsw_config,
+                quantization_config=quantization_config,
+                # 分片配置（按存储配置；自定义分片时为每个分片键的分片数）
+                shard_number=profile.shard_number,
+                sharding_method=ShardingMethod.CUSTOM if custom_sharding else None,
                 replication_factor=1
             )
             
@@ -87,11 +288,224 @@ class QdrantManager:
             # 创建索引
             success = self.create_indexes(collection_name)
             return success
+        
+        except Exception as e:
+            print(f"❌ 创建集合失败: {collection_name}, 错误: {e}")
+            return False
+    
+    def create_payload_collection(self, collection_name: str, indexes: List[Tuple[str, Any]]) -> bool:
+        """
+        创建只存载荷、不带向量的集合（如意图集合），已存在时跳过
+        
+        Args:
+            collection_name: 集合名称
+            indexes: 需要建立的载荷索引 [(字段名, 索引类型)]
+        """
+        try:
+            if self.client.collection_exists(collection_name):
+                return True
+            
+            print(f"🏗️ 正在创建载荷集合: {collection_name}")
+            self.client.create_collection(collection_name=collection_name, vectors_config={})
+            
+            for field_name, field_schema in indexes:
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema
+                )
             
+            print(f"✅ 集合创建成功: {collection_name}")
+            return True
+        
         except Exception as e:
             print(f"❌ 创建集合失败: {collection_name}, 错误: {e}")
             return False
     
+    def get_index_config(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        """读取集合的索引配置（HNSW 的 m、ef_construct 和索引阈值），失败时返回 None"""
+        try:
+            config = self.client.get_collection(collection_name).config
+            return {
+                "m": config.hnsw_config.m,
+                "ef_construct": config.hnsw_config.ef_construct,
+                "indexing_threshold": config.optimizer_config.indexing_threshold
+            }
+        except Exception as e:
+            print(f"❌ 读取索引配置失败 {collection_name}: {e}")
+            return None
+    
+    def is_indexing_deferred(self, collection_name: str) -> bool:
+        """集合是否处于暂停索引构建的状态（例如上次批量导入中途退出）"""
+        config = self.get_index_config(collection_name)
+        return config is not None and (config['m'] == 0 or config['indexing_threshold'] == 0)
+    
+    def begin_bulk_load(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        """
+        暂停集合的索引构建，写入的点只追加到未索引的段中
+        
+        已建好索引的段保持不变，搜索照常可用（新写入的点走全量扫描）。
+        
+        Returns:
+            导入结束后需要恢复的索引配置；失败时返回 None
+        """
+        config = self.get_index_config(collection_name)
+        if config is None:
+            return None
+        
+        # 新建时 m=0 / 阈值为 0 的集合恢复为生产默认值
+        restore_config = {
+            "m": config['m'] or PRODUCTION_HNSW_M,
+            "ef_construct": config['ef_construct'] or PRODUCTION_EF_CONSTRUCT,
+            "indexing_threshold": config['indexing_threshold'] or DEFAULT_INDEXING_THRESHOLD
+        }
+        
+        try:
+            self.client.update_collection(
+                collection_name=collection_name,
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=0)
+            )
+            print(f"⏸️ 已暂停集合 {collection_name} 的索引构建")
+            return restore_config
+        
+        except Exception as e:
+            print(f"❌ 暂停索引构建失败: {e}")
+            return None
+    
+    def end_bulk_load(self, collection_name: str, index_config: Optional[Dict[str, Any]] = None,
+                      wait: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        恢复索引配置，并等待优化器把集合重新索引到 green
+        
+        Args:
+            collection_name: 集合名称
+            index_config: begin_bulk_load 返回的索引配置，为 None 时使用生产默认值
+            wait: 是否等待集合变为 green
+            timeout: 最长等待时间（秒），默认读取 QDRANT_INDEX_WAIT_TIMEOUT（未设置为 3600）
+        
+        Returns:
+            配置已恢复（wait=True 时还要求集合已变为 green）
+        """
+        if index_config is None:
+            index_config = {
+                "m": PRODUCTION_HNSW_M,
+                "ef_construct": PRODUCTION_EF_CONSTRUCT,
+                "indexing_threshold": DEFAULT_INDEXING_THRESHOLD
+            }
+        
+        try:
+            self.client.update_collection(
+                collection_name=collection_name,
+                hnsw_config=HnswConfigDiff(m=index_config['m'], ef_construct=index_config['ef_construct']),
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=index_config['indexing_threshold'])
+            )
+            print(f"▶️ 已恢复集合 {collection_name} 的索引配置 "
+                  f"(m={index_config['m']}, ef_construct={index_config['ef_construct']}, "
+                  f"indexing_threshold={index_config['indexing_threshold']})")
+        
+        except Exception as e:
+            print(f"❌ 恢复索引配置失败: {e}")
+            return False
+        
+        if not wait:
+            return True
+        return self.wait_for_green(collection_name, timeout)
+    
+    def apply_storage_profile(self, collection_name: str, profile: StorageProfile) -> bool:
+        """
+        把存储配置应用到已有集合
+        
+        向量/载荷的存储位置和分段参数可以在线修改，优化器会在后台逐步重写分段；
+        分片数只能在创建时指定，不一致时需要 --rebuild 才能生效。
+        """
+        try:
+            info = self.client.get_collection(collection_name)
+        except Exception as e:
+            print(f"❌ 获取集合信息失败: {collection_name}, 错误: {e}")
+            return False
+        
+        cpu_count = host_cpu_count()
+        vectors = info.config.params.vectors
+        vector_names = list(vectors.keys()) if isinstance(vectors, dict) else [""]
+        
+        try:
+            self.client.update_collection(
+                collection_name=collection_name,
+                vectors_config={name: VectorParamsDiff(on_disk=profile.on_disk_vectors) for name in vector_names},
+                hnsw_config=HnswConfigDiff(on_disk=profile.hnsw_on_disk),
+                optimizers_config=OptimizersConfigDiff(
+                    default_segment_number=profile.segment_number(cpu_count),
+                    max_segment_size=profile.max_segment_size_kb
+                ),
+                collection_params=CollectionParamsDiff(on_disk_payload=profile.on_disk_payload)
+            )
+            print(f"💾 集合 {collection_name} 已应用存储配置: {profile.summary(cpu_count)}")
+        
+        except Exception as e:
+            print(f"❌ 应用存储配置失败: {collection_name}, 错误: {e}")
+            return False
+        
+        shard_number = info.config.params.shard_number or 1
+        if shard_number != profile.shard_number:
+            print(f"⚠️ 集合 {collection_name} 有 {shard_number} 个分片，分片数无法在线修改，"
+                  f"需 --rebuild 后变为 {profile.shard_number} 个")
+        return True
+    
+    def wait_for_green(self, collection_name: str, timeout: Optional[float] = None,
+                       poll_interval: float = 2.0) -> bool:
+        """
+        等待集合的优化（索引构建）完成，状态变为 green
+        
+        配置更新后优化器不一定立即开始，因此要求连续两次检查都为 green。
+        
+        Args:
+            collection_name: 集合名称
+            timeout: 最长等待时间（秒），默认读取 QDRANT_INDEX_WAIT_TIMEOUT（未设置为 3600）
+            poll_interval: 检查间隔（秒）
+        
+        Returns:
+            是否在超时前变为 green
+        """
+        if timeout is None:
+            timeout = float(os.getenv('QDRANT_INDEX_WAIT_TIMEOUT', '3600'))
+        
+        print(f"⏳ 等待集合 {collection_name} 完成索引构建...")
+        deadline = time.time() + timeout
+        green_checks = 0
+        triggered = False
+        while True:
+            time.sleep(poll_interval)
+            try:
+                info = self.client.get_collection(collection_name)
+            except Exception as e:
+                print(f"❌ 获取集合状态失败: {e}")
+                return False
+            
+            if info.status == CollectionStatus.GREEN:
+                green_checks += 1
+                if green_checks >= 2:
+                    print(f"✅ 集合 {collection_name} 索引构建完成 "
+                          f"(已索引 {info.indexed_vectors_count or 0}/{info.points_count or 0} 个向量)")
+                    return True
+                continue
+            
+            green_checks = 0
+            if info.status == CollectionStatus.RED:
+                print(f"❌ 集合 {collection_name} 优化失败: {info.optimizer_status}")
+                return False
+            
+            if info.status == CollectionStatus.GREY and not triggered:
+                # grey 表示有待执行的优化但尚未触发，发送一次空的配置更新来触发
+                self.client.update_collection(collection_name=collection_name,
+                                              optimizers_config=OptimizersConfigDiff())
+                triggered = True
+            
+            if time.time() > deadline:
+                print(f"⚠️ 等待超时（{timeout:.0f} 秒），集合状态: {info.status}")
+                return False
+            
+            print(f"   索引构建中: 已索引 {info.indexed_vectors_count or 0}/{info.points_count or 0} 个向量")
+    
     def create_indexes(self, collection_name: str) -> bool:
         """为集合创建必要的索引"""
         print(f"📇 正在为集合 {collection_name} 创建索引...")
@@ -104,7 +518,8 @@ class QdrantManager:
             ("metadata.hasActiveAnswers", PayloadSchemaType.BOOL),
             ("metadata.popularityTier", PayloadSchemaType.KEYWORD),
             ("metadata.intentId", PayloadSchemaType.KEYWORD),
-            ("metadata.companyId", PayloadSchemaType.KEYWORD),
+            # 租户字段：同一公司的点在存储上聚集，按公司过滤的搜索只读取该公司的数据
+            ("metadata.companyId", KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)),
         ]
         
         success_count = 0
@@ -117,72 +532,547 @@ class QdrantManager:
                 )
                 success_count += 1
                 print(f"   ✅ 索引创建成功: {field_name}")
-                
+            
             except Exception as e:
                 print(f"   ⚠️  索引创建警告 {field_name}: {e}")
         
         print(f"📇 索引创建完成: {success_count}/{len(indexes)} 个成功")
         return success_count > 0
     
-    def upsert_points(self, collection_name: str, points: List[PointStruct], 
-                     batch_size: int = 100) -> bool:
-        """批量插入向量点"""
+    def ensure_tenant_index(self, collection_name: str) -> bool:
+        """把旧集合上 metadata.companyId 的普通关键字索引升级为租户索引（已是租户索引时不做任何事）"""
+        try:
+            schema = self.client.get_collection(collection_name).payload_schema or {}
+            index = schema.get("metadata.companyId")
+            params = getattr(index, 'params', None) if index is not None else None
+            if params is not None and getattr(params, 'is_tenant', False):
+                return True
+            
+            print(f"📇 为集合 {collection_name} 的 metadata.companyId 创建租户索引...")
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name="metadata.companyId",
+                field_schema=KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)
+            )
+            return True
+        
+        except Exception as e:
+            print(f"⚠️ 创建租户索引失败 {collection_name}: {e}")
+            return False
+    
+    def uses_custom_sharding(self, collection_name: str) -> bool:
+        """集合是否使用自定义分片键"""
+        try:
+            params = self.client.get_collection(collection_name).config.params
+            return params.sharding_method == ShardingMethod.CUSTOM
+        except Exception as e:
+            print(f"❌ 读取分片方式失败 {collection_name}: {e}")
+            return False
+    
+    def is_single_shard(self, collection_name: str) -> bool:
+        """
+        写入是否只落在一个分片上（使用自定义分片时按每个分片键的分片数判断）
+        
+        读取失败时返回 False，按多分片处理。
+        """
+        try:
+            params = self.client.get_collection(collection_name).config.params
+            return (params.shard_number or 1) == 1
+        except Exception as e:
+            print(f"⚠️ 读取分片数失败 {collection_name}: {e}")
+            return False
+    
+    def ensure_shard_key(self, collection_name: str, shard_key: str) -> bool:
+        """创建分片键（已存在时视为成功）"""
+        try:
+            self.client.create_shard_key(collection_name, shard_key)
+            print(f"🧩 已创建分片键: {collection_name}/{shard_key}")
+            return True
+        
+        except Exception as e:
+            if "already exists" in str(e):
+                return True
+            print(f"❌ 创建分片键失败 {collection_name}/{shard_key}: {e}")
+            return False
+    
+    def upsert_points(self, collection_name: str, points: Sequence[PointStruct], 
+                     batch_size: int = 100, parallel: Optional[int] = None,
+                     max_bytes: Optional[int] = None, shard_key: Optional[str] = None) -> UpsertResult:
+        """
+        批量插入向量点（points 可以是按切片惰性构建的序列，如 LazyPointList）
+        
+        批次按点数上限和估算的请求体字节预算共同切分：载荷里带着意图的全部答案和标准问题，
+        大意图的点可能比小意图大几十倍，只按点数切分容易超时。
+        
+        最多 parallel 个批次同时在途：单分片集合中前面的批次使用 wait=False，服务端写入 WAL 即返回；
+        全部确认后再以 wait=True 发送最后一批作为一致性屏障。同一分片按 WAL 顺序应用更新，
+        最后一批完成即表示之前的批次都已生效。多分片集合（如 large 存储配置，或每个分片键
+        对应多个分片）中最后一批只落在其中一个分片上，不能代表其他分片，所有批次都使用 wait=True。
+        
+        失败的批次会拆半重试（超时和 5xx 先指数退避），单个坏点只影响它自己，
+        每个批次的结果记录在返回值中。
+        
+        Args:
+            collection_name: 集合名称
+            points: 向量点序列
+            batch_size: 每批最多点数
+            parallel: 同时在途的批次数，默认读取 QDRANT_UPSERT_PARALLEL（未设置为 4）
+            max_bytes: 每批的字节预算，默认读取 QDRANT_UPSERT_MAX_BYTES（未设置为 4MB）
+            shard_key: 写入的分片键（集合使用自定义分片时必须指定）
+        
+        Returns:
+            写入结果（布尔值表示是否全部成功）
+        """
+        result = UpsertResult(total_points=len(points))
         if not points:
             print("⚠️ 没有向量点需要插入")
-            return True
+            return result
+        
+        if parallel is None:
+            parallel = self.upsert_parallel
+        parallel = max(1, parallel)
+        if max_bytes is None:
+            max_bytes = self.upsert_max_bytes
         
+        start_time = time.time()
         try:
-            print(f"📤 正在插入 {len(points)} 个向量点到集合 {collection_name}")
+            # 多分片时没有单一的 WAL 顺序，每个批次都要等待写入完成
+            wait_each = not self.is_single_shard(collection_name)
+            print(f"📤 正在插入 {len(points)} 个向量点到集合 {collection_name} "
+                  f"(每批最多 {batch_size} 个点 / {max_bytes / 1024 / 1024:.1f}MB, 并发 {parallel}"
+                  f"{', 多分片逐批等待' if wait_each else ''})")
             
-            # 分批处理
-            total_batches = (len(points) + batch_size - 1) // batch_size
+            batches = self._iter_batches(points, batch_size, max_bytes, result)
+            previous = next(batches, None)
             
-            for i in range(0, len(points), batch_size):
-                batch = points[i:i + batch_size]
-                batch_num = i // batch_size + 1
-                
-                print(f"   📦 处理批次 {batch_num}/{total_batches} ({len(batch)} 个点)")
-                
-                # 插入批次
-                operation_info = self.client.upsert(
-                    collection_name=collection_name,
-                    points=batch,
-                    wait=True  # 等待操作完成
-                )
+            with ThreadPoolExecutor(max_workers=parallel) as executor:
+                in_flight = set()
+                for batch in batches:
+                    # 在途批次达到上限时先等其中一个完成，惰性序列也只会同时构建 parallel 批
+                    if len(in_flight) >= parallel:
+                        _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    
+                    in_flight.add(executor.submit(self._upsert_batch, collection_name, *previous, wait_each, shard_key))
+                    previous = batch
                 
-                print(f"   ✅ 批次 {batch_num} 插入成功")
-                
-                # 短暂休息，避免过载
-                if batch_num < total_batches:
-                    time.sleep(0.1)
-            
-            print(f"🎉 所有向量点插入完成！")
-            return True
+                wait(in_flight)
             
+            # 一致性屏障：最后一批等待写入完成
+            self._upsert_batch(collection_name, *previous, True, shard_key)
+        
         except Exception as e:
+            result.error = str(e)
             print(f"❌ 向量点插入失败: {e}")
+        
+        result.elapsed_seconds = time.time() - start_time
+        self._print_upsert_summary(result)
+        return result
+    
+    def _iter_batches(self, points: Sequence[PointStruct], batch_size: int, max_bytes: int,
+                      result: UpsertResult) -> Iterator[Tuple[List[PointStruct], BatchOutcome]]:
+        """按点数上限和字节预算切分批次（单个超出预算的点单独成批）"""
+        batch = []
+        batch_bytes = 0
+        float_bytes = VECTOR_FLOAT_GRPC_BYTES if self.prefer_grpc else VECTOR_FLOAT_JSON_BYTES
+        for point in points:
+            point_bytes = estimate_point_bytes(point, float_bytes)
+            if batch and (len(batch) >= batch_size or batch_bytes + point_bytes > max_bytes):
+                yield batch, self._new_outcome(result, batch, batch_bytes)
+                batch = []
+                batch_bytes = 0
+            
+            batch.append(point)
+            batch_bytes += point_bytes
+        
+        if batch:
+            yield batch, self._new_outcome(result, batch, batch_bytes)
+    
+    @staticmethod
+    def _new_outcome(result: UpsertResult, batch: List[PointStruct], batch_bytes: int) -> BatchOutcome:
+        outcome = BatchOutcome(index=len(result.batches) + 1, points=len(batch), bytes=batch_bytes)
+        result.batches.append(outcome)
+        return outcome
+    
+    def _upsert_batch(self, collection_name: str, batch: List[PointStruct], outcome: BatchOutcome,
+                      wait_result: bool, shard_key: Optional[str] = None, depth: int = 0,
+                      split_on_exhausted: bool = True):
+        """
+        写入一个批次，失败时退避重试或拆半重试，结果记录到 outcome（不抛出异常）
+        
+        - 请求体过大、超时：多点批次立即拆成两半分别写入；单点批次退避后原样重试
+        - 限流、5xx、连接错误：整批指数退避重试，重试用尽后多点批次再拆半试一次（拆出的批次不再因此拆分）
+        - 其他错误（如 400）：多点批次立即拆半以隔离坏点；单点批次直接记为失败
+        """
+        error = None
+        for attempt in range(self.upsert_max_retries + 1):
+            outcome.attempts += 1
+            try:
+                self.client.upsert(collection_name=collection_name, points=batch, wait=wait_result,
+                                   shard_key_selector=shard_key)
+                outcome.upserted += len(batch)
+                if depth == 0:
+                    print(f"   ✅ 批次 {outcome.index} 写入成功 ({len(batch)} 个点)")
+                return
+            except Exception as e:
+                error = e
+            
+            if not is_retryable_error(error) or (len(batch) > 1 and is_split_error(error)):
+                break
+            if attempt < self.upsert_max_retries:
+                print(f"   ⚠️ 批次 {outcome.index} 写入失败，退避后重试 "
+                      f"({attempt + 1}/{self.upsert_max_retries}): {error}")
+                time.sleep(self._backoff_seconds(attempt))
+        
+        exhausted = is_retryable_error(error) and not is_split_error(error)
+        if len(batch) > 1 and (split_on_exhausted or not exhausted):
+            outcome.splits += 1
+            print(f"   ⚠️ 批次 {outcome.index} 写入失败，拆分 {len(batch)} 个点后重试: {error}")
+            middle = len(batch) // 2
+            child_split = split_on_exhausted and not exhausted
+            self._upsert_batch(collection_name, batch[:middle], outcome, wait_result, shard_key, depth + 1,
+                               child_split)
+            self._upsert_batch(collection_name, batch[middle:], outcome, wait_result, shard_key, depth + 1,
+                               child_split)
+            return
+        
+        outcome.failed_ids.extend(point.id for point in batch)
+        outcome.error = str(error)
+        print(f"   ❌ 批次 {outcome.index} 中 {len(batch)} 个点写入失败: {error}")
+    
+    def _backoff_seconds(self, attempt: int) -> float:
+        """指数退避（带随机抖动，最长 30 秒）"""
+        delay = min(self.upsert_backoff_seconds * (2 ** attempt), 30.0)
+        return delay * random.uniform(0.5, 1.0)
+    
+    def _print_upsert_summary(self, result: UpsertResult):
+        """打印写入汇总"""
+        retried = [batch for batch in result.batches if batch.attempts > 1]
+        message = (f"耗时 {result.elapsed_seconds:.2f} 秒，{result.points_per_second:.0f} 点/秒，"
+                   f"{len(result.batches)} 个批次")
+        if retried:
+            message += f"，{len(retried)} 个批次经过重试"
+        
+        if result:
+            print(f"🎉 所有向量点插入完成！{message}")
+        else:
+            print(f"⚠️ 写入 {result.upserted_points}/{result.total_points} 个向量点，"
+                  f"失败 {result.failed_points} 个。{message}")
+    
+    def delete_points_by_intent_ids(self, collection_name: str, intent_ids: List[str],
+                                    keep_ids: Optional[List[str]] = None) -> bool:
+        """
+        删除指定意图的向量点
+        
+        Args:
+            collection_name: 集合名称
+            intent_ids: 意图ID列表
+            keep_ids: 需要保留的点ID（通常是刚写入的新点）
+        
+        Returns:
+            是否删除成功
+        """
+        if not intent_ids:
+            return True
+        
+        try:
+            points_filter = Filter(
+                must=[FieldCondition(key="metadata.intentId", match=MatchAny(any=list(intent_ids)))],
+                must_not=[HasIdCondition(has_id=list(keep_ids))] if keep_ids else None
+            )
+            self.client.delete(
+                collection_name=collection_name,
+                points_selector=FilterSelector(filter=points_filter),
+                wait=True
+            )
+            return True
+        
+        except Exception as e:
+            print(f"❌ 删除意图向量点失败: {e}")
             return False
     
+    def iter_point_payloads(self, collection_name: str, points_filter: Optional[Filter] = None,
+                            payload_fields: Optional[List[str]] = None,
+                            batch_size: int = 1000) -> Iterator[Any]:
+        """
+        滚动读取集合中的点（只取载荷，不取向量）
+        
+        Args:
+            collection_name: 集合名称
+            points_filter: 过滤条件
+            payload_fields: 只返回这些载荷字段（如 "metadata.contentHash"），为 None 时返回完整载荷
+            batch_size: 每次滚动的点数
+        
+        Yields:
+            Qdrant 记录（id、payload）
+        """
+        for records, _ in self.iter_payload_pages(collection_name, points_filter, payload_fields, batch_size):
+            yield from records
+    
+    def iter_payload_pages(self, collection_name: str, points_filter: Optional[Filter] = None,
+                           payload_fields: Optional[List[str]] = None, batch_size: int = 1000,
+                           start_offset: Any = None) -> Iterator[Tuple[List[Any], Any]]:
+        """
+        按页滚动读取集合中的点（只取载荷，不取向量），附带下一页的偏移量
+        
+        调用方保存每页返回的偏移量，中断后传入 start_offset 即可从该页继续。
+        
+        Args:
+            collection_name: 集合名称
+            points_filter: 过滤条件
+            payload_fields: 只返回这些载荷字段，为 None 时返回完整载荷
+            batch_size: 每次滚动的点数
+            start_offset: 起始偏移量（上次保存的下一页偏移量），为 None 时从头开始
+        
+        Yields:
+            (本页记录, 下一页偏移量)，最后一页的偏移量为 None
+        """
+        offset = start_offset
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=points_filter,
+                limit=batch_size,
+                offset=offset,
+                with_payload=payload_fields if payload_fields is not None else True,
+                with_vectors=False
+            )
+            yield records, offset
+            
+            if offset is None:
+                break
+    
+    def count_points(self, collection_name: str, points_filter: Optional[Filter] = None,
+                     exact: bool = True) -> Optional[int]:
+        """统计满足条件的点数（exact=False 时使用索引估算），失败时返回 None"""
+        try:
+            return self.client.count(
+                collection_name=collection_name,
+                count_filter=points_filter,
+                exact=exact
+            ).count
+        
+        except Exception as e:
+            print(f"❌ 统计向量点失败: {e}")
+            return None
+    
+    def delete_points(self, collection_name: str, point_ids: List[Any], batch_size: int = 1000) -> int:
+        """
+        按ID分批删除向量点
+        
+        Args:
+            collection_name: 集合名称
+            point_ids: 点ID列表
+            batch_size: 每次删除请求的点数
+        
+        Returns:
+            已删除的点数
+        """
+        deleted = 0
+        try:
+            for i in range(0, len(point_ids), batch_size):
+                batch = list(point_ids[i:i + batch_size])
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=PointIdsList(points=batch),
+                    wait=True
+                )
+                deleted += len(batch)
+            return deleted
+        
+        except Exception as e:
+            print(f"❌ 删除向量点失败: {e}")
+            return deleted
+    
+    def set_payloads(self, collection_name: str, updates: Sequence[Tuple[Dict[str, Any], List[Any]]],
+                     key: Optional[str] = None, shard_key: Optional[str] = None, batch_size: int = 100) -> int:
+        """
+        批量更新已有点的部分载荷（不重写向量），多个更新合并为一次 batch_update_points 请求
+        
+        Args:
+            collection_name: 集合名称
+            updates: [(要写入的载荷字段, 点ID列表)]
+            key: 写入的嵌套载荷路径（如 "metadata"），为 None 时写入顶层
+            shard_key: 点所在的分片键（集合使用自定义分片时必须指定）
+            batch_size: 每次请求合并的更新数
+        
+        Returns:
+            已更新的点数
+        """
+        updated = 0
+        try:
+            for i in range(0, len(updates), batch_size):
+                batch = updates[i:i + batch_size]
+                self.client.batch_update_points(
+                    collection_name=collection_name,
+                    update_operations=[
+                        SetPayloadOperation(set_payload=SetPayload(
+                            payload=payload, points=list(point_ids), key=key, shard_key=shard_key
+                        ))
+                        for payload, point_ids in batch
+                    ],
+                    wait=True
+                )
+                updated += sum(len(point_ids) for _, point_ids in batch)
+            return updated
+        
+        except Exception as e:
+            print(f"❌ 更新载荷失败: {collection_name}, 错误: {e}")
+            return updated
+    
     def search(self, collection_name: str, query_vector: List[float], 
                limit: int = 10, score_threshold: float = 0.7,
-               filter_conditions: Optional[Filter] = None) -> List[Any]:
-        """搜索向量"""
+               filter_conditions: Optional[Filter] = None, exact: bool = False,
+               shard_key: Optional[str] = None, payload_include: Optional[List[str]] = None,
+               payload_exclude: Optional[List[str]] = None, hnsw_ef: Optional[int] = None) -> List[Any]:
+        """
+        搜索向量
+        
+        exact=True 时不走 HNSW 而是全量比较（小租户更快也更准）；shard_key 只搜索该分片。
+        hnsw_ef 指定 HNSW 搜索的候选列表大小，默认读取 QDRANT_HNSW_EF（未设置时使用集合配置）。
+        非精确搜索会按 QDRANT_RECALL_SAMPLE_RATE 抽样，在后台用精确搜索核对召回率（见 RecallMonitor）。
+        按公司搜索请使用 TenancyLayout.search_company，它会自动带上租户过滤。
+        
+        payload_include / payload_exclude 只返回（或不返回）指定的载荷字段（如 "metadata.intentId"），
+        都不指定时返回完整载荷。答案通过 AnswerResolver 按意图批量取回，命中结果只需要少量字段。
+        """
+        with_payload = self._payload_selector(payload_include, payload_exclude)
+        search_params = self._search_params(exact, hnsw_ef)
+        
+        query_kwargs = dict(
+            query_vector=query_vector,
+            limit=limit,
+            score_threshold=score_threshold,
+            query_filter=filter_conditions,
+            shard_key_selector=shard_key
+        )
+        
         try:
             results = self.client.search(
                 collection_name=collection_name,
-                query_vector=query_vector,
-                limit=limit,
-                score_threshold=score_threshold,
-                query_filter=filter_conditions,
-                with_payload=True,
-                with_vectors=False  # 不返回向量，节省带宽
+                search_params=search_params,
+                with_payload=with_payload,
+                with_vectors=False,  # 不返回向量，节省带宽
+                **query_kwargs
             )
+            if not exact:
+                self.recall_monitor.observe(collection_name, results, query_kwargs)
             return results
-            
+        
         except Exception as e:
             print(f"❌ 向量搜索失败: {e}")
             return []
     
+    def search_batch(self, collection_name: str, query_vectors: Sequence[List[float]],
+                     limit: int = 10, score_threshold: float = 0.7,
+                     filter_conditions: Optional[Filter] = None, exact: bool = False,
+                     shard_key: Optional[str] = None, payload_include: Optional[List[str]] = None,
+                     payload_exclude: Optional[List[str]] = None, hnsw_ef: Optional[int] = None,
+                     batch_size: int = DEFAULT_SEARCH_BATCH_SIZE) -> List[List[Any]]:
+        """
+        批量搜索向量：每 batch_size 个查询合并为一次 search_batch 请求，参数含义与 search 相同
+        
+        Returns:
+            与 query_vectors 一一对应的结果列表；某一批请求失败时该批的结果为空列表
+        """
+        with_payload = self._payload_selector(payload_include, payload_exclude)
+        search_params = self._search_params(exact, hnsw_ef)
+        
+        all_results: List[List[Any]] = []
+        for start in range(0, len(query_vectors), batch_size):
+            vectors = query_vectors[start:start + batch_size]
+            requests = [
+                SearchRequest(
+                    vector=vector,
+                    filter=filter_conditions,
+                    params=search_params,
+                    limit=limit,
+                    score_threshold=score_threshold,
+                    shard_key=shard_key,
+                    with_payload=with_payload,
+                    with_vector=False
+                )
+                for vector in vectors
+            ]
+            
+            try:
+                batch_results = self.client.search_batch(collection_name=collection_name, requests=requests)
+            except Exception as e:
+                print(f"❌ 批量向量搜索失败（第 {start + 1}-{start + len(vectors)} 个查询）: {e}")
+                # 失败批次的空结果不是 HNSW 的真实结果，不参与召回率抽样
+                all_results.extend([] for _ in vectors)
+                continue
+            
+            if not exact:
+                for vector, results in zip(vectors, batch_results):
+                    self.recall_monitor.observe(collection_name, results, dict(
+                        query_vector=vector,
+                        limit=limit,
+                        score_threshold=score_threshold,
+                        query_filter=filter_conditions,
+                        shard_key_selector=shard_key
+                    ))
+            all_results.extend(batch_results)
+        
+        return all_results
+    
+    def search_groups(self, collection_name: str, query_vector: List[float],
+                      limit: int = 10, group_size: int = 1, score_threshold: float = 0.7,
+                      filter_conditions: Optional[Filter] = None, exact: bool = False,
+                      shard_key: Optional[str] = None, payload_include: Optional[List[str]] = None,
+                      payload_exclude: Optional[List[str]] = None, hnsw_ef: Optional[int] = None,
+                      group_by: str = INTENT_GROUP_FIELD) -> List[Any]:
+        """
+        按载荷字段分组搜索（默认按意图），由 Qdrant 返回 limit 个不同的组，每组最多 group_size 个命中
+        
+        同一意图的多个标准问题只占一个名额，调用方不需要多取结果再自行去重；其他参数含义与 search 相同。
+        非精确搜索同样按 QDRANT_RECALL_SAMPLE_RATE 抽样，用精确分组搜索按组ID核对召回率。
+        
+        Returns:
+            按最高分排序的组（PointGroup，id 为分组字段的值，hits 为组内命中），失败时返回空列表
+        """
+        query_kwargs = dict(
+            query_vector=query_vector,
+            group_by=group_by,
+            limit=limit,
+            group_size=group_size,
+            score_threshold=score_threshold,
+            query_filter=filter_conditions,
+            shard_key_selector=shard_key
+        )
+        
+        try:
+            result = self.client.search_groups(
+                collection_name=collection_name,
+                search_params=self._search_params(exact, hnsw_ef),
+                with_payload=self._payload_selector(payload_include, payload_exclude),
+                with_vectors=False,
+                **query_kwargs
+            )
+            if not exact:
+                self.recall_monitor.observe_groups(collection_name, result.groups, query_kwargs)
+            return result.groups
+        
+        except Exception as e:
+            print(f"❌ 分组搜索失败: {e}")
+            return []
+    
+    @staticmethod
+    def _payload_selector(payload_include: Optional[List[str]], payload_exclude: Optional[List[str]]):
+        """搜索返回的载荷字段"""
+        if payload_include:
+            return PayloadSelectorInclude(include=payload_include)
+        if payload_exclude:
+            return PayloadSelectorExclude(exclude=payload_exclude)
+        return True
+    
+    def _search_params(self, exact: bool, hnsw_ef: Optional[int]) -> Optional[SearchParams]:
+        """搜索参数：精确搜索，或者指定 HNSW ef（默认读取 QDRANT_HNSW_EF）"""
+        if exact:
+            return SearchParams(exact=True)
+        if hnsw_ef is None:
+            hnsw_ef = self.search_ef
+        return SearchParams(hnsw_ef=hnsw_ef) if hnsw_ef is not None else None
+    
     def get_vector_config(self, collection_name: str) -> Dict[str, Any]:
         """获取集合的向量配置信息"""
         try:
@@ -235,7 +1125,7 @@ class QdrantManager:
                     vector_config["vector_config_type"] = "empty"
             
             return vector_config
-            
+        
         except Exception as e:
             print(f"❌ 获取向量配置失败: {e}")
             return {
@@ -244,7 +1134,7 @@ class QdrantManager:
                 "default_vector_size": 0,
                 "vector_config_type": "unknown"
             }
-
+    
     def get_collection_info(self, collection_name: str) -> Optional[Dict[str, Any]]:
         """获取集合信息"""
         try:
@@ -265,7 +1155,7 @@ class QdrantManager:
                 result["disk_data_size"] = info.disk_data_size
             else:
                 result["disk_data_size"] = 0
-                
+            
             if hasattr(info, 'ram_data_size'):
                 result["ram_data_size"] = info.ram_data_size
             else:
@@ -285,7 +1175,7 @@ class QdrantManager:
                             result["vector_size"] = vector_info.get('size', 'unknown')
                         else:
                             result["vector_size"] = 'unknown'
-                            
+                        
                         if hasattr(vectors_config, 'distance'):
                             result["distance_function"] = vectors_config.distance
                         else:
@@ -302,28 +1192,67 @@ class QdrantManager:
                 result["distance_function"] = 'unknown'
             
             return result
-            
+        
         except Exception as e:
             print(f"❌ 获取集合信息失败 {collection_name}: {e}")
             return None
     
-    def list_collections(self) -> List[Dict[str, Any]]:
-        """列出所有集合"""
+    def list_collections(self, max_workers: int = 8) -> List[Dict[str, Any]]:
+        """
+        列出所有集合
+        
+        Args:
+            max_workers: 并发查询集合信息的线程数，集合较多时避免逐个串行请求
+        """
         try:
             collections = self.client.get_collections()
-            result = []
-            
-            for collection in collections.collections:
-                info = self.get_collection_info(collection.name)
-                if info:
-                    result.append(info)
+            names = [collection.name for collection in collections.collections]
+            if not names:
+                return []
             
-            return result
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as executor:
+                infos = list(executor.map(self.get_collection_info, names))
             
+            return [info for info in infos if info]
+        
         except Exception as e:
             print(f"❌ 列出集合失败: {e}")
             return []
     
+    def get_alias_targets(self) -> Dict[str, str]:
+        """获取全部别名及其指向的集合，失败时返回空字典"""
+        try:
+            return {alias.alias_name: alias.collection_name for alias in self.client.get_aliases().aliases}
+        except Exception as e:
+            print(f"❌ 获取别名失败: {e}")
+            return {}
+    
+    def point_alias(self, alias_name: str, collection_name: str) -> bool:
+        """
+        把别名指向指定集合
+        
+        删除旧别名和创建新别名在同一次请求中原子生效，读取方不会看到别名缺失的瞬间。
+        
+        Args:
+            alias_name: 别名（读取方统一使用的名称）
+            collection_name: 目标集合
+        """
+        operations = []
+        if alias_name in self.get_alias_targets():
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias_name)))
+        operations.append(CreateAliasOperation(
+            create_alias=CreateAlias(collection_name=collection_name, alias_name=alias_name)
+        ))
+        
+        try:
+            self.client.update_collection_aliases(change_aliases_operations=operations)
+            print(f"🔀 别名 {alias_name} → {collection_name}")
+            return True
+        
+        except Exception as e:
+            print(f"❌ 切换别名失败 {alias_name} → {collection_name}: {e}")
+            return False
+    
     def delete_collection(self, collection_name: str) -> bool:
         """删除集合"""
         try:
@@ -331,7 +1260,7 @@ class QdrantManager:
             self.client.delete_collection(collection_name)
             print(f"✅ 集合删除成功: {collection_name}")
             return True
-            
+        
         except Exception as e:
             print(f"❌ 集合删除失败 {collection_name}: {e}")
             return False
@@ -350,7 +1279,7 @@ class QdrantManager:
                 "total_disk_size": total_size,
                 "collections": collections
             }
-            
+        
         except Exception as e:
             print(f"❌ 获取系统信息失败: {e}")
             return {}
@@ -358,10 +1287,12 @@ class QdrantManager:
     def cleanup_empty_collections(self) -> int:
         """清理空集合"""
         collections = self.list_collections()
+        aliased = set(self.get_alias_targets().values())
         deleted_count = 0
         
         for collection in collections:
-            if collection.get('points_count', 0) == 0:
+            # 别名正在使用的集合即使为空也保留
+            if collection.get('points_count', 0) == 0 and collection['name'] not in aliased:
                 print(f"🧹 发现空集合: {collection['name']}")
                 if self.delete_collection(collection['name']):
                     deleted_count += 1
@@ -0,0 +1,238 @@
+"""
+实时同步守护进程
+监听 PostgreSQL 变更（LISTEN/NOTIFY 或 outbox 表），合并后增量同步到Qdrant
+"""
+
+import json
+import select
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+from .database import CHANGE_CHANNEL
+from .migrator import KnowledgeBaseMigrator
+
+
+class LagTracker:
+    """同步延迟统计（变更时间 → 可搜索时间）"""
+    
+    def __init__(self, window_size: int = 1000):
+        """
+        Args:
+            window_size: 滚动窗口大小（按意图变更计）
+        """
+        self.samples = deque(maxlen=window_size)
+        self.total_synced = 0
+    
+    def record(self, changed_at_ms: float, searchable_at_ms: float):
+        """记录一次变更的延迟"""
+        self.samples.append(max(searchable_at_ms - changed_at_ms, 0.0))
+        self.total_synced += 1
+    
+    def summary(self) -> Dict[str, Any]:
+        """返回滚动窗口内的延迟统计（毫秒）"""
+        if not self.samples:
+            return {"count": 0, "total_synced": self.total_synced}
+        
+        ordered = sorted(self.samples)
+        
+        def percentile(p: float) -> float:
+            return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+        
+        return {
+            "count": len(ordered),
+            "total_synced": self.total_synced,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": ordered[-1]
+        }
+
+
+class RealtimeSyncDaemon:
+    """实时同步守护进程"""
+    
+    def __init__(self, migrator: KnowledgeBaseMigrator, mode: str = 'notify',
+                 debounce_seconds: float = 2.0, max_wait_seconds: float = 10.0,
+                 max_batch_intents: int = 200, poll_interval: float = 1.0,
+                 stats_interval_seconds: float = 300.0):
+        """
+        初始化守护进程
+        
+        Args:
+            migrator: 已初始化的迁移器（复用数据库、Qdrant 和嵌入模型）
+            mode: 'notify' 监听 NOTIFY，'outbox' 轮询 outbox 表
+            debounce_seconds: 防抖窗口，窗口内无新变更时触发同步
+            max_wait_seconds: 最长等待时间，持续有变更时也会强制同步
+            max_batch_intents: 单个微批次的最大意图数
+            poll_interval: 监听/轮询间隔（秒）
+            stats_interval_seconds: 刷新统计快照的最小间隔（秒）
+        """
+        if mode not in ('notify', 'outbox'):
+            raise ValueError(f"不支持的变更来源: {mode}")
+        
+        self.migrator = migrator
+        self.db = migrator.db
+        self.mode = mode
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max(max_wait_seconds, debounce_seconds)
+        self.max_batch_intents = max_batch_intents
+        self.poll_interval = poll_interval
+        self.stats_interval_seconds = stats_interval_seconds
+        self.last_stats_refresh = 0.0
+        
+        self.lag_tracker = LagTracker()
+        
+        # 待同步的意图：intent_id -> 最早变更时间（毫秒）
+        self.pending: Dict[str, float] = {}
+        # 已读取、等待本批次同步的 outbox 变更：outbox ID -> intent_id
+        self.pending_outbox_ids: Dict[int, str] = {}
+        self.first_change_at: Optional[float] = None
+        self.last_change_at: Optional[float] = None
+    
+    def add_change(self, intent_id: str, changed_at_ms: Optional[float] = None):
+        """登记一个意图变更（同一意图的多次变更会被合并）"""
+        now = time.time()
+        changed_at_ms = changed_at_ms or now * 1000
+        
+        if intent_id in self.pending:
+            self.pending[intent_id] = min(self.pending[intent_id], changed_at_ms)
+        else:
+            self.pending[intent_id] = changed_at_ms
+        
+        if self.first_change_at is None:
+            self.first_change_at = now
+        self.last_change_at = now
+    
+    def should_flush(self) -> bool:
+        """判断是否应该触发一次微批次同步"""
+        if not self.pending:
+            return False
+        
+        now = time.time()
+        return (
+            len(self.pending) >= self.max_batch_intents
+            or now - self.last_change_at >= self.debounce_seconds
+            or now - self.first_change_at >= self.max_wait_seconds
+        )
+    
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """同步当前合并的变更"""
+        if not self.pending:
+            return None
+        
+        batch = self.pending
+        outbox_ids = self.pending_outbox_ids
+        self.pending = {}
+        self.pending_outbox_ids = {}
+        self.first_change_at = None
+        self.last_change_at = None
+        
+        intent_ids = list(batch.keys())
+        print(f"\n🔄 同步 {len(intent_ids)} 个变更意图...")
+        
+        start_time = time.time()
+        try:
+            result = self.migrator.sync_intents(intent_ids)
+        except Exception as e:
+            print(f"❌ 微批次同步失败，将在下次重试: {e}")
+            for intent_id, changed_at_ms in batch.items():
+                self.add_change(intent_id, changed_at_ms)
+            self.pending_outbox_ids.update(outbox_ids)
+            return None
+        
+        # 处理或写入失败的意图重新登记，outbox 变更保持未处理，下一批次重试
+        failed_ids = set(result['failed_intent_ids'])
+        for intent_id in failed_ids:
+            self.add_change(intent_id, batch.get(intent_id))
+        self.pending_outbox_ids.update(
+            (change_id, intent_id) for change_id, intent_id in outbox_ids.items() if intent_id in failed_ids
+        )
+        
+        # upsert 使用 wait=True，返回时变更已可搜索
+        searchable_at_ms = time.time() * 1000
+        for intent_id, changed_at_ms in batch.items():
+            if intent_id not in failed_ids:
+                self.lag_tracker.record(changed_at_ms, searchable_at_ms)
+        
+        if self.mode == 'outbox':
+            self.db.mark_outbox_processed(
+                [change_id for change_id, intent_id in outbox_ids.items() if intent_id not in failed_ids]
+            )
+        
+        lag = self.lag_tracker.summary()
+        print(f"✅ 微批次完成: 更新 {result['upserted_intents']} 个意图, "
+              f"删除 {result['removed_intents']} 个意图, 写入 {result['total_vectors']} 个向量 "
+              f"(未变化跳过 {result['skipped_vectors']} 个, 只更新使用统计 {result['updated_payload_vectors']} 个), "
+              f"耗时 {time.time() - start_time:.2f} 秒")
+        print(f"   ⏱️ 同步延迟 p50={lag['p50_ms']:.0f}ms p95={lag['p95_ms']:.0f}ms "
+              f"max={lag['max_ms']:.0f}ms (累计 {lag['total_synced']} 个变更)")
+        
+        for error in result['errors']:
+            print(f"   ⚠️ {error}")
+        if failed_ids:
+            print(f"   🔁 {len(failed_ids)} 个意图同步失败，将在下一批次重试")
+        
+        if time.time() - self.last_stats_refresh >= self.stats_interval_seconds:
+            self.migrator.refresh_stats_snapshot()
+            self.last_stats_refresh = time.time()
+        
+        return result
+    
+    def _collect_notifications(self, conn):
+        """读取 NOTIFY 消息"""
+        if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+            return
+        
+        conn.poll()
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                change = json.loads(notify.payload)
+                self.add_change(change['intent_id'], change.get('changed_at'))
+            except (ValueError, KeyError) as e:
+                print(f"⚠️ 无法解析变更通知: {notify.payload} ({e})")
+    
+    def _collect_outbox(self):
+        """轮询 outbox 表（跳过已读取、等待本批次同步的变更）"""
+        changes = self.db.fetch_outbox_changes(exclude_ids=list(self.pending_outbox_ids),
+                                               limit=self.max_batch_intents * 10)
+        for change in changes:
+            self.add_change(change['intent_id'], change['changed_at'].timestamp() * 1000)
+            self.pending_outbox_ids[change['id']] = change['intent_id']
+        
+        if not changes:
+            time.sleep(self.poll_interval)
+    
+    def run(self, max_iterations: Optional[int] = None):
+        """
+        运行守护进程主循环
+        
+        Args:
+            max_iterations: 最大循环次数（None 表示一直运行）
+        """
+        if not self.migrator.tenancy.per_company:
+            # 每个公司一个集合时在同步到该公司时再准备集合
+            self.migrator.prepare_collection(self.migrator.collection_name)
+        
+        print(f"👂 实时同步已启动: 来源={self.mode}, 防抖={self.debounce_seconds}s, "
+              f"集合={self.migrator.tenancy.describe()}")
+        
+        conn = self.db.get_listen_connection(CHANGE_CHANNEL) if self.mode == 'notify' else None
+        iterations = 0
+        
+        try:
+            while max_iterations is None or iterations < max_iterations:
+                iterations += 1
+                
+                if self.mode == 'notify':
+                    self._collect_notifications(conn)
+                else:
+                    self._collect_outbox()
+                
+                if self.should_flush():
+                    self.flush()
+        finally:
+            self.flush()
+            if conn is not None:
+                conn.close()
+            print(f"⏹️ 实时同步已停止，延迟统计: {self.lag_tracker.summary()}")
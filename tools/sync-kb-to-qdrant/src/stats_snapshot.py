@@ -0,0 +1,70 @@
+"""
+统计快照
+同步结束时把数据库和 Qdrant 的统计信息写入本地缓存，
+--stats 优先读取快照，不必每次都扫描数据库或逐个查询集合
+"""
+
+import os
+import time
+from typing import Dict, Any, Optional
+
+from .cache import load_json, save_json
+from .database import PostgreSQLConnection
+from .qdrant_manager import QdrantManager
+
+
+STATS_SNAPSHOT_FILENAME = 'stats_snapshot.json'
+
+
+def get_snapshot_ttl_seconds() -> float:
+    """快照有效期（可通过 STATS_SNAPSHOT_TTL_MINUTES 配置，默认 60 分钟）"""
+    return float(os.getenv('STATS_SNAPSHOT_TTL_MINUTES', '60')) * 60
+
+
+def load_stats_snapshot(max_age_seconds: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    读取统计快照
+    
+    Args:
+        max_age_seconds: 最大允许的快照年龄，默认使用 STATS_SNAPSHOT_TTL_MINUTES
+    
+    Returns:
+        快照（包含 refreshed_at、age_seconds、database、qdrant），不存在或已过期时返回 None
+    """
+    snapshot = load_json(STATS_SNAPSHOT_FILENAME)
+    if not snapshot:
+        return None
+    
+    if max_age_seconds is None:
+        max_age_seconds = get_snapshot_ttl_seconds()
+    
+    age = time.time() - snapshot.get('refreshed_at', 0)
+    if age > max_age_seconds:
+        return None
+    
+    snapshot['age_seconds'] = age
+    return snapshot
+
+
+def refresh_stats_snapshot(db: PostgreSQLConnection, qdrant: QdrantManager,
+                           exact: bool = False) -> Dict[str, Any]:
+    """
+    重新统计并保存快照
+    
+    Args:
+        db: 数据库连接管理器
+        qdrant: Qdrant 管理器
+        exact: 数据库统计是否使用精确的全表扫描（默认使用估算值）
+    
+    Returns:
+        新的快照
+    """
+    snapshot = {
+        "refreshed_at": time.time(),
+        "database": db.get_database_stats(exact=exact),
+        "qdrant": qdrant.get_system_info()
+    }
+    save_json(STATS_SNAPSHOT_FILENAME, snapshot)
+    
+    snapshot['age_seconds'] = 0.0
+    return snapshot
@@ -0,0 +1,311 @@
+"""
+租户（公司）隔离策略
+- shared: 所有公司共用一个集合，metadata.companyId 建租户优化的载荷索引（is_tenant，按公司聚集存储），
+  可选按公司ID使用自定义分片键
+- per_company: 每个公司一个集合（kb_<公司ID>）
+搜索统一走 search_company（及 _coarse / _groups / _batch 变体），始终带上租户过滤；点数很少的租户直接精确搜索，不走 HNSW；
+启用热度分层时先查热数据集合，再按需回退到冷数据集合（见 popularity_tiers）
+"""
+
+import os
+import time
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from qdrant_client.models import Filter, FieldCondition, MatchValue
+
+from .qdrant_manager import QdrantManager, DEFAULT_SEARCH_BATCH_SIZE
+from .intent_store import IntentStore, AnswerResolver, INTENT_COLLECTION_SUFFIX, intent_collection_name
+from .popularity_tiers import PopularityTiers
+from .intent_centroids import IntentCentroids
+
+
+TENANCY_SHARED = "shared"
+TENANCY_PER_COMPANY = "per_company"
+TENANCY_MODES = (TENANCY_SHARED, TENANCY_PER_COMPANY)
+
+# 每个公司一个集合时的集合名前缀
+COMPANY_COLLECTION_PREFIX = "kb_"
+
+# 点数低于该值的租户使用精确搜索（与 Qdrant 默认的 full_scan_threshold 量级相当）
+DEFAULT_EXACT_SEARCH_THRESHOLD = 2000
+
+# 租户点数缓存的有效期（秒）
+TENANT_SIZE_TTL_SECONDS = 300
+
+
+class TenancyLayout:
+    """租户隔离策略：决定每个公司写入哪个集合、使用哪个分片键，以及如何搜索"""
+    
+    def __init__(self, qdrant: QdrantManager, shared_collection: str, mode: Optional[str] = None,
+                 shard_keys: Optional[bool] = None, exact_search_threshold: Optional[int] = None):
+        """
+        初始化租户隔离策略
+        
+        Args:
+            qdrant: Qdrant 管理器
+            shared_collection: 共用集合的名称（shared 模式）
+            mode: shared 或 per_company，默认读取 QDRANT_TENANCY（未设置为 shared）
+            shard_keys: 共用集合按公司ID自定义分片，默认读取 QDRANT_TENANT_SHARD_KEYS（未设置为 False），
+                只在新建集合时生效
+            exact_search_threshold: 点数低于该值的租户使用精确搜索，默认读取 QDRANT_EXACT_SEARCH_THRESHOLD
+        """
+        if mode is None:
+            mode = os.getenv('QDRANT_TENANCY', TENANCY_SHARED)
+        if mode not in TENANCY_MODES:
+            raise ValueError(f"不支持的租户隔离策略: {mode}（可选: {', '.join(TENANCY_MODES)}）")
+        if shard_keys is None:
+            shard_keys = os.getenv('QDRANT_TENANT_SHARD_KEYS', 'false').lower() in ('1', 'true', 'yes')
+        if exact_search_threshold is None:
+            exact_search_threshold = int(os.getenv('QDRANT_EXACT_SEARCH_THRESHOLD',
+                                                   str(DEFAULT_EXACT_SEARCH_THRESHOLD)))
+        
+        self.qdrant = qdrant
+        self.shared_collection = shared_collection
+        self.mode = mode
+        self.shard_keys = shard_keys and mode == TENANCY_SHARED
+        self.exact_search_threshold = exact_search_threshold
+        # 热度分层（见 QDRANT_POPULARITY_TIERS），两种隔离策略下都可以启用
+        self.tiers = PopularityTiers(qdrant)
+        # 意图质心索引（见 QDRANT_INTENT_CENTROIDS），用于粗排-精排搜索
+        self.centroids = IntentCentroids(qdrant, self.tiers)
+        self._tenant_sizes: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self._sharded: Dict[str, bool] = {}
+        self._resolvers: Dict[str, AnswerResolver] = {}
+        
+        if shard_keys and mode == TENANCY_PER_COMPANY:
+            print("⚠️ 每个公司一个集合时不需要分片键，忽略 QDRANT_TENANT_SHARD_KEYS")
+    
+    @property
+    def per_company(self) -> bool:
+        return self.mode == TENANCY_PER_COMPANY
+    
+    def describe(self) -> str:
+        """策略的简短描述（用于日志）"""
+        if self.per_company:
+            suffix = "，按热度分层" if self.tiers.enabled else ""
+            if self.centroids.enabled:
+                suffix += "，维护意图质心"
+            return f"每个公司一个集合 ({COMPANY_COLLECTION_PREFIX}<公司ID>){suffix}"
+        suffix = "，按公司分片" if self.shard_keys else ""
+        if self.tiers.enabled:
+            suffix += "，按热度分层"
+        if self.centroids.enabled:
+            suffix += "，维护意图质心"
+        return f"共用集合 {self.shared_collection}{suffix}"
+    
+    def collection_for(self, company_id: str) -> str:
+        """公司数据所在的集合"""
+        if self.per_company:
+            return f"{COMPANY_COLLECTION_PREFIX}{company_id}"
+        return self.shared_collection
+    
+    def company_collections(self) -> List[str]:
+        """策略下的全部集合（per_company 模式列出所有 kb_ 前缀的集合），不含意图集合、冷数据集合和质心集合"""
+        if not self.per_company:
+            return [self.shared_collection]
+        
+        collections = self.qdrant.list_collections()
+        return [
+            col['name'] for col in collections
+            if col['name'].startswith(COMPANY_COLLECTION_PREFIX)
+            and not col['name'].endswith(INTENT_COLLECTION_SUFFIX)
+            and not self.tiers.is_cold_collection(col['name'])
+            and not self.centroids.is_centroid_collection(col['name'])
+        ]
+    
+    def intent_store_for(self, company_id: str) -> IntentStore:
+        """
+        公司的意图集合（答案和标准问题列表）
+        
+        按别名（而不是版本集合）命名：意图记录与嵌入模型无关，重建时不需要新版本。
+        """
+        return IntentStore(self.qdrant, intent_collection_name(self.collection_for(company_id)))
+    
+    def answer_resolver_for(self, company_id: str) -> AnswerResolver:
+        """公司意图集合的答案解析器（同一意图集合共用一个 LRU 缓存）"""
+        store = self.intent_store_for(company_id)
+        if store.collection_name not in self._resolvers:
+            self._resolvers[store.collection_name] = AnswerResolver(store)
+        return self._resolvers[store.collection_name]
+    
+    def intent_stores(self) -> List[IntentStore]:
+        """策略下的全部意图集合"""
+        return [IntentStore(self.qdrant, intent_collection_name(name)) for name in self.company_collections()]
+    
+    def shard_key_for(self, company_id: str, collection_name: Optional[str] = None) -> Optional[str]:
+        """
+        公司对应的分片键
+        
+        未启用自定义分片，或集合创建时没有使用自定义分片（分片方式无法事后修改）时返回 None。
+        
+        Args:
+            company_id: 公司ID
+            collection_name: 实际写入/搜索的集合，默认为共用集合（重建时是新的版本集合）
+        """
+        if not self.shard_keys:
+            return None
+        
+        collection_name = collection_name or self.shared_collection
+        if collection_name not in self._sharded:
+            self._sharded[collection_name] = self.qdrant.uses_custom_sharding(collection_name)
+            if not self._sharded[collection_name]:
+                print(f"⚠️ 集合 {collection_name} 创建时未启用自定义分片，按公司分片需 --rebuild 后生效")
+        return company_id if self._sharded[collection_name] else None
+    
+    @staticmethod
+    def tenant_filter(company_id: str, filter_conditions: Optional[Filter] = None) -> Filter:
+        """租户过滤条件，附加调用方的其他过滤条件"""
+        tenant_condition = FieldCondition(key="metadata.companyId", match=MatchValue(value=company_id))
+        if filter_conditions is None:
+            return Filter(must=[tenant_condition])
+        
+        must = filter_conditions.must or []
+        if not isinstance(must, list):
+            must = [must]
+        return Filter(
+            must=[tenant_condition, *must],
+            should=filter_conditions.should,
+            must_not=filter_conditions.must_not,
+            min_should=filter_conditions.min_should
+        )
+    
+    def tenant_size(self, company_id: str, collection_name: Optional[str] = None) -> Optional[int]:
+        """
+        租户在集合中的点数（近似统计，缓存 TENANT_SIZE_TTL_SECONDS 秒），失败时返回 None
+        
+        Args:
+            company_id: 公司ID
+            collection_name: 统计的集合，默认为公司数据所在的集合（分层时热、冷数据集合分别统计）
+        """
+        key = (collection_name or self.collection_for(company_id), company_id)
+        cached = self._tenant_sizes.get(key)
+        if cached is not None and time.time() - cached[1] < TENANT_SIZE_TTL_SECONDS:
+            return cached[0]
+        
+        size = self.qdrant.count_points(key[0], self.tenant_filter(company_id), exact=False)
+        if size is not None:
+            self._tenant_sizes[key] = (size, time.time())
+        return size
+    
+    def search_company(self, company_id: str, query_vector: List[float], limit: int = 10,
+                       score_threshold: float = 0.7,
+                       filter_conditions: Optional[Filter] = None,
+                       payload_include: Optional[List[str]] = None,
+                       payload_exclude: Optional[List[str]] = None) -> List[Any]:
+        """
+        在指定公司的知识库中搜索（始终带上租户过滤，启用热度分层时按需回退到冷数据集合）
+        
+        Args:
+            company_id: 公司ID
+            query_vector: 查询向量
+            limit: 返回结果数
+            score_threshold: 最低相似度
+            filter_conditions: 额外的过滤条件
+            payload_include: 只返回这些载荷字段（如 SEARCH_HIT_FIELDS，答案用 answer_resolver_for 取回）
+            payload_exclude: 不返回这些载荷字段
+        """
+        tenant_filter = self.tenant_filter(company_id, filter_conditions)
+        
+        def search_tier(collection_name: str) -> List[Any]:
+            size = self.tenant_size(company_id, collection_name)
+            exact = size is not None and size < self.exact_search_threshold
+            
+            return self.qdrant.search(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                limit=limit,
+                score_threshold=score_threshold,
+                filter_conditions=tenant_filter,
+                exact=exact,
+                shard_key=self.shard_key_for(company_id, collection_name),
+                payload_include=payload_include,
+                payload_exclude=payload_exclude
+            )
+        
+        return self.tiers.search_tiers(self.collection_for(company_id), search_tier, limit)
+    
+    def search_company_coarse(self, company_id: str, query_vector: List[float], limit: int = 10,
+                              score_threshold: float = 0.7, coarse_intents: Optional[int] = None,
+                              payload_include: Optional[List[str]] = None,
+                              payload_exclude: Optional[List[str]] = None) -> List[Any]:
+        """
+        在指定公司的知识库中粗排-精排搜索：先在质心集合中取最相近的 coarse_intents 个意图，
+        再用 search_company 只搜索这些意图的问题点（需要同步时启用 QDRANT_INTENT_CENTROIDS）
+        """
+        intent_ids = self.centroids.coarse_search(self.collection_for(company_id), query_vector,
+                                                  self.tenant_filter(company_id), coarse_intents)
+        if not intent_ids:
+            return []
+        
+        return self.search_company(
+            company_id,
+            query_vector=query_vector,
+            limit=limit,
+            score_threshold=score_threshold,
+            filter_conditions=IntentCentroids.intent_filter(intent_ids),
+            payload_include=payload_include,
+            payload_exclude=payload_exclude
+        )
+    
+    def search_company_groups(self, company_id: str, query_vector: List[float], limit: int = 10,
+                              group_size: int = 1, score_threshold: float = 0.7,
+                              filter_conditions: Optional[Filter] = None,
+                              payload_include: Optional[List[str]] = None,
+                              payload_exclude: Optional[List[str]] = None) -> List[Any]:
+        """
+        在指定公司的知识库中按意图分组搜索，返回 limit 个不同的意图（每组最多 group_size 个命中），
+        其他参数含义与 search_company 相同；答案用 answer_resolver_for(company_id).resolve_groups 取回
+        """
+        tenant_filter = self.tenant_filter(company_id, filter_conditions)
+        
+        def search_tier(collection_name: str) -> List[Any]:
+            size = self.tenant_size(company_id, collection_name)
+            exact = size is not None and size < self.exact_search_threshold
+            
+            return self.qdrant.search_groups(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                limit=limit,
+                group_size=group_size,
+                score_threshold=score_threshold,
+                filter_conditions=tenant_filter,
+                exact=exact,
+                shard_key=self.shard_key_for(company_id, collection_name),
+                payload_include=payload_include,
+                payload_exclude=payload_exclude
+            )
+        
+        return self.tiers.search_tiers(self.collection_for(company_id), search_tier, limit)
+    
+    def search_company_batch(self, company_id: str, query_vectors: Sequence[List[float]], limit: int = 10,
+                             score_threshold: float = 0.7,
+                             filter_conditions: Optional[Filter] = None,
+                             payload_include: Optional[List[str]] = None,
+                             payload_exclude: Optional[List[str]] = None,
+                             batch_size: int = DEFAULT_SEARCH_BATCH_SIZE) -> List[List[Any]]:
+        """
+        在指定公司的知识库中批量搜索，参数含义与 search_company 相同
+        
+        Returns:
+            与 query_vectors 一一对应的结果列表
+        """
+        tenant_filter = self.tenant_filter(company_id, filter_conditions)
+        
+        def search_tier_batch(collection_name: str, vectors: Sequence[List[float]]) -> List[List[Any]]:
+            size = self.tenant_size(company_id, collection_name)
+            exact = size is not None and size < self.exact_search_threshold
+            
+            return self.qdrant.search_batch(
+                collection_name=collection_name,
+                query_vectors=vectors,
+                limit=limit,
+                score_threshold=score_threshold,
+                filter_conditions=tenant_filter,
+                exact=exact,
+                shard_key=self.shard_key_for(company_id, collection_name),
+                payload_include=payload_include,
+                payload_exclude=payload_exclude,
+                batch_size=batch_size
+            )
+        
+        return self.tiers.search_tiers_batch(self.collection_for(company_id), query_vectors, search_tier_batch, limit)
@@ -11,8 +11,14 @@ from dotenv import load_dotenv
 # 加载环境变量
 load_dotenv()
 
-from sync_data.qdrant_manager import QdrantManager
+from sync_data.qdrant_manager import QdrantManager, DEFAULT_COLLECTION_NAME
 from sync_data.embedding_service import LocalEmbeddingService
+from sync_data.tenancy import TenancyLayout
+from sync_data.intent_store import (
+    IntentStore, AnswerResolver, SEARCH_HIT_FIELDS, INTENT_COLLECTION_SUFFIX, intent_collection_name
+)
+from sync_data.popularity_tiers import PopularityTiers
+from sync_data.intent_centroids import CENTROID_COLLECTION_SUFFIX
 
 # 推荐模型列表
 RECOMMENDED_MODELS = {
@@ -36,7 +42,13 @@ def interactive_search():
     
     # 先选择集合，根据向量维度自动选择模型
     print("\n📋 可用集合:")
-    collections = qdrant.list_collections()
+    # 意图集合不带向量，质心集合只用于粗排，都不能直接搜索；冷数据集合随热数据集合一起搜索
+    tiers = PopularityTiers(qdrant)
+    collections = [
+        col for col in qdrant.list_collections()
+        if not col['name'].endswith((INTENT_COLLECTION_SUFFIX, CENTROID_COLLECTION_SUFFIX))
+        and not tiers.is_cold_collection(col['name'])
+    ]
     if not collections:
         print("❌ 没有找到任何集合")
         print("💡 请先运行数据迁移: python main.py --all")
@@ -83,6 +95,7 @@ def interactive_search():
     print("📥 正在加载模型（首次使用需要下载）...")
     
     embedding = LocalEmbeddingService(model_name)
+    resolver = AnswerResolver(IntentStore(qdrant, intent_collection_name(collection_name)))
     
     # 开始搜索循环
     print("\n" + "=" * 60)
@@ -106,21 +119,26 @@ def interactive_search():
             # 生成向量
             vector = embedding.encode_single(question)
             
-            # 搜索
-            results = qdrant.search(
+            # 按意图分组的分层搜索（每个意图只返回最相似的一个问题，答案按意图批量取回）
+            groups = tiers.search_groups(
                 collection_name=collection_name,
                 query_vector=vector,
                 limit=5,
-                score_threshold=0.5
+                score_threshold=0.5,
+                payload_include=SEARCH_HIT_FIELDS
             )
             
-            if not results:
+            if not groups:
                 print("❌ 没有找到匹配的结果")
                 continue
             
-            print(f"✅ 找到 {len(results)} 个结果:\n")
+            print(f"✅ 找到 {len(groups)} 个意图:\n")
             
-            for i, result in enumerate(results, 1):
+            # 一次请求取回所有命中意图的答案（已缓存的意图不再请求）
+            intents = resolver.resolve_groups(groups)
+            
+            for i, group in enumerate(groups, 1):
+                result = group.hits[0]
                 payload = result.payload
                 score = result.score
                 
@@ -133,7 +151,7 @@ def interactive_search():
                 print(f"   意图: {metadata.get('intentName', 'N/A')}")
                 
                 # 显示答案（取第一个）
-                answers = metadata.get('answers', [])
+                answers = intents.get(metadata.get('intentId'), {}).get('answers', [])
                 if answers and len(answers) > 0:
                     answer = answers[0]
                     if isinstance(answer, dict):
@@ -168,27 +186,32 @@ def quick_test(question: str, company_id: str, model_name: str = None):
         qdrant = QdrantManager()
         embedding = LocalEmbeddingService(model_name)
         
-        # 集合名称
-        collection_name = f"kb_{company_id}"
+        # 按租户隔离策略（QDRANT_TENANCY）定位公司数据所在的集合
+        tenancy = TenancyLayout(qdrant, DEFAULT_COLLECTION_NAME)
+        print(f"📦 集合: {tenancy.collection_for(company_id)}")
         
         # 生成向量
         vector = embedding.encode_single(question)
         
-        # 搜索
-        results = qdrant.search(
-            collection_name=collection_name,
+        # 按意图分组搜索（始终带上公司过滤）
+        groups = tenancy.search_company_groups(
+            company_id,
             query_vector=vector,
             limit=3,
-            score_threshold=0.5
+            score_threshold=0.5,
+            payload_include=SEARCH_HIT_FIELDS
         )
         
-        if not results:
+        if not groups:
             print("❌ 没有找到匹配的结果")
             return
         
-        print(f"✅ 找到 {len(results)} 个结果:\n")
+        print(f"✅ 找到 {len(groups)} 个意图:\n")
+        
+        intents = tenancy.answer_resolver_for(company_id).resolve_groups(groups)
         
-        for i, result in enumerate(results, 1):
+        for i, group in enumerate(groups, 1):
+            result = group.hits[0]
             payload = result.payload
             score = result.score
             
@@ -201,7 +224,7 @@ def quick_test(question: str, company_id: str, model_name: str = None):
             print(f"   意图: {metadata.get('intentName', 'N/A')}")
             
             # 显示答案
-            answers = metadata.get('answers', [])
+            answers = intents.get(metadata.get('intentId'), {}).get('answers', [])
             if answers and len(answers) > 0:
                 answer = answers[0]
                 if isinstance(answer, dict):
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+HNSW 参数调优
+以精确搜索为基准，扫描 m / ef_construct / ef，对比 recall@k、p50/p99 延迟和内存估算，并推荐配置。
+所有测量都在临时集合（<集合>_hnsw_tune）上进行，源集合只在指定 --apply 时修改。
+"""
+
+import argparse
+import json
+import sys
+from dotenv import load_dotenv
+
+from sync_data.hnsw_tuner import (
+    HnswTuner, DEFAULT_M_VALUES, DEFAULT_EF_CONSTRUCT_VALUES, DEFAULT_EF_VALUES, DEFAULT_TARGET_RECALL
+)
+from sync_data.qdrant_manager import QdrantManager, DEFAULT_COLLECTION_NAME
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='扫描 HNSW 参数，对比召回率、延迟和内存并推荐配置')
+    parser.add_argument('collection', nargs='?', default=DEFAULT_COLLECTION_NAME,
+                        help=f'集合名称 (默认: {DEFAULT_COLLECTION_NAME})')
+    parser.add_argument('--m', type=int, nargs='+', default=DEFAULT_M_VALUES,
+                        help=f'扫描的 m 值 (默认: {" ".join(map(str, DEFAULT_M_VALUES))})')
+    parser.add_argument('--ef-construct', type=int, nargs='+', default=DEFAULT_EF_CONSTRUCT_VALUES,
+                        help=f'扫描的 ef_construct 值 (默认: {" ".join(map(str, DEFAULT_EF_CONSTRUCT_VALUES))})')
+    parser.add_argument('--ef', type=int, nargs='+', default=DEFAULT_EF_VALUES,
+                        help=f'扫描的搜索 ef 值 (默认: {" ".join(map(str, DEFAULT_EF_VALUES))})')
+    parser.add_argument('--top-k', type=int, default=10, help='recall@k 的 k (默认: 10)')
+    parser.add_argument('--queries', type=int, default=200, help='抽样查询数 (默认: 200)')
+    parser.add_argument('--max-points', type=int, default=50000,
+                        help='复制到临时集合的最大点数 (默认: 50000)')
+    parser.add_argument('--target-recall', type=float, default=DEFAULT_TARGET_RECALL,
+                        help=f'推荐配置需要达到的召回率 (默认: {DEFAULT_TARGET_RECALL})')
+    parser.add_argument('--max-memory-mb', type=float, default=None,
+                        help='推荐配置的内存上限（按源集合点数估算，默认不限制）')
+    parser.add_argument('--output', type=str, default=None, help='把扫描结果保存为 JSON 文件')
+    parser.add_argument('--apply', action='store_true', help='把推荐的 m / ef_construct 应用到源集合')
+    
+    args = parser.parse_args()
+    
+    load_dotenv()
+    
+    print("=" * 60)
+    print("🎛️ HNSW 参数调优")
+    print("=" * 60)
+    
+    tuner = HnswTuner(QdrantManager(), args.collection, max_points=args.max_points,
+                      sample_size=args.queries, top_k=args.top_k)
+    if not tuner.load_vectors():
+        return False
+    
+    results = tuner.run(args.m, args.ef_construct, args.ef)
+    if not results:
+        print("❌ 没有成功的测量结果")
+        return False
+    
+    max_memory_bytes = int(args.max_memory_mb * 1024 * 1024) if args.max_memory_mb is not None else None
+    recommended = tuner.recommend(results, args.target_recall, max_memory_bytes)
+    tuner.print_report(results, recommended, args.target_recall)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(tuner.to_report(results, recommended), f, ensure_ascii=False, indent=2)
+        print(f"💾 扫描结果已保存: {args.output}")
+    
+    if args.apply and recommended is not None:
+        return tuner.apply(recommended)
+    return recommended is not None
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -32,9 +32,14 @@ BATCH_SIZE = 10  # ⚠️ API 限制：每批最多 10 条
 class APIUploader:
     """API 上传器"""
     
-    def __init__(self, api_url: str = API_URL):
+    def __init__(self, api_url: str = API_URL, snapshot_dir: str = None):
         self.api_url = api_url
-        self.db = PostgreSQLConnection()  # 从环境变量自动读取配置
+        if snapshot_dir:
+            # 从本地 Parquet 快照读取（python main.py --export-snapshot 导出）
+            from sync_data.snapshot import KnowledgeBaseSnapshot
+            self.db = KnowledgeBaseSnapshot(snapshot_dir)
+        else:
+            self.db = PostgreSQLConnection()  # 从环境变量自动读取配置
     
     def transform_to_api_format(self, intent: Dict[str, Any], question: str, 
                                answers: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -258,6 +263,7 @@ def main():
     parser = argparse.ArgumentParser(description='上传知识库数据到 API')
     parser.add_argument('--preview', action='store_true', help='预览数据格式，不实际上传')
     parser.add_argument('--upload', action='store_true', help='直接上传数据，不显示菜单')
+    parser.add_argument('--from-snapshot', type=str, metavar='DIR', help='从本地 Parquet 快照读取数据，不访问数据库')
     
     args = parser.parse_args()
     
@@ -270,7 +276,7 @@ def main():
     print(f"   API地址: {API_URL}")
     print(f"   Access-Token: {ACCESS_TOKEN[:10]}...{ACCESS_TOKEN[-4:]}\n")
     
-    uploader = APIUploader()
+    uploader = APIUploader(snapshot_dir=args.from_snapshot)
     
     try:
         # 确定操作模式